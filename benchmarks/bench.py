@@ -0,0 +1,285 @@
+"""Client benchmarks against the in-process mock replica.
+
+    python -m benchmarks.bench [--events N] [--requests N] [--batch-sizes 1,10,...] [--json] [--check]
+
+Every run uses the same ids and amounts, so numbers are comparable between client versions.
+NumPy decode rates are skipped when NumPy isn't installed. --check fails the run if the
+adaptive Batcher's p99 latency is worse than the fixed default's on the same load.
+"""
+import argparse
+import gc
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+
+from tigerbeetle_client import client2
+from tigerbeetle_client.adaptive import BatchController
+from tigerbeetle_client.batcher import Batcher
+from tigerbeetle_client.client2 import TigerBeetleClient, tb_account_t, tb_create_accounts_result_t, tb_transfer_t
+from tigerbeetle_client.results import CreateAccountResult, CreateResults
+
+from .mock_replica import MockLib, MockSocketServer
+
+ACCOUNT_COUNT = 1000
+
+
+def make_accounts(count, first_id=1):
+    return [tb_account_t(id=first_id + i, ledger=1, code=1) for i in range(count)]
+
+
+def make_transfers(count, first_id=1):
+    return [
+        tb_transfer_t(id=first_id + i, debit_account_id=1 + i % ACCOUNT_COUNT, credit_account_id=1 + (i + 1) % ACCOUNT_COUNT, amount=1 + i % 100, ledger=1, code=1)
+        for i in range(count)
+    ]
+
+
+def rate(count, seconds):
+    return count / seconds if seconds else float('inf')
+
+
+def timed(fn, repeat=5):
+    """Return the best wall time of `repeat` calls, so one-off pauses don't skew the result."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    pick = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))]
+    return {
+        'p50_us': pick(0.50) * 1e6,
+        'p90_us': pick(0.90) * 1e6,
+        'p99_us': pick(0.99) * 1e6,
+        'max_us': samples[-1] * 1e6,
+        'mean_us': statistics.fmean(samples) * 1e6,
+    }
+
+
+def allocations(fn, count):
+    """Return the peak bytes allocated during a call, and the blocks and bytes still held afterwards, per call."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    peak = 0
+    for _ in range(count):
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        fn()
+        peak += tracemalloc.get_traced_memory()[1] - current
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = after.compare_to(before, 'filename')
+    return {
+        'peak_bytes_per_call': peak / count,
+        'retained_blocks_per_call': sum(stat.count_diff for stat in stats) / count,
+        'retained_bytes_per_call': sum(stat.size_diff for stat in stats) / count,
+    }
+
+
+def bench_encode(events):
+    accounts = make_accounts(events)
+    transfers = make_transfers(events)
+    results = {
+        'accounts_ctypes_per_s': rate(events, timed(lambda: (tb_account_t * events)(*accounts))),
+        'transfers_ctypes_per_s': rate(events, timed(lambda: (tb_transfer_t * events)(*transfers))),
+        'accounts_to_dict_per_s': rate(events, timed(lambda: [account.to_dict() for account in accounts])),
+    }
+    reply = bytes((tb_create_accounts_result_t * events)(*[tb_create_accounts_result_t(i, CreateAccountResult.exists) for i in range(events)]))
+    results['results_ctypes_decode_per_s'] = rate(events, timed(lambda: list((tb_create_accounts_result_t * events).from_buffer_copy(reply))))
+    results['results_compact_decode_per_s'] = rate(events, timed(lambda: CreateResults.from_buffer(CreateAccountResult, reply, len(reply))))
+    looked_up = bytes((tb_account_t * events)(*accounts))
+    results['accounts_ctypes_decode_per_s'] = rate(events, timed(lambda: list((tb_account_t * events).from_buffer_copy(looked_up))))
+    try:
+        import numpy as np
+        from tigerbeetle_client import arrays
+    except ImportError:
+        return results
+    results['accounts_numpy_decode_per_s'] = rate(events, timed(lambda: np.frombuffer(looked_up, dtype=arrays.ACCOUNT_DTYPE).copy()))
+    results['results_numpy_decode_per_s'] = rate(events, timed(lambda: np.frombuffer(reply, dtype=arrays.CREATE_RESULT_DTYPE).copy()))
+    return results
+
+
+def bench_client2(requests, batch_sizes):
+    client = TigerBeetleClient(MockLib(), packets_count=64)
+    try:
+        client.create_accounts(make_accounts(ACCOUNT_COUNT))
+        curve = {}
+        next_id = 1
+        for batch_size in batch_sizes:
+            batches = [make_transfers(batch_size, next_id + i * batch_size) for i in range(requests)]
+            next_id += requests * batch_size
+            latencies = []
+            start = time.perf_counter()
+            for batch in batches:
+                sent = time.perf_counter()
+                client.create_transfers(batch)
+                latencies.append(time.perf_counter() - sent)
+            elapsed = time.perf_counter() - start
+            curve[batch_size] = {'events_per_s': rate(requests * batch_size, elapsed), **percentiles(latencies)}
+
+            # Pipelined: every batch in flight at once, as many callers would do
+            batches = [make_transfers(batch_size, next_id + i * batch_size) for i in range(requests)]
+            next_id += requests * batch_size
+            start = time.perf_counter()
+            futures = [client.submit(client2.TB_OPERATION_CREATE_TRANSFERS, batch) for batch in batches]
+            for future in futures:
+                future.result()
+            curve[batch_size]['pipelined_events_per_s'] = rate(requests * batch_size, time.perf_counter() - start)
+
+        ids = list(range(1, 101))
+        lookup_latencies = []
+        for _ in range(requests):
+            sent = time.perf_counter()
+            client.lookup_accounts(ids)
+            lookup_latencies.append(time.perf_counter() - sent)
+
+        transfers = make_transfers(100, next_id)
+        return {
+            'create_transfers': curve,
+            'lookup_accounts_100': percentiles(lookup_latencies),
+            'allocations_create_transfers_100': allocations(lambda: client.submit(client2.TB_OPERATION_CREATE_TRANSFERS, transfers).result(), requests),
+            'allocations_lookup_accounts_100': allocations(lambda: client.lookup_accounts(ids), requests),
+        }
+    finally:
+        client.deinit()
+
+
+def bench_client(requests, batch_sizes):
+    from tigerbeetle_client.client import Account, TigerBeetleClient as SocketClient, Transfer
+
+    server = MockSocketServer()
+    client = SocketClient(host=server.host, port=server.port)
+    try:
+        client.connect()
+        client.create_accounts([Account(id=i, user_data='{}') for i in range(1, ACCOUNT_COUNT + 1)])
+        curve = {}
+        for batch_size in batch_sizes:
+            batch = [Transfer(from_account=1, to_account=2, amount=i) for i in range(batch_size)]
+            latencies = []
+            for _ in range(requests):
+                sent = time.perf_counter()
+                client.create_transfers(batch)
+                latencies.append(time.perf_counter() - sent)
+            curve[batch_size] = {'events_per_s': rate(requests * batch_size, sum(latencies)), **percentiles(latencies)}
+        batch = [Transfer(from_account=1, to_account=2, amount=i) for i in range(100)]
+        return {
+            'create_transfers': curve,
+            'allocations_create_transfers_100': allocations(lambda: client.create_transfers(batch), requests),
+        }
+    finally:
+        client.close()
+        server.close()
+
+
+def bench_aio(requests, batch_sizes):
+    import asyncio
+
+    from tigerbeetle_client.aio import AsyncTigerBeetleClient
+    from tigerbeetle_client.client import Transfer
+
+    async def run():
+        server = MockSocketServer()
+        client = AsyncTigerBeetleClient(host=server.host, port=server.port)
+        try:
+            await client.connect()
+            curve = {}
+            for batch_size in batch_sizes:
+                batch = [Transfer(from_account=1, to_account=2, amount=i) for i in range(batch_size)]
+                latencies = []
+                for _ in range(requests):
+                    sent = time.perf_counter()
+                    await client.create_transfers(batch)
+                    latencies.append(time.perf_counter() - sent)
+                curve[batch_size] = {'events_per_s': rate(requests * batch_size, sum(latencies)), **percentiles(latencies)}
+                # Pipelined: every request in flight on the one connection at once
+                start = time.perf_counter()
+                await asyncio.gather(*[client.create_transfers(batch) for _ in range(requests)])
+                curve[batch_size]['pipelined_events_per_s'] = rate(requests * batch_size, time.perf_counter() - start)
+            return {'create_transfers': curve}
+        finally:
+            await client.close()
+            server.close()
+
+    return asyncio.run(run())
+
+
+def bench_adaptive(events=20000, latency=0.002, target_p99=0.005):
+    """p99 latency of single-event Batcher submits, fixed default vs. adaptive, against a replica taking `latency` per packet."""
+    def run(controller):
+        client = TigerBeetleClient(MockLib(latency=latency))
+        batcher = Batcher(client, client2.TB_OPERATION_CREATE_TRANSFERS, controller=controller)
+        latencies = []
+        try:
+            for i, transfer in enumerate(make_transfers(events)):
+                sent = time.perf_counter()
+                batcher.submit(transfer).add_done_callback(lambda future, sent=sent: latencies.append(time.perf_counter() - sent))
+                if i % 200 == 199:
+                    # Bursts with short pauses, so arrivals don't all land in the first packet
+                    time.sleep(0.001)
+        finally:
+            batcher.close()
+            client.deinit()
+        return percentiles(latencies)
+
+    return {'fixed': run(None), 'adaptive': run(BatchController(target_p99))}
+
+
+def bench_client1(events):
+    # client1 is a deprecated wrapper over client2, so only its encoding is measured
+    from tigerbeetle_client.client1 import Client, TBAccount
+
+    accounts = [TBAccount(id=i + 1, ledger=1, code=1) for i in range(events)]
+    pack = Client.pack_account
+    return {'accounts_pack_per_s': rate(events, timed(lambda: [pack(None, account) for account in accounts]))}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=8190, help="events per encode/decode measurement")
+    parser.add_argument('--requests', type=int, default=200, help="requests per latency measurement")
+    parser.add_argument('--batch-sizes', default='1,10,100,1000,8190', help="comma-separated batch sizes for the throughput curve")
+    parser.add_argument('--json', action='store_true', help="print one JSON document instead of a report")
+    parser.add_argument('--check', action='store_true', help="exit with status 1 if adaptive batching has a worse p99 than the fixed default")
+    args = parser.parse_args(argv)
+    batch_sizes = [int(size) for size in args.batch_sizes.split(',')]
+
+    results = {
+        'python': sys.version.split()[0],
+        'encode': bench_encode(args.events),
+        'client2': bench_client2(args.requests, batch_sizes),
+        'client': bench_client(args.requests, batch_sizes),
+        'aio': bench_aio(args.requests, batch_sizes),
+        'client1': bench_client1(args.events),
+        'batcher': bench_adaptive(),
+    }
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        report(results)
+    batcher = results['batcher']
+    if args.check and batcher['adaptive']['p99_us'] > batcher['fixed']['p99_us']:
+        return 1
+    return 0
+
+
+def report(results, indent=0):
+    for key, value in results.items():
+        if isinstance(value, dict):
+            print(f"{' ' * indent}{key}:")
+            report(value, indent + 2)
+        elif isinstance(value, float):
+            print(f"{' ' * indent}{key}: {value:,.1f}")
+        else:
+            print(f"{' ' * indent}{key}: {value}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,205 @@
+"""In-process stand-ins for a TigerBeetle replica, so benchmarks need no running cluster.
+
+Replica keeps accounts and transfers in dicts and applies create / lookup batches to them.
+MockLib exposes it through the same tb_client_init / tb_client_submit / tb_client_deinit
+calls client2 makes on the native library, completing packets from its own thread;
+NativeMockLib exposes them as C function pointers, for native.NativeClient.
+MockSocketServer acknowledges every framed message of client.py's socket protocol.
+"""
+import ctypes
+import queue
+import socket
+import struct
+import threading
+
+from tigerbeetle_client.client2 import (
+    TB_OPERATION_CREATE_ACCOUNTS,
+    TB_OPERATION_CREATE_TRANSFERS,
+    TB_OPERATION_LOOKUP_ACCOUNTS,
+    TB_OPERATION_LOOKUP_TRANSFERS,
+    TB_OPERATION_QUERY_ACCOUNTS,
+    TB_OPERATION_QUERY_TRANSFERS,
+    TB_PACKET_INVALID_OPERATION,
+    TB_QUERY_FILTER_REVERSED,
+    TB_PACKET_OK,
+    TB_TRANSFER_POST_PENDING_TRANSFER,
+    TB_TRANSFER_VOID_PENDING_TRANSFER,
+    event_types,
+    on_completion_t,
+    tb_create_accounts_result_t,
+    tb_packet_t,
+    tb_uint128_t,
+)
+from tigerbeetle_client.results import CreateAccountResult, CreateTransferResult
+
+
+class Replica:
+    def __init__(self):
+        self.accounts = {}
+        self.transfers = {}
+        self.timestamp = 0
+        self.lock = threading.Lock()
+
+    def execute(self, operation, data):
+        """Apply one batch of packed events and return the packed reply."""
+        event_type = event_types[operation]
+        events = (event_type * (len(data) // ctypes.sizeof(event_type))).from_buffer_copy(data)
+        with self.lock:
+            if operation == TB_OPERATION_CREATE_ACCOUNTS:
+                # The mock only checks for duplicates and unknown pending transfers; every other event is accepted
+                return self.create(events, self.accounts, CreateAccountResult.exists, None)
+            if operation == TB_OPERATION_CREATE_TRANSFERS:
+                return self.create(events, self.transfers, CreateTransferResult.exists, self.post, self.check_pending)
+            if operation == TB_OPERATION_LOOKUP_ACCOUNTS:
+                return self.lookup(events, self.accounts)
+            if operation == TB_OPERATION_LOOKUP_TRANSFERS:
+                return self.lookup(events, self.transfers)
+            if operation == TB_OPERATION_QUERY_ACCOUNTS:
+                return self.query(events[0], self.accounts)
+            if operation == TB_OPERATION_QUERY_TRANSFERS:
+                return self.query(events[0], self.transfers)
+        raise ValueError(f"Unsupported operation {operation}")
+
+    def create(self, events, table, exists, apply, check=None):
+        results = []
+        for index, event in enumerate(events):
+            id = int(event.id)
+            if id in table:
+                results.append(tb_create_accounts_result_t(index, exists))
+                continue
+            failure = check(event) if check is not None else 0
+            if failure:
+                results.append(tb_create_accounts_result_t(index, failure))
+                continue
+            self.timestamp += 1
+            event.timestamp = self.timestamp
+            table[id] = event
+            if apply is not None:
+                apply(event)
+        return bytes((tb_create_accounts_result_t * len(results))(*results))
+
+    def check_pending(self, transfer):
+        if transfer.flags & (TB_TRANSFER_POST_PENDING_TRANSFER | TB_TRANSFER_VOID_PENDING_TRANSFER) and int(transfer.pending_id) not in self.transfers:
+            return CreateTransferResult.pending_transfer_not_found
+        return 0
+
+    def post(self, transfer):
+        amount = int(transfer.amount)
+        for id, field in ((transfer.debit_account_id, 'debits_posted'), (transfer.credit_account_id, 'credits_posted')):
+            account = self.accounts.get(int(id))
+            if account is not None:
+                setattr(account, field, int(getattr(account, field)) + amount)
+
+    def lookup(self, ids, table):
+        return b''.join(bytes(table[int(id)]) for id in ids if int(id) in table)
+
+    def query(self, query_filter, table):
+        # Only ledger, code and the timestamp range are filtered on; tables are in timestamp order
+        matches = [
+            event for event in table.values()
+            if (not query_filter.ledger or event.ledger == query_filter.ledger)
+            and (not query_filter.code or event.code == query_filter.code)
+            and event.timestamp >= query_filter.timestamp_min
+            and (not query_filter.timestamp_max or event.timestamp <= query_filter.timestamp_max)
+        ]
+        if query_filter.flags & TB_QUERY_FILTER_REVERSED:
+            matches.reverse()
+        return b''.join(bytes(event) for event in matches[:query_filter.limit])
+
+
+class MockLib:
+    """Drop-in for client2's native library handle, backed by a Replica."""
+
+    def __init__(self, replica=None, latency=0.0):
+        self.replica = replica or Replica()
+        self.latency = latency
+        self.clients = {}
+
+    def tb_client_init(self, context_ref, cluster_id, address, address_len, packets_count, on_completion_ctx, on_completion):
+        handle = len(self.clients) + 1
+        submitted = queue.SimpleQueue()
+        thread = threading.Thread(target=self.run, args=(handle, submitted, on_completion_ctx, on_completion), name="tb-mock-replica", daemon=True)
+        self.clients[handle] = (submitted, thread)
+        context_ref._obj.value = handle
+        thread.start()
+        return 0
+
+    def tb_client_submit(self, context, packet_ref):
+        self.clients[context.value][0].put(packet_ref._obj)
+
+    def tb_client_deinit(self, context):
+        submitted, thread = self.clients.pop(context.value)
+        submitted.put(None)
+        thread.join()
+
+    def run(self, handle, submitted, on_completion_ctx, on_completion):
+        while True:
+            packet = submitted.get()
+            if packet is None:
+                return
+            if self.latency:
+                threading.Event().wait(self.latency)
+            try:
+                reply = self.replica.execute(packet.operation, ctypes.string_at(packet.data, packet.data_size))
+                packet.status = TB_PACKET_OK
+            except ValueError:
+                reply = b''
+                packet.status = TB_PACKET_INVALID_OPERATION
+            buffer = ctypes.create_string_buffer(reply, len(reply) or 1)
+            on_completion(on_completion_ctx, handle, ctypes.pointer(packet), ctypes.cast(buffer, ctypes.POINTER(ctypes.c_uint8)), len(reply))
+
+
+init_t = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.POINTER(ctypes.c_void_p), tb_uint128_t, ctypes.c_char_p, ctypes.c_uint32, ctypes.c_uint32, ctypes.c_size_t, on_completion_t)
+submit_t = ctypes.CFUNCTYPE(None, ctypes.c_void_p, ctypes.POINTER(tb_packet_t))
+deinit_t = ctypes.CFUNCTYPE(None, ctypes.c_void_p)
+
+
+class NativeMockLib(MockLib):
+    """MockLib whose tb_client_* functions are C function pointers, as NativeClient calls them from C."""
+
+    def __init__(self, replica=None, latency=0.0):
+        super().__init__(replica, latency)
+        # The C side passes raw pointers; MockLib expects what ctypes.byref would have made
+        self.tb_client_init = init_t(lambda context_ref, *args: MockLib.tb_client_init(self, ctypes.byref(context_ref.contents), *args))
+        self.tb_client_submit = submit_t(lambda context, packet_ref: MockLib.tb_client_submit(self, ctypes.c_void_p(context), ctypes.byref(packet_ref.contents)))
+        self.tb_client_deinit = deinit_t(lambda context: MockLib.tb_client_deinit(self, ctypes.c_void_p(context)))
+
+
+
+class MockSocketServer:
+    """Acknowledges each message of client.py's protocol in order, with a bare header echoing its opcode."""
+
+    def __init__(self, host='127.0.0.1', port=0):
+        from tigerbeetle_client.client import HEADER_FORMAT, HEADER_SIZE
+
+        self.header_format = HEADER_FORMAT
+        self.header_size = HEADER_SIZE
+        self.listener = socket.create_server((host, port))
+        self.host, self.port = self.listener.getsockname()[:2]
+        self.thread = threading.Thread(target=self.serve, name="tb-mock-server", daemon=True)
+        self.thread.start()
+
+    def serve(self):
+        while True:
+            try:
+                connection, _ = self.listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=self.handle, args=(connection,), daemon=True).start()
+
+    def handle(self, connection):
+        with connection:
+            # Replies are tiny and back to back; don't let Nagle hold them for the client's delayed ack
+            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            reader = connection.makefile('rb')
+            while True:
+                header = reader.read(self.header_size)
+                if len(header) < self.header_size:
+                    return
+                message_size, opcode, _result, _flags = struct.unpack(self.header_format, header)
+                reader.read(message_size - self.header_size)
+                connection.sendall(struct.pack(self.header_format, self.header_size, opcode, 0, 0))
+
+    def close(self):
+        self.listener.close()
+
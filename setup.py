@@ -1,6 +1,6 @@
 # setup.py
 
-from setuptools import setup, find_packages
+from setuptools import Extension, setup, find_packages
 
 setup(
     name="tigerbeetle_client",
@@ -11,10 +11,23 @@ setup(
     author="Aditya Agarwal",
     author_email="aditya@spendthebits.com",
     url="https://github.com/SpendTheBits/tigerbeetle-client-python",
-    packages=find_packages(),
+    packages=find_packages(exclude=['benchmarks', 'benchmarks.*']),
+    # GIL-free submit path for native.NativeClient; skipped when there is no C compiler
+    ext_modules=[
+        Extension(
+            "tigerbeetle_client._native",
+            sources=["tigerbeetle_client/_native.c"],
+            depends=["tigerbeetle_client/tb_client.h"],
+            optional=True,
+        ),
+    ],
     install_requires=[
         "requests",
     ],
+    extras_require={
+        "numpy": ["numpy"],
+        "arrow": ["numpy", "pyarrow"],
+    },
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",
@@ -0,0 +1,12 @@
+import pytest
+
+from benchmarks.mock_replica import MockLib
+from tigerbeetle_client.client2 import TigerBeetleClient
+
+
+@pytest.fixture
+def client():
+    """A client2 client on a fresh in-process mock replica."""
+    client = TigerBeetleClient(MockLib())
+    yield client
+    client.deinit()
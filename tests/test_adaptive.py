@@ -0,0 +1,90 @@
+import pytest
+
+from tigerbeetle_client.adaptive import BatchController
+from tigerbeetle_client.batcher import RESULT_OK, Batcher
+from tigerbeetle_client.client2 import TB_OPERATION_CREATE_ACCOUNTS, tb_account_t
+from tigerbeetle_client.metrics import Metrics
+
+
+def controller(**options):
+    # Windows are closed by window() rather than by time
+    options = {'target_p99': 0.010, 'min_batch_size': 10, 'max_batch_size': 1000, 'max_linger': 0.004, 'interval': 1e9, **options}
+    return BatchController(**options)
+
+
+def window(controller, packets, batch_size, latency, queue_depth=0, in_flight=0, seconds=1.0):
+    for _ in range(packets):
+        controller.observe(batch_size, latency, queue_depth, in_flight)
+    controller.decide(controller.window_start + seconds)
+    return controller.stats()
+
+
+def test_queueing_latency_grows_the_batch():
+    tuner = controller()
+    tuner.batch_size, tuner.linger = 500, 0.002
+    stats = window(tuner, 10, 500, 0.050, queue_depth=2000)
+    assert (stats['batch_size'], stats['linger']) == (500 + tuner.batch_step, 0.0)
+    # Saturated packet slots count as a backlog too
+    assert window(tuner, 10, 100, 0.050, in_flight=1)['batch_size'] == 500 + 2 * tuner.batch_step
+
+
+def test_slow_packets_shed_linger_then_size():
+    tuner = controller()
+    tuner.linger = 0.004
+    assert window(tuner, 10, 1000, 0.050)['linger'] == 0.002
+    tuner.linger = 0.0
+    stats = window(tuner, 10, 1000, 0.050)
+    assert (stats['batch_size'], stats['linger']) == (500, 0.0)
+    for _ in range(10):
+        stats = window(tuner, 10, 10, 0.050)
+    assert stats['batch_size'] == 10
+    assert stats['decisions'] == {'linger_decrease': 1, 'batch_decrease': 7}
+
+
+def test_headroom_grows_full_packets_up_to_the_maximum():
+    tuner = controller()
+    tuner.batch_size = 900
+    for _ in range(5):
+        stats = window(tuner, 10, tuner.batch_size, 0.001)
+    assert stats['batch_size'] == 1000 and stats['fill_ratio'] == 1.0
+
+
+def test_linger_follows_the_arrival_rate():
+    tuner = controller()
+    tuner.batch_size = 100
+    # 10 packets of 10 events a second: lingering a few milliseconds gathers nothing more
+    assert window(tuner, 10, 10, 0.001)['linger'] == 0.0
+    # 100000 events a second fill packets while lingering
+    stats = window(tuner, 1000, 10, 0.001, seconds=0.1)
+    assert stats['linger'] == tuner.linger_step and stats['events_per_second'] == pytest.approx(100_000)
+    tuner.linger = 0.004
+    assert window(tuner, 10, 10, 0.001)['linger'] == 0.002
+
+
+def test_settings_are_checked_and_reported():
+    with pytest.raises(ValueError):
+        BatchController(0.01, min_batch_size=0)
+    with pytest.raises(ValueError):
+        BatchController(0.01, min_linger=0.01, max_linger=0.001)
+    metrics = Metrics()
+    tuner = controller(metrics=metrics)
+    window(tuner, 10, 500, 0.002)
+    gauges = metrics.snapshot()['gauges']
+    assert gauges['batch_max_size'] == 1000 and gauges['batch_window_p99_seconds'] == pytest.approx(0.002, rel=0.1)
+    tuner.close()
+    assert not metrics.snapshot()['gauges']['batch_max_size']
+
+
+def test_batcher_sends_at_most_the_controllers_size(client):
+    sizes = []
+    submit = client.submit
+    client.submit = lambda operation, events: (sizes.append(len(events)), submit(operation, events))[1]
+    tuner = controller(min_batch_size=1, max_batch_size=100, max_linger=0.001)
+    tuner.batch_size = 3
+    batcher = Batcher(client, TB_OPERATION_CREATE_ACCOUNTS, controller=tuner)
+    try:
+        futures = [batcher.submit(tb_account_t(id=id, ledger=1, code=1)) for id in range(1, 21)]
+        assert [future.result(timeout=5) for future in futures] == [RESULT_OK] * 20
+    finally:
+        batcher.close()
+    assert sum(sizes) == 20 and max(sizes) <= 3
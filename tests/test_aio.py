@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from benchmarks.mock_replica import MockSocketServer
+from tigerbeetle_client.aio import AsyncTigerBeetleClient, header
+from tigerbeetle_client.client import HEADER_SIZE
+
+
+class EchoServer:
+    """Answers each message in order with its own payload, after `delays` seconds for the first few."""
+
+    def __init__(self, delays=()):
+        self.delays = list(delays)
+        self.writers = []
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, '127.0.0.1', 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def handle(self, reader, writer):
+        self.writers.append(writer)
+        try:
+            while True:
+                message_size, opcode, _result, _flags = header.unpack(await reader.readexactly(HEADER_SIZE))
+                payload = await reader.readexactly(message_size - HEADER_SIZE)
+                if self.delays:
+                    await asyncio.sleep(self.delays.pop(0))
+                writer.write(header.pack(message_size, opcode, 0, 0) + payload)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+
+    def drop_connections(self):
+        for writer in self.writers:
+            writer.transport.abort()
+        self.writers.clear()
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+def run(test):
+    async def main():
+        server = EchoServer(getattr(test, 'delays', ()))
+        await server.start()
+        try:
+            await test(server)
+        finally:
+            await server.close()
+    asyncio.run(main())
+
+
+def test_concurrent_requests_get_their_own_replies():
+    async def test(server):
+        async with AsyncTigerBeetleClient(port=server.port) as client:
+            payloads = [bytes([i]) * (i + 1) for i in range(50)]
+            replies = await asyncio.gather(*(client.request(1, payload) for payload in payloads))
+            assert replies == [(1, payload) for payload in payloads]
+            assert not client.pending
+    run(test)
+
+
+def test_a_timed_out_request_keeps_its_place_in_line():
+    async def test(server):
+        async with AsyncTigerBeetleClient(port=server.port, request_timeout=0.05) as client:
+            with pytest.raises(asyncio.TimeoutError):
+                await client.request(1, b'slow')
+            client.request_timeout = 5
+            assert await client.request(1, b'next') == (1, b'next')
+    test.delays = [0.2]
+    run(test)
+
+
+def test_requests_are_resent_after_the_connection_drops():
+    async def test(server):
+        async with AsyncTigerBeetleClient(port=server.port, reconnect_delay=0.01) as client:
+            first = asyncio.ensure_future(client.request(1, b'first'))
+            await asyncio.sleep(0.05)
+            server.drop_connections()
+            assert await client.request(2, b'second') == (2, b'second')
+            assert await first == (1, b'first')
+    test.delays = [0.2]
+    run(test)
+
+
+def test_mock_socket_server_acknowledges_in_order():
+    server = MockSocketServer()
+
+    async def main():
+        async with AsyncTigerBeetleClient(port=server.port) as client:
+            replies = await asyncio.gather(*(client.request(opcode, b'x' * opcode) for opcode in (1, 2, 1)))
+            assert [opcode for opcode, _ in replies] == [1, 2, 1]
+    try:
+        asyncio.run(main())
+    finally:
+        server.close()
@@ -0,0 +1,44 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from tigerbeetle_client import arrays, uint128
+from tigerbeetle_client.client2 import TB_OPERATION_LOOKUP_ACCOUNTS, tb_account_t
+from tigerbeetle_client.results import CreateAccountResult
+
+BIG = (1 << 100) + 7
+
+
+def accounts(ids):
+    rows = np.zeros(len(ids), dtype=arrays.ACCOUNT_DTYPE)
+    rows['id'] = uint128.to_pairs(ids)
+    rows['ledger'] = 1
+    rows['code'] = 718
+    return rows
+
+
+def test_dtypes_share_the_structs_layout():
+    account = tb_account_t(id=BIG, ledger=3, code=4, flags=5)
+    row = np.frombuffer(bytes(account), dtype=arrays.ACCOUNT_DTYPE)[0]
+    assert uint128.from_pairs(row['id']) == [BIG]
+    assert (int(row['ledger']), int(row['code']), int(row['flags'])) == (3, 4, 5)
+
+
+def test_create_and_lookup_arrays(client):
+    failures = client.create_accounts_array(accounts([1, BIG, 1]))
+    assert failures.dtype == arrays.CREATE_RESULT_DTYPE
+    assert failures.tolist() == [(2, CreateAccountResult.exists)]
+    found = client.lookup_accounts_array([BIG, 2, 1])
+    assert found.dtype == arrays.ACCOUNT_DTYPE
+    assert uint128.from_pairs(found['id']) == [BIG, 1]
+    assert found['code'].tolist() == [718, 718]
+
+
+def test_lookups_fill_a_preallocated_array(client):
+    client.create_accounts_array(accounts([1, 2]))
+    out = np.zeros(4, dtype=arrays.ACCOUNT_DTYPE)
+    found = client.lookup_accounts_array(np.array([[2, 0], [1, 0]], dtype='<u8'), out=out)
+    assert np.shares_memory(found, out)
+    assert uint128.from_pairs(found['id']) == [2, 1]
+    with pytest.raises(ValueError):
+        arrays.submit_array(client, TB_OPERATION_LOOKUP_ACCOUNTS, [1, 2], out=np.zeros(1, dtype=arrays.ACCOUNT_DTYPE))
@@ -0,0 +1,107 @@
+import asyncio
+import concurrent.futures
+import threading
+
+import pytest
+
+from tigerbeetle_client.backpressure import QueueFull, SubmitQueue
+from tigerbeetle_client.client2 import TB_OPERATION_CREATE_ACCOUNTS, tb_account_t
+
+
+class HeldClient:
+    """Accepts every request and leaves its future to the test to resolve."""
+
+    def __init__(self):
+        self.futures = []
+
+    def submit(self, operation, events):
+        future = concurrent.futures.Future()
+        self.futures.append(future)
+        return future
+
+    def reply(self):
+        self.futures.pop(0).set_result([])
+
+
+def accounts(count):
+    return [tb_account_t(id=id, ledger=1, code=1) for id in range(1, count + 1)]
+
+
+def test_callers_wait_for_room():
+    client = HeldClient()
+    queue = SubmitQueue(client, max_events=4)
+    queue.submit(TB_OPERATION_CREATE_ACCOUNTS, accounts(3))
+    waiting = threading.Thread(target=queue.submit, args=(TB_OPERATION_CREATE_ACCOUNTS, accounts(2)))
+    waiting.start()
+    waiting.join(0.05)
+    assert waiting.is_alive() and queue.stats()['classes']['default']['waiting'] == 1
+    client.reply()
+    waiting.join(5)
+    assert not waiting.is_alive()
+    assert queue.stats()['pending_events'] == 2
+
+
+def test_a_request_over_the_limit_runs_alone():
+    client = HeldClient()
+    queue = SubmitQueue(client, max_events=2, policy='fail')
+    queue.submit(TB_OPERATION_CREATE_ACCOUNTS, accounts(5))
+    with pytest.raises(QueueFull):
+        queue.submit(TB_OPERATION_CREATE_ACCOUNTS, accounts(1))
+    client.reply()
+    queue.submit(TB_OPERATION_CREATE_ACCOUNTS, accounts(1))
+    assert queue.stats()['classes']['default'] == {'waiting': 0, 'admitted': 2, 'rejected': 1}
+
+
+def test_timed_out_callers_leave_the_line():
+    client = HeldClient()
+    queue = SubmitQueue(client, max_packets=1, timeout=0.01)
+    queue.submit(TB_OPERATION_CREATE_ACCOUNTS, accounts(1))
+    with pytest.raises(QueueFull):
+        queue.submit(TB_OPERATION_CREATE_ACCOUNTS, accounts(1))
+    assert queue.stats()['classes']['default']['waiting'] == 0
+    client.reply()
+    assert queue.stats()['pending_packets'] == 0
+
+
+def test_classes_share_by_weight_and_stay_fifo():
+    queue = SubmitQueue(HeldClient(), max_packets=1, classes={'online': 2, 'bulk': 1})
+    queue.enqueue(1, 0, 'bulk')
+    order = []
+    for name, count in (('bulk', 4), ('online', 4)):
+        for n in range(count):
+            waiter = queue.enqueue(1, 0, name)
+            waiter.admitted.add_done_callback(lambda _, tag=(name, n): order.append(tag))
+    for _ in range(8):
+        queue.release(1, 0)
+    assert [name for name, _ in order[:6]] == ['online', 'bulk', 'online', 'online', 'bulk', 'online']
+    for name in ('online', 'bulk'):
+        assert [n for tag, n in order if tag == name] == [0, 1, 2, 3]
+
+
+def test_async_callers_wait_without_blocking_the_loop():
+    client = HeldClient()
+    queue = SubmitQueue(client, max_packets=1)
+
+    async def main():
+        first = asyncio.ensure_future(queue.submit_async(TB_OPERATION_CREATE_ACCOUNTS, accounts(1)))
+        second = asyncio.ensure_future(queue.submit_async(TB_OPERATION_CREATE_ACCOUNTS, accounts(1)))
+        await asyncio.sleep(0.01)
+        assert len(client.futures) == 1
+        client.reply()
+        await first
+        await asyncio.sleep(0.01)
+        client.reply()
+        await second
+    asyncio.run(main())
+    assert queue.stats()['pending_packets'] == 0
+
+
+def test_lanes_over_a_client_report_gauges(client):
+    queue = SubmitQueue(client, max_events=100, classes={'online': 3, 'bulk': 1})
+    assert not queue.lane('bulk').create_accounts(accounts(2))
+    assert sorted(client.lib.replica.accounts) == [1, 2]
+    assert client.metrics.snapshot()['gauges']['queue_waiting_online'] == 0
+    with pytest.raises(ValueError):
+        queue.lane('batch')
+    queue.close()
+    assert not client.metrics.gauges['queue_waiting_online']
@@ -0,0 +1,60 @@
+import concurrent.futures
+
+import pytest
+
+from tigerbeetle_client.batcher import RESULT_OK, Batcher
+from tigerbeetle_client.client2 import TB_OPERATION_CREATE_ACCOUNTS, TB_OPERATION_LOOKUP_ACCOUNTS, tb_account_t
+from tigerbeetle_client.results import CreateAccountResult
+
+
+def account(id):
+    return tb_account_t(id=id, ledger=1, code=1)
+
+
+def test_events_from_many_threads_share_packets(client):
+    sizes = []
+    submit = client.submit
+    client.submit = lambda operation, events: (sizes.append(len(events)), submit(operation, events))[1]
+    batcher = Batcher(client, TB_OPERATION_CREATE_ACCOUNTS, max_batch_size=100, linger=0.01)
+    try:
+        with concurrent.futures.ThreadPoolExecutor(8) as executor:
+            futures = list(executor.map(lambda id: batcher.submit(account(id)), range(1, 501)))
+        assert [future.result() for future in futures] == [RESULT_OK] * 500
+    finally:
+        batcher.close()
+    assert sorted(client.lib.replica.accounts) == list(range(1, 501))
+    assert sum(sizes) == 500 and max(sizes) <= 100 and len(sizes) < 500
+
+
+def test_failures_go_to_their_own_event(client):
+    batcher = Batcher(client, TB_OPERATION_CREATE_ACCOUNTS)
+    try:
+        assert batcher.submit(account(1)).result() == RESULT_OK
+        chain = batcher.submit_many([account(2), account(1), account(3)])
+        assert [future.result() for future in chain] == [RESULT_OK, CreateAccountResult.exists, RESULT_OK]
+    finally:
+        batcher.close()
+
+
+def test_groups_stay_whole_and_in_order(client):
+    sent = []
+    submit = client.submit
+    client.submit = lambda operation, events: (sent.append([int(event.id) for event in events]), submit(operation, events))[1]
+    batcher = Batcher(client, TB_OPERATION_CREATE_ACCOUNTS, max_batch_size=4, linger=0.05)
+    groups = [[1, 2, 3], [4, 5], [6], [7, 8, 9, 10]]
+    futures = [future for group in groups for future in batcher.submit_many([account(id) for id in group])]
+    batcher.close()
+    concurrent.futures.wait(futures)
+    assert [id for packet in sent for id in packet] == list(range(1, 11))
+    assert all(any(set(group) <= set(packet) for packet in sent) for group in groups)
+
+
+def test_rejects_what_it_cannot_batch(client):
+    with pytest.raises(ValueError):
+        Batcher(client, TB_OPERATION_LOOKUP_ACCOUNTS)
+    batcher = Batcher(client, TB_OPERATION_CREATE_ACCOUNTS, max_batch_size=2)
+    with pytest.raises(ValueError):
+        batcher.submit_many([account(1), account(2), account(3)])
+    batcher.close()
+    with pytest.raises(RuntimeError):
+        batcher.submit(account(4))
@@ -0,0 +1,53 @@
+import ctypes
+
+from benchmarks import bench
+from benchmarks.mock_replica import Replica
+from tigerbeetle_client import uint128
+from tigerbeetle_client.client2 import (
+    TB_OPERATION_CREATE_ACCOUNTS,
+    TB_OPERATION_CREATE_TRANSFERS,
+    TB_OPERATION_LOOKUP_ACCOUNTS,
+    TB_OPERATION_QUERY_TRANSFERS,
+    TB_QUERY_FILTER_REVERSED,
+    TB_TRANSFER_POST_PENDING_TRANSFER,
+    tb_account_t,
+    tb_create_accounts_result_t,
+    tb_query_filter_t,
+    tb_transfer_t,
+)
+from tigerbeetle_client.results import CreateAccountResult, CreateTransferResult
+
+
+def packed(struct_type, events):
+    return bytes((struct_type * len(events))(*events))
+
+
+def results(reply):
+    return [(result.index, result.result) for result in (tb_create_accounts_result_t * (len(reply) // 8)).from_buffer_copy(reply)]
+
+
+def test_replica_applies_batches():
+    replica = Replica()
+    reply = replica.execute(TB_OPERATION_CREATE_ACCOUNTS, packed(tb_account_t, bench.make_accounts(3) + bench.make_accounts(1)))
+    assert results(reply) == [(3, CreateAccountResult.exists)]
+    transfers = bench.make_transfers(4) + [tb_transfer_t(id=9, pending_id=99, flags=TB_TRANSFER_POST_PENDING_TRANSFER)]
+    reply = replica.execute(TB_OPERATION_CREATE_TRANSFERS, packed(tb_transfer_t, transfers))
+    assert results(reply) == [(4, CreateTransferResult.pending_transfer_not_found)]
+    assert int(replica.accounts[2].debits_posted) == 2 and int(replica.accounts[2].credits_posted) == 1
+
+    reply = replica.execute(TB_OPERATION_LOOKUP_ACCOUNTS, uint128.pack([3, 7, 1]))
+    assert [int(account.id) for account in (tb_account_t * 2).from_buffer_copy(reply)] == [3, 1]
+
+    query = tb_query_filter_t(ledger=1, timestamp_min=5, limit=2, flags=TB_QUERY_FILTER_REVERSED)
+    reply = replica.execute(TB_OPERATION_QUERY_TRANSFERS, bytes(query))
+    assert [int(transfer.id) for transfer in (tb_transfer_t * 2).from_buffer_copy(reply)] == [4, 3]
+    assert len(reply) == 2 * ctypes.sizeof(tb_transfer_t)
+
+
+def test_benchmarks_run_against_the_mock():
+    assert bench.bench_encode(20)['accounts_ctypes_per_s'] > 0
+    client2 = bench.bench_client2(3, [1, 4])
+    assert set(client2['create_transfers']) == {1, 4}
+    assert client2['lookup_accounts_100']['p50_us'] > 0
+    assert set(bench.bench_aio(3, [1])['create_transfers']) == {1}
+    assert bench.percentiles([3, 1, 2])['max_us'] == 3e6
@@ -0,0 +1,60 @@
+import functools
+import time
+
+import pytest
+
+pytest.importorskip('numpy')
+
+from benchmarks.mock_replica import MockLib
+from tigerbeetle_client import broker as broker_module
+from tigerbeetle_client.broker import Broker
+from tigerbeetle_client.client2 import TB_OPERATION_CREATE_ACCOUNTS, TB_TRANSFER_LINKED, TigerBeetleClient, tb_account_t
+from tigerbeetle_client.results import CreateAccountResult
+
+
+def start_broker(latency=0.0, **options):
+    broker = Broker(workers=2, client_factory=functools.partial(TigerBeetleClient, MockLib(latency=latency)), requests=16, slots=64, **options)
+    broker.start()
+    return broker
+
+
+def accounts(ids, flags=0):
+    return [tb_account_t(id=id, ledger=1, code=1, flags=flags) for id in ids]
+
+
+def test_requests_round_trip_through_the_broker():
+    broker = start_broker()
+    try:
+        first, second = broker.connect(), broker.connect()
+        with pytest.raises(RuntimeError):
+            broker.connect()
+        assert not first.create_accounts(accounts([1, 2, 3]))
+        failures = second.create_accounts(accounts([4, 2]))
+        assert [(failure.index, failure.result) for failure in failures] == [(1, CreateAccountResult.exists)]
+        assert [int(account.id) for account in first.lookup_accounts([3, 9, 4])] == [3, 4]
+        futures = [second.submit(TB_OPERATION_CREATE_ACCOUNTS, accounts([id])) for id in range(10, 40)]
+        assert not any(future.result(timeout=5) for future in futures)
+        with pytest.raises(ValueError):
+            first.create_accounts(accounts([50], flags=TB_TRANSFER_LINKED))
+        first.close()
+        second.close()
+    finally:
+        broker.close()
+
+
+def test_workers_fail_their_requests_when_the_broker_dies(monkeypatch):
+    monkeypatch.setattr(broker_module, 'BROKER_CHECK_INTERVAL', 0.05)
+    broker = start_broker(latency=30)
+    try:
+        client = broker.connect()
+        future = client.submit(TB_OPERATION_CREATE_ACCOUNTS, accounts([1]))
+        broker.process.kill()
+        with pytest.raises(RuntimeError, match='broker process exited'):
+            future.result(timeout=5)
+        with pytest.raises(RuntimeError):
+            client.create_accounts(accounts([2]))
+        started = time.monotonic()
+        client.close()
+        assert time.monotonic() - started < 1
+    finally:
+        broker.close()
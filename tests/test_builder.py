@@ -0,0 +1,81 @@
+import pytest
+
+pytest.importorskip('numpy')
+
+from benchmarks.mock_replica import MockLib
+from tigerbeetle_client.builder import TransferBatch
+from tigerbeetle_client.client2 import TB_TRANSFER_LINKED, TigerBeetleClient
+from tigerbeetle_client.results import CreateError, CreateTransferResult as R
+
+
+def codes(results):
+    return {failure.index: failure.result for failure in results}
+
+
+def test_chains_link_every_row_but_the_last():
+    batch = TransferBatch()
+    with batch.chain():
+        batch.add(id=1, debit_account_id=10, credit_account_id=20, amount=1, ledger=1, code=1)
+        batch.add(id=2, debit_account_id=10, credit_account_id=20, amount=1, ledger=1, code=1)
+    batch.add(id=3, debit_account_id=10, credit_account_id=20, amount=1, ledger=1, code=1)
+    assert [event.flags & TB_TRANSFER_LINKED for event in batch.events()] == [TB_TRANSFER_LINKED, 0, 0]
+    with pytest.raises(KeyError):
+        with batch.chain():
+            batch.add(id=4, debit_account_id=10, credit_account_id=20, amount=1, ledger=1, code=1)
+            raise KeyError
+    assert len(batch) == 3
+
+
+def test_validate_reports_the_clusters_result_codes():
+    batch = TransferBatch()
+    batch.add(id=0, debit_account_id=10, credit_account_id=20, ledger=1, code=1)
+    batch.add(id=2, debit_account_id=10, credit_account_id=10, ledger=1, code=1)
+    batch.add(id=3, debit_account_id=10, credit_account_id=20, ledger=0, code=1)
+    batch.post(id=4, pending_id=0)
+    batch.add(id=5, debit_account_id=10, credit_account_id=20, ledger=1, code=1, timeout=5)
+    batch.add(id=5, debit_account_id=10, credit_account_id=20, ledger=1, code=1)
+    with batch.chain():
+        batch.add(id=7, debit_account_id=10, credit_account_id=20, ledger=1, code=1)
+        batch.add(id=8, debit_account_id=10, credit_account_id=30, ledger=2, code=1)
+    batch.pending(id=9, debit_account_id=10, credit_account_id=20, amount=5, ledger=1, code=1, timeout=60)
+    assert codes(batch.validate()) == {
+        0: R.id_must_not_be_zero,
+        1: R.accounts_must_be_different,
+        2: R.ledger_must_not_be_zero,
+        3: R.pending_id_must_not_be_zero,
+        4: R.timeout_reserved_for_pending_transfer,
+        5: R.exists,
+    }
+    # With the accounts' ledgers, the chain's second transfer fails and takes the first with it
+    with_ledgers = codes(batch.validate({10: 1, 20: 1, 30: 1}))
+    assert with_ledgers[6] == R.linked_event_failed
+    assert with_ledgers[7] == R.transfer_must_have_the_same_ledger_as_accounts
+    assert 8 not in with_ledgers
+
+
+def test_submit_holds_the_batch_until_the_reply():
+    client = TigerBeetleClient(MockLib(latency=0.05))
+    try:
+        batch = TransferBatch()
+        batch.add(id=1, debit_account_id=10, credit_account_id=20, amount=1, ledger=1, code=1)
+        future = batch.submit(client)
+        with pytest.raises(RuntimeError):
+            batch.clear()
+        with pytest.raises(RuntimeError):
+            batch.add(id=2, debit_account_id=10, credit_account_id=20, amount=1, ledger=1, code=1)
+        assert not future.result()
+        batch.clear()
+        batch.add(id=2, debit_account_id=10, credit_account_id=20, amount=1, ledger=1, code=1)
+        assert not batch.submit(client).result()
+        assert sorted(client.lib.replica.transfers) == [1, 2]
+    finally:
+        client.deinit()
+
+
+def test_submit_refuses_an_invalid_batch(client):
+    batch = TransferBatch()
+    batch.add(id=1, debit_account_id=10, credit_account_id=10, amount=1, ledger=1, code=1)
+    with pytest.raises(CreateError):
+        batch.submit(client)
+    assert not client.lib.replica.transfers
+    batch.clear()
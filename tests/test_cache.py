@@ -0,0 +1,61 @@
+import math
+
+import pytest
+
+from tigerbeetle_client.cache import LookupCache
+from tigerbeetle_client.client2 import TB_OPERATION_LOOKUP_ACCOUNTS, TB_OPERATION_LOOKUP_TRANSFERS, tb_account_t, tb_transfer_t
+
+
+@pytest.fixture
+def lookups(client):
+    """Every lookup the cache sends to the client, as (operation, ids)."""
+    sent = []
+    submit = client.submit
+
+    def recording(operation, events):
+        if operation in (TB_OPERATION_LOOKUP_ACCOUNTS, TB_OPERATION_LOOKUP_TRANSFERS):
+            sent.append((operation, [int(id) for id in events]))
+        return submit(operation, events)
+
+    client.submit = recording
+    client.create_accounts([tb_account_t(id=id, ledger=1, code=1) for id in (1, 2, 3)])
+    client.create_transfers([tb_transfer_t(id=10, debit_account_id=1, credit_account_id=2, amount=5, ledger=1, code=1)])
+    return sent
+
+
+def test_transfers_are_served_from_the_cache(client, lookups):
+    cache = LookupCache(client)
+    assert [int(transfer.id) for transfer in cache.lookup_transfers([10, 11])] == [10]
+    assert [int(transfer.id) for transfer in cache.lookup_transfers([10])] == [10]
+    assert lookups == [(TB_OPERATION_LOOKUP_TRANSFERS, [10, 11])]
+    assert cache.stats()['hits'] == 1
+
+
+def test_accounts_are_served_while_fresh(client, lookups):
+    cache = LookupCache(client, max_staleness=0)
+    cache.lookup_accounts([1, 2])
+    cache.lookup_accounts([1, 3])
+    assert lookups == [(TB_OPERATION_LOOKUP_ACCOUNTS, [1, 2]), (TB_OPERATION_LOOKUP_ACCOUNTS, [1, 3])]
+    # Immutable fields only: any age will do
+    assert [int(account.id) for account in cache.lookup_accounts([3, 2, 1], max_staleness=math.inf)] == [3, 2, 1]
+    assert len(lookups) == 2
+
+
+def test_created_transfers_invalidate_their_accounts(client, lookups):
+    cache = LookupCache(client, max_staleness=60)
+    assert [account.debits_posted for account in cache.lookup_accounts([1, 3])] == [5, 0]
+    assert not cache.create_transfers([tb_transfer_t(id=11, debit_account_id=1, credit_account_id=2, amount=7, ledger=1, code=1)])
+    assert [account.debits_posted for account in cache.lookup_accounts([1, 3])] == [12, 0]
+    assert lookups[-1] == (TB_OPERATION_LOOKUP_ACCOUNTS, [1])
+
+
+def test_least_recently_used_entries_are_dropped(client, lookups):
+    cache = LookupCache(client, max_entries=2, max_staleness=60)
+    cache.lookup_accounts([1, 2])
+    cache.lookup_accounts([1])
+    cache.lookup_accounts([3])
+    assert cache.stats()['accounts'] == 2
+    cache.lookup_accounts([1, 3])
+    cache.lookup_accounts([2])
+    assert lookups[-1] == (TB_OPERATION_LOOKUP_ACCOUNTS, [2])
+    assert len(lookups) == 3
@@ -0,0 +1,77 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from tigerbeetle_client import importer, uint128
+from tigerbeetle_client.checkpoint import Checkpoint, row_ids
+from tigerbeetle_client.client2 import tb_account_t
+
+
+def test_row_ids_are_deterministic_and_sequential():
+    ids = uint128.from_pairs(row_ids('backfill', [0, 1, 5]))
+    assert ids == uint128.from_pairs(row_ids('backfill', np.array([0, 1, 5])))
+    assert [id - ids[0] for id in ids] == [0, 1, 5]
+    assert all(id >> 64 and id & (2**64 - 1) for id in ids)
+    assert not set(ids) & set(uint128.from_pairs(row_ids('other', [0, 1, 5])))
+
+
+def test_ranges_merge(tmp_path):
+    with Checkpoint(str(tmp_path / 'job.ckpt')) as checkpoint:
+        checkpoint.record([0, 1, 2, 7, 8])
+        checkpoint.record([3, 4])
+        checkpoint.add(20, 30)
+        checkpoint.add(25, 40)
+        assert (checkpoint.starts, checkpoint.ends) == ([0, 7, 20], [5, 9, 40])
+        assert len(checkpoint) == 27
+        assert checkpoint.covered([9, 4, 0, 5, 39, 40, 8]).tolist() == [False, True, True, False, True, False, True]
+
+
+def test_reopening_ignores_a_torn_line_and_compacts(tmp_path):
+    path = tmp_path / 'job.ckpt'
+    path.write_text('0 10\n10 20\n60 55\n40 50\n30 4')
+    with Checkpoint(str(path)) as checkpoint:
+        assert (checkpoint.starts, checkpoint.ends) == ([0, 40], [20, 50])
+    assert path.read_text() == '0 20\n40 50\n'
+
+
+class Crash(Exception):
+    pass
+
+
+def crash_after(client, packets):
+    submit_buffer = client.submit_buffer
+    sent = []
+
+    def submit(*args):
+        if len(sent) == packets:
+            raise Crash
+        sent.append(None)
+        return submit_buffer(*args)
+    client.submit_buffer = submit
+
+
+def test_an_interrupted_import_resumes_where_it_stopped(client, tmp_path):
+    client.create_accounts([tb_account_t(id=id, ledger=1, code=1) for id in (1, 2)])
+    chunk = {'debit_account_id': np.full(50, 1), 'credit_account_id': np.full(50, 2), 'amount': np.arange(1, 51)}
+    path = str(tmp_path / 'job.ckpt')
+    job = dict(defaults={'ledger': 1, 'code': 1}, batch_size=10, id_namespace='job')
+
+    crash_after(client, 3)
+    with Checkpoint(path) as checkpoint, pytest.raises(Crash):
+        importer.import_chunks(client, 'transfers', [chunk], checkpoint=checkpoint, **job)
+    with Checkpoint(path) as checkpoint:
+        assert len(checkpoint) == 30
+    assert len(client.lib.replica.transfers) == 30
+
+    # Lose the last journal line, as if the process died before writing it
+    with open(path, 'w') as file:
+        file.write('0 20\n')
+    del client.submit_buffer
+    with Checkpoint(path) as checkpoint:
+        result = importer.import_chunks(client, 'transfers', [chunk], checkpoint=checkpoint, **job)
+        assert len(checkpoint) == 50
+    # The 10 rows sent again already existed, which is not a failure
+    assert (result.rows, result.skipped, result.failed, result.batches) == (50, 20, 0, 3)
+    ids = uint128.from_pairs(row_ids('job', range(50)))
+    assert sorted(client.lib.replica.transfers) == sorted(ids)
+    assert [client.lib.replica.transfers[id].amount for id in ids] == list(range(1, 51))
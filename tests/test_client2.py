@@ -0,0 +1,95 @@
+import asyncio
+import concurrent.futures
+import os
+import platform
+
+import pytest
+
+from benchmarks.mock_replica import MockLib
+from tigerbeetle_client import client1, client2
+from tigerbeetle_client.client2 import (
+    TB_OPERATION_CREATE_ACCOUNTS,
+    TB_OPERATION_GET_ACCOUNT_TRANSFERS,
+    TB_PACKET_INVALID_OPERATION,
+    PacketError,
+    TigerBeetleClient,
+    tb_account_filter_t,
+    tb_account_t,
+)
+from tigerbeetle_client.results import CreateAccountResult
+
+
+@pytest.fixture
+def linux_x64(monkeypatch):
+    monkeypatch.delenv(client2.LIBRARY_PATH_ENV, raising=False)
+    monkeypatch.setattr(platform, 'system', lambda: 'Linux')
+    monkeypatch.setattr(platform, 'machine', lambda: 'x86_64')
+    monkeypatch.setattr(platform, 'libc_ver', lambda: ('glibc', '2.36'))
+
+
+def test_library_path_is_found_from_any_working_directory(linux_x64, monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    path = client2.library_path()
+    assert os.path.isabs(path) and os.path.exists(path)
+    assert path.endswith(os.path.join('native', 'linux-x64', 'libtb_client.so'))
+    assert client1.get_library_path() == path
+
+
+def test_library_path_rejects_other_libcs(linux_x64, monkeypatch):
+    monkeypatch.setattr(platform, 'libc_ver', lambda: ('', ''))
+    with pytest.raises(OSError, match='glibc'):
+        client2.library_path()
+
+
+def test_library_path_override_wins(linux_x64, monkeypatch):
+    monkeypatch.setenv(client2.LIBRARY_PATH_ENV, '/opt/tb/libtb_client.so')
+    monkeypatch.setattr(platform, 'libc_ver', lambda: ('', ''))
+    assert client1.get_library_path() == '/opt/tb/libtb_client.so'
+
+
+def test_client1_is_a_deprecated_wrapper_over_client2():
+    with pytest.warns(DeprecationWarning):
+        client = client1.Client(0, ['127.0.0.1:3000'], lib=MockLib())
+    accounts = [client1.TBAccount(id=i, ledger=1, code=718) for i in (1, 2)]
+    assert not client.create_accounts(accounts)
+    assert sorted(client.client.lib.replica.accounts) == [1, 2]
+    failures = client.create_accounts(accounts[:1])
+    assert [failure.index for failure in failures] == [0]
+
+
+def accounts(ids):
+    return [tb_account_t(id=id, ledger=1, code=1) for id in ids]
+
+
+def test_requests_in_flight_resolve_their_own_futures():
+    client = TigerBeetleClient(MockLib(latency=0.001), packets_count=4)
+    try:
+        # More requests than packets: submitters wait for a packet instead of failing
+        with concurrent.futures.ThreadPoolExecutor(8) as executor:
+            futures = list(executor.map(lambda id: client.submit(TB_OPERATION_CREATE_ACCOUNTS, accounts([id, 1])), range(2, 34)))
+        results = [future.result(timeout=5) for future in futures]
+        assert sum(len(result) for result in results) == 31
+        assert all(failure.result == CreateAccountResult.exists for result in results for failure in result)
+        assert sorted(client.lib.replica.accounts) == list(range(1, 34))
+        assert client.packets.in_use() == 0
+    finally:
+        client.deinit()
+
+
+def test_lookups_return_structs_in_request_order(client):
+    client.create_accounts(accounts([1, 2, 3]))
+    assert [int(account.id) for account in client.lookup_accounts([3, 7, 1])] == [3, 1]
+    assert client.lookup_accounts([]) == []
+
+
+def test_packet_errors_fail_the_future(client):
+    future = client.submit(TB_OPERATION_GET_ACCOUNT_TRANSFERS, [tb_account_filter_t(account_id=1, limit=10)])
+    with pytest.raises(PacketError) as error:
+        future.result(timeout=5)
+    assert error.value.status == TB_PACKET_INVALID_OPERATION
+
+
+def test_submit_async(client):
+    async def main():
+        return await client.create_accounts_async(accounts([1, 1]))
+    assert [(failure.index, failure.result) for failure in asyncio.run(main())] == [(1, CreateAccountResult.exists)]
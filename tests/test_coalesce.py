@@ -0,0 +1,79 @@
+import concurrent.futures
+import types
+
+import pytest
+
+from tigerbeetle_client.client2 import TB_OPERATION_LOOKUP_ACCOUNTS as LOOKUP, tb_account_t, tb_transfer_t
+from tigerbeetle_client.coalesce import Coalescer
+
+
+class Sender:
+    """Records the packets a Coalescer sends and answers them on demand."""
+
+    def __init__(self):
+        self.packets = []
+
+    def __call__(self, operation, ids):
+        future = concurrent.futures.Future()
+        self.packets.append((ids, future))
+        return future
+
+    def answer(self, index, missing=()):
+        ids, future = self.packets[index]
+        future.set_result([types.SimpleNamespace(id=id) for id in ids if id not in missing])
+
+
+def ids(future):
+    return [value.id for value in future.result(timeout=1)]
+
+
+def test_lookups_in_flight_are_shared():
+    send = Sender()
+    coalescer = Coalescer(send)
+    first = coalescer.submit(LOOKUP, [1, 2])
+    second = coalescer.submit(LOOKUP, [2, 3, 3])
+    assert [packet for packet, _ in send.packets] == [[1, 2], [3]]
+    send.answer(0)
+    assert ids(first) == [1, 2]
+    assert not second.done()
+    send.answer(1)
+    assert ids(second) == [2, 3, 3]
+    assert not coalescer.busy()
+
+
+def test_missing_ids_and_errors_reach_every_caller():
+    send = Sender()
+    coalescer = Coalescer(send)
+    first = coalescer.submit(LOOKUP, [1, 2])
+    second = coalescer.submit(LOOKUP, [2])
+    send.answer(0, missing={2})
+    assert ids(first) == [1] and ids(second) == []
+    third = coalescer.submit(LOOKUP, [4])
+    fourth = coalescer.submit(LOOKUP, [4])
+    send.packets[1][1].set_exception(RuntimeError("lost"))
+    for future in (third, fourth):
+        with pytest.raises(RuntimeError):
+            future.result(timeout=1)
+
+
+def test_forgotten_ids_are_sent_again():
+    send = Sender()
+    coalescer = Coalescer(send)
+    coalescer.submit(LOOKUP, [1])
+    coalescer.forget(LOOKUP, [1])
+    coalescer.submit(LOOKUP, [1])
+    assert [packet for packet, _ in send.packets] == [[1], [1]]
+
+
+def test_a_create_transfer_stops_later_lookups_joining_an_older_one(client):
+    client.create_accounts([tb_account_t(id=id, ledger=1, code=1) for id in (1, 2)])
+    sent = []
+    send = client.coalescer.send
+    client.coalescer.send = lambda operation, ids: (sent.append(ids), send(operation, ids))[1]
+    client.lib.latency = 0.05
+    before = client.submit(LOOKUP, [1])
+    client.create_transfers([tb_transfer_t(id=9, debit_account_id=1, credit_account_id=2, amount=3, ledger=1, code=1)])
+    after = client.submit(LOOKUP, [1])
+    assert sent == [[1], [1]]
+    assert before.result(timeout=5)[0].debits_posted == 0
+    assert after.result(timeout=5)[0].debits_posted == 3
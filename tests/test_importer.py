@@ -0,0 +1,102 @@
+import csv
+import io
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from tigerbeetle_client import importer
+from tigerbeetle_client.client2 import TB_TRANSFER_LINKED, tb_account_t
+from tigerbeetle_client.results import CreateTransferResult
+
+
+def packet_sizes(client):
+    sizes = []
+    submit_buffer = client.submit_buffer
+
+    def spy(operation, data, size, *args):
+        sizes.append(size // importer.TRANSFER_DTYPE.itemsize)
+        return submit_buffer(operation, data, size, *args)
+    client.submit_buffer = spy
+    return sizes
+
+
+def transfer_chunk(ids, **columns):
+    chunk = {'id': np.array(ids), 'debit_account_id': np.full(len(ids), 1), 'credit_account_id': np.full(len(ids), 2),
+             'amount': np.full(len(ids), 5)}
+    chunk.update({name: np.array(values) for name, values in columns.items()})
+    return chunk
+
+
+@pytest.fixture
+def ledger(client):
+    client.create_accounts([tb_account_t(id=id, ledger=1, code=1) for id in (1, 2)])
+    return client
+
+
+def test_packets_are_full_across_chunks(ledger):
+    sizes = packet_sizes(ledger)
+    chunks = [transfer_chunk(range(1, 8)), transfer_chunk(range(8, 11)), transfer_chunk(range(11, 23))]
+    result = importer.import_chunks(ledger, 'transfers', chunks, defaults={'ledger': 1, 'code': 1}, batch_size=5)
+    assert (result.rows, result.failed, result.batches) == (22, 0, 5)
+    assert sizes == [5, 5, 5, 5, 2]
+    assert sorted(ledger.lib.replica.transfers) == list(range(1, 23))
+
+
+def test_linked_chains_stay_in_one_packet(ledger):
+    sizes = packet_sizes(ledger)
+    flags = [0, 0, 0, TB_TRANSFER_LINKED, TB_TRANSFER_LINKED, 0, 0, 0]
+    importer.import_chunks(ledger, 'transfers', [transfer_chunk(range(1, 9), flags=flags)],
+                           defaults={'ledger': 1, 'code': 1}, batch_size=4)
+    assert sizes == [3, 4, 1]
+
+
+def test_failed_rows_are_reported_with_their_row_numbers(ledger):
+    failures = io.StringIO()
+    chunks = [transfer_chunk([1, 2]), transfer_chunk([2, 1, 3])]
+    result = importer.import_chunks(ledger, 'transfers', chunks, defaults={'ledger': 1, 'code': 1}, batch_size=2,
+                                    failures=csv.writer(failures))
+    assert (result.rows, result.failed) == (5, 2)
+    rows = sorted(csv.reader(io.StringIO(failures.getvalue())))
+    assert rows == [
+        ['2', str(int(CreateTransferResult.exists)), 'exists'],
+        ['3', str(int(CreateTransferResult.exists)), 'exists'],
+    ]
+
+
+def test_columns_are_mapped_and_checked(ledger):
+    chunk = {'from': np.array([1]), 'to': np.array([2]), 'tx': np.array([7]), 'amount': np.array([9])}
+    columns = {'id': 'tx', 'debit_account_id': 'from', 'credit_account_id': 'to', 'amount': 'amount'}
+    importer.import_chunks(ledger, 'transfers', [chunk], columns, defaults={'ledger': 1, 'code': 1})
+    assert ledger.lib.replica.transfers[7].amount == 9
+    with pytest.raises(ValueError, match='Unknown fields'):
+        importer.import_chunks(ledger, 'transfers', [chunk], {'payee': 'to'})
+    with pytest.raises(ValueError, match='missing'):
+        importer.import_chunks(ledger, 'transfers', [chunk], {'id': 'nope'})
+    with pytest.raises(ValueError, match='amount'):
+        importer.import_chunks(ledger, 'transfers', [transfer_chunk([8], amount=[-1])], defaults={'ledger': 1, 'code': 1})
+
+
+@pytest.mark.parametrize('reader', ['pyarrow', 'fallback'])
+def test_csv_files(ledger, tmp_path, monkeypatch, reader):
+    if reader == 'pyarrow':
+        pytest.importorskip('pyarrow')
+    else:
+        monkeypatch.setattr(importer, 'read_chunks', lambda path, format, chunk_rows, columns: importer.read_csv_fallback(path, chunk_rows))
+    path = tmp_path / 'transfers.csv'
+    big = 2**64 + 3
+    path.write_text(f'id,debit_account_id,credit_account_id,amount,user_data_32\n1,1,2,10,\n{big},1,2,20,4\n{big},1,2,20,4\n')
+    failures = tmp_path / 'failed.csv'
+    result = importer.import_file(ledger, str(path), 'transfers', defaults={'ledger': 1, 'code': 1},
+                                  chunk_rows=1, failures=str(failures))
+    assert (result.rows, result.failed) == (3, 1)
+    assert ledger.lib.replica.transfers[big].user_data_32 == 4
+    assert ledger.lib.replica.transfers[1].user_data_32 == 0
+    assert failures.read_text().splitlines() == ['row,code,result', f'2,{int(CreateTransferResult.exists)},exists']
+
+
+def test_formats_are_detected_from_the_extension():
+    assert importer.detect_format('a/b.PARQUET') == 'parquet'
+    assert importer.detect_format('b.feather') == 'arrow'
+    with pytest.raises(ValueError):
+        importer.detect_format('b.json')
@@ -0,0 +1,66 @@
+import json
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from benchmarks.mock_replica import MockLib
+from tigerbeetle_client import loadgen
+from tigerbeetle_client.client2 import TB_TRANSFER_LINKED, TigerBeetleClient
+
+
+def test_the_same_seed_sends_the_same_transfers():
+    first, second, other = (loadgen.Workload(accounts=100, batch_size=50, zipf=1.0, seed=seed) for seed in (3, 3, 4))
+    a, b = first.batch(first.template()), second.batch(second.template())
+    assert a.tobytes() == b.tobytes()
+    assert a.tobytes() != other.batch(other.template()).tobytes()
+    assert first.batch(first.template())['id'][0, 0] == a['id'][-1, 0] + 1
+
+
+def test_transfers_have_two_accounts_and_skew():
+    workload = loadgen.Workload(accounts=1000, batch_size=8000, zipf=1.2)
+    batch = workload.template()
+    debits, credits = batch['debit_account_id'][:, 0], batch['credit_account_id'][:, 0]
+    assert (debits != credits).all()
+    assert debits.min() >= 1 and max(debits.max(), credits.max()) <= 1000
+    # Under Zipf 1.2 the hottest account takes a large share, far above uniform's 1/1000
+    assert np.bincount(debits).max() > 0.1 * len(debits)
+    assert np.bincount(loadgen.Workload(accounts=1000, batch_size=8000).template()['debit_account_id'][:, 0]).max() < 40
+
+
+def test_chains_end_with_an_unlinked_transfer():
+    batch = loadgen.Workload(accounts=10, batch_size=400, linked_ratio=0.5, chain_length=4).template()
+    linked = (batch['flags'] & TB_TRANSFER_LINKED).reshape(-1, 4) != 0
+    chains = linked.any(axis=1)
+    assert 0 < chains.sum() < len(chains)
+    assert (linked[chains, :3].all() and not linked[:, 3].any())
+
+
+def test_run_reports_what_the_cluster_acknowledged():
+    client = TigerBeetleClient(MockLib(), packets_count=4)
+    try:
+        report = loadgen.run(client, loadgen.Workload(accounts=50, batch_size=100), duration=0.1, in_flight=4)
+    finally:
+        client.deinit()
+    assert report['events_sent'] == report['events_acknowledged'] == report['batches'] * 100 > 0
+    assert report['failed_results'] == {} and report['packet_errors'] == 0
+    assert len(client.lib.replica.transfers) == report['events_sent']
+
+
+def test_latency_counts_from_when_a_batch_was_due():
+    # Batches are due every millisecond but each takes ten: latency keeps growing, service time doesn't
+    client = TigerBeetleClient(MockLib(latency=0.01), packets_count=1)
+    try:
+        report = loadgen.run(client, loadgen.Workload(accounts=10, batch_size=10), rate=10_000, duration=0.1, in_flight=1)
+    finally:
+        client.deinit()
+    assert report['latency_ms']['max'] > 3 * report['service_time_ms']['max']
+
+
+def test_command_line(capsys):
+    assert loadgen.main(['--stand-in', '--accounts', '20', '--batch-size', '10', '--duration', '0.05', '--json']) == 0
+    report = json.loads(capsys.readouterr().out)
+    assert report['events_acknowledged'] == report['events_sent']
+    assert loadgen.main(['--stand-in', '--stand-in-latency', '0.005', '--accounts', '20', '--batch-size', '10',
+                         '--duration', '0.05', '--max-p99-ms', '0.001']) == 1
+    assert 'latency_ms: count=' in capsys.readouterr().out
@@ -0,0 +1,54 @@
+import random
+
+from tigerbeetle_client.client2 import TB_OPERATION_CREATE_ACCOUNTS, TB_OPERATION_GET_ACCOUNT_TRANSFERS, tb_account_filter_t, tb_account_t
+from tigerbeetle_client.metrics import Histogram, Metrics, bucket_index, bucket_upper_bound, prometheus_text
+from tigerbeetle_client.results import CreateAccountResult
+
+
+def test_buckets_bound_values_within_a_thirty_second():
+    for value in [0, 1, 31, 32, 33, 1000, 123_456_789, 1 << 40]:
+        upper = bucket_upper_bound(bucket_index(value))
+        assert value <= upper <= value + value // 32
+        assert bucket_index(upper) == bucket_index(value)
+
+
+def test_quantiles_match_the_recorded_values():
+    rng = random.Random(7)
+    values = [rng.randrange(1, 10_000_000) for _ in range(10_000)]
+    histogram = Histogram()
+    for value in values:
+        histogram.record(value)
+    values.sort()
+    for q in (0.5, 0.9, 0.99):
+        exact = values[int(q * len(values)) - 1]
+        assert exact <= histogram.quantile(q) <= exact * 1.04
+    assert histogram.quantile(1) == histogram.max == values[-1]
+    assert Histogram().quantile(0.5) == 0
+
+
+def test_clients_record_latency_batches_and_results(client):
+    completions = []
+    client.metrics.add_listener(lambda *completion: completions.append(completion))
+    client.create_accounts([tb_account_t(id=id, ledger=1, code=1) for id in (1, 1, 2)])
+    client.submit(TB_OPERATION_GET_ACCOUNT_TRANSFERS, [tb_account_filter_t(account_id=1, limit=1)]).exception(timeout=5)
+    snapshot = client.metrics.snapshot()
+    assert snapshot['batch_size'][TB_OPERATION_CREATE_ACCOUNTS]['max'] == 3
+    assert snapshot['latency_seconds'][TB_OPERATION_CREATE_ACCOUNTS]['count'] == 1
+    assert snapshot['result_codes'] == {(TB_OPERATION_CREATE_ACCOUNTS, CreateAccountResult.exists): 1}
+    assert list(snapshot['packet_errors']) == [(TB_OPERATION_GET_ACCOUNT_TRANSFERS, 2)]
+    assert snapshot['gauges'] == {'packets_in_flight': 0}
+    assert [completion[0] for completion in completions] == [TB_OPERATION_CREATE_ACCOUNTS, TB_OPERATION_GET_ACCOUNT_TRANSFERS]
+
+    text = prometheus_text(snapshot)
+    assert f'tigerbeetle_client_batch_size_count{{operation="{TB_OPERATION_CREATE_ACCOUNTS}"}} 1' in text
+    assert f'tigerbeetle_client_result_codes_total{{operation="{TB_OPERATION_CREATE_ACCOUNTS}",result="21"}} 1' in text
+    assert 'tigerbeetle_client_packets_in_flight 0' in text
+
+
+def test_reset_keeps_gauges():
+    metrics = Metrics()
+    metrics.add_gauge('depth', lambda: 3)
+    metrics.record(TB_OPERATION_CREATE_ACCOUNTS, 1, 0, 10, 30, 0)
+    metrics.reset()
+    assert metrics.snapshot()['latency_seconds'] == {}
+    assert metrics.snapshot()['gauges'] == {'depth': 3}
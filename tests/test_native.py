@@ -0,0 +1,75 @@
+import threading
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from benchmarks.mock_replica import NativeMockLib
+from tigerbeetle_client import arrays, native
+from tigerbeetle_client.client2 import TB_OPERATION_CREATE_ACCOUNTS, tb_account_t
+
+pytestmark = pytest.mark.skipif(not native.available(), reason="the _native extension is not built")
+
+
+@pytest.fixture
+def client():
+    client = native.NativeClient(NativeMockLib(), packets_count=4)
+    yield client
+    client.deinit()
+
+
+def accounts_array(ids):
+    accounts = np.zeros(len(ids), dtype=arrays.ACCOUNT_DTYPE)
+    accounts['id'] = arrays.uint128.to_pairs(ids)
+    accounts['ledger'] = 1
+    accounts['code'] = 1
+    return accounts
+
+
+def test_creates_and_lookups(client):
+    assert not client.create_accounts([tb_account_t(id=id, ledger=1, code=1) for id in (1, 2)])
+    assert [failure.index for failure in client.create_accounts([tb_account_t(id=2, ledger=1, code=1)])] == [0]
+    assert [int(account.id) for account in client.lookup_accounts([2, 3, 1])] == [2, 1]
+
+
+def test_arrays_are_converted_to_the_operations_layout(client):
+    # A strided view is made contiguous before its buffer is copied into the packet
+    accounts = accounts_array([1, 2, 3, 4])[::-1][::2]
+    assert not client.submit(TB_OPERATION_CREATE_ACCOUNTS, accounts).result()
+    assert sorted(client.lib.replica.accounts) == [2, 4]
+
+
+def test_unpacked_or_partial_buffers_are_rejected(client):
+    with pytest.raises(TypeError):
+        client.submit(TB_OPERATION_CREATE_ACCOUNTS, np.zeros(256, dtype=np.uint8))
+    with pytest.raises(ValueError):
+        client.submit(TB_OPERATION_CREATE_ACCOUNTS, bytes(100))
+    assert not client.lib.replica.accounts
+
+
+def test_deinit_while_submitting():
+    client = native.NativeClient(NativeMockLib(latency=0.001), packets_count=2)
+    futures, errors = [], []
+
+    def submit(first):
+        for id in range(first, first + 1000):
+            try:
+                futures.append(client.submit(TB_OPERATION_CREATE_ACCOUNTS, accounts_array([id])))
+            except RuntimeError as e:
+                errors.append(e)
+                return
+
+    threads = [threading.Thread(target=submit, args=(n * 1000 + 1,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    while len(futures) < 10:
+        threading.Event().wait(0.001)
+    client.deinit()
+    for thread in threads:
+        thread.join()
+    assert len(errors) == 4
+    # Every submitted request either completed or failed; none is left hanging
+    for future in futures:
+        assert future.exception(timeout=5) is None or isinstance(future.exception(), RuntimeError)
+    with pytest.raises(RuntimeError):
+        client.submit(TB_OPERATION_CREATE_ACCOUNTS, accounts_array([1]))
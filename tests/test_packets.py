@@ -0,0 +1,39 @@
+import mmap
+
+import pytest
+
+from benchmarks.mock_replica import MockLib
+from tigerbeetle_client.client2 import TB_OPERATION_CREATE_ACCOUNTS, TigerBeetleClient, tb_account_t, tb_packet_t
+from tigerbeetle_client.packets import PacketPool
+
+
+def test_slots_are_checked_out_and_returned():
+    pool = PacketPool(tb_packet_t, 2)
+    first, second = pool.acquire(), pool.acquire()
+    assert {first, second} == {0, 1} and pool.in_use() == 2
+    with pytest.raises(TimeoutError):
+        pool.acquire(timeout=0.01)
+    pool.release(first)
+    assert pool.acquire(timeout=0.01) == first
+
+
+def test_buffers_are_page_aligned_and_reused():
+    pool = PacketPool(tb_packet_t, 2, buffer_size=4096)
+    address = pool.buffer(1)
+    assert address % mmap.PAGESIZE == 0
+    assert pool.buffer(1) == address
+    assert pool.buffers[0] is None
+
+
+def test_events_are_copied_into_the_packets_own_buffer():
+    client = TigerBeetleClient(MockLib(latency=0.05), packets_count=1)
+    try:
+        accounts = (tb_account_t * 2)(tb_account_t(id=1, ledger=1, code=1), tb_account_t(id=2, ledger=1, code=1))
+        future = client.submit(TB_OPERATION_CREATE_ACCOUNTS, accounts)
+        # The caller's array can be reused as soon as submit returns
+        accounts[0].id = 3
+        assert not future.result(timeout=5)
+        assert sorted(client.lib.replica.accounts) == [1, 2]
+        assert client.packets.in_use() == 0
+    finally:
+        client.deinit()
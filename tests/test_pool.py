@@ -0,0 +1,44 @@
+import os
+
+import pytest
+
+from benchmarks.mock_replica import MockLib
+from tigerbeetle_client.client2 import TB_OPERATION_CREATE_ACCOUNTS, tb_account_t
+from tigerbeetle_client.pool import ClientPool
+
+
+@pytest.fixture
+def pool():
+    pool = ClientPool(MockLib(latency=0.01), size=3, packets_per_client=2)
+    yield pool
+    pool.close()
+
+
+def accounts(ids):
+    return [tb_account_t(id=id, ledger=1, code=1) for id in ids]
+
+
+def test_requests_spread_over_the_least_loaded_handles(pool):
+    futures = [pool.submit(TB_OPERATION_CREATE_ACCOUNTS, accounts([id])) for id in range(1, 7)]
+    stats = pool.stats()
+    assert stats['clients'] == 3 and stats['capacity'] == 6
+    assert stats['in_flight_per_client'] == [2, 2, 2]
+    assert not any(future.result(timeout=5) for future in futures)
+    assert [int(account.id) for account in pool.lookup_accounts([6, 1])] == [6, 1]
+    assert pool.stats()['in_flight'] == 0
+
+
+def test_handles_are_recreated_in_a_forked_child(pool, monkeypatch):
+    pool.create_accounts(accounts([1]))
+    parents = list(pool.clients)
+    monkeypatch.setattr(os, 'getpid', lambda: -1)
+    assert not pool.create_accounts(accounts([2]))
+    assert all(client not in parents for client in pool.clients)
+    # In a real child these would belong to the parent; here, stop their mock replica threads
+    for client in parents:
+        client.lib.tb_client_deinit(client.context)
+
+
+def test_a_pool_needs_a_client():
+    with pytest.raises(ValueError):
+        ClientPool(MockLib(), size=0)
@@ -0,0 +1,93 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from tigerbeetle_client import uint128
+from tigerbeetle_client.arrays import TRANSFER_DTYPE
+from tigerbeetle_client.client2 import (
+    TB_TRANSFER_PENDING,
+    TB_TRANSFER_POST_PENDING_TRANSFER,
+    TB_TRANSFER_VOID_PENDING_TRANSFER,
+    tb_account_t,
+    tb_transfer_t,
+)
+from tigerbeetle_client.projection import BalanceProjection, ProjectionCorrupt, add_grouped
+
+
+def transfer(id, debit, credit, amount, ledger=1, **fields):
+    return tb_transfer_t(id=id, debit_account_id=debit, credit_account_id=credit, amount=amount, ledger=ledger, code=1, **fields)
+
+
+@pytest.fixture
+def ledger(client):
+    client.create_accounts([tb_account_t(id=id, ledger=1 if id < 10 else 2, code=1) for id in (1, 2, 3, 11, 12)])
+    return client
+
+
+def test_add_grouped_carries_exactly():
+    column = np.zeros((3, 2), dtype=np.uint64)
+    column[1] = uint128.split(2**64 - 1)
+    amounts = uint128.to_pairs([2**64 - 1, 1, 2**100, 5])
+    add_grouped(column, np.array([1, 1, 2, 1]), amounts)
+    assert uint128.from_pairs(column) == [0, 2 * (2**64 - 1) + 1 + 5, 2**100]
+
+
+def test_only_posted_amounts_are_projected(ledger, tmp_path):
+    assert not ledger.create_transfers([
+        transfer(1, 1, 2, 100),
+        transfer(2, 2, 3, 30),
+        transfer(3, 1, 3, 7, flags=TB_TRANSFER_PENDING),
+        transfer(4, 1, 3, 9, flags=TB_TRANSFER_PENDING),
+        transfer(5, 1, 3, 7, pending_id=3, flags=TB_TRANSFER_POST_PENDING_TRANSFER),
+        transfer(6, 1, 3, 9, pending_id=4, flags=TB_TRANSFER_VOID_PENDING_TRANSFER),
+        transfer(7, 11, 12, 2**70, ledger=2),
+    ])
+    with BalanceProjection(str(tmp_path / 'balances.tbp'), capacity=2) as projection:
+        assert projection.sync(ledger, page_size=2) == 7
+        assert projection.balances(1) == (107, 0)
+        assert [projection.balance(id) for id in (1, 2, 3, 11, 12, 99)] == [-107, 70, 37, -2**70, 2**70, 0]
+        assert projection.top(2, ledger=1) == [(2, 70), (3, 37)]
+        assert projection.top(1, ledger=1, lowest=True) == [(1, -107)]
+        assert projection.between(0, 50) == [(3, 37)]
+        assert projection.ledgers() == {1: (3, 137, 137), 2: (2, 2**70, 2**70)}
+
+
+def test_reopening_resumes_after_the_last_transfer(ledger, tmp_path):
+    path = str(tmp_path / 'balances.tbp')
+    ledger.create_transfers([transfer(1, 1, 2, 10)])
+    with BalanceProjection(path) as projection:
+        projection.sync(ledger)
+    ledger.create_transfers([transfer(2, 1, 2, 5), transfer(3, 11, 12, 1, ledger=2)])
+    with BalanceProjection(path) as projection:
+        assert projection.sync(ledger, ledger=1) == 1
+        assert projection.balance(2) == 15 and projection.balance(12) == 0
+        assert projection.sync(ledger, ledger=1) == 0
+
+
+def test_close_rankings_are_exact(tmp_path):
+    with BalanceProjection(str(tmp_path / 'balances.tbp')) as projection:
+        transfers = np.zeros(3, dtype=TRANSFER_DTYPE)
+        # Balances one apart at 2**80 are equal as float64
+        transfers['debit_account_id'] = uint128.to_pairs([9, 9, 9])
+        transfers['credit_account_id'] = uint128.to_pairs([1, 2, 3])
+        transfers['amount'] = uint128.to_pairs([2**80 + 1, 2**80 + 2, 2**80])
+        transfers['ledger'] = 1
+        transfers['timestamp'] = [1, 2, 3]
+        projection.apply(transfers)
+        assert projection.top(1) == [(2, 2**80 + 2)]
+        assert projection.between(2**80 + 1, 2**81) == [(1, 2**80 + 1), (2, 2**80 + 2)]
+        assert projection.timestamp == 3
+
+
+def test_an_interrupted_update_is_detected(ledger, tmp_path):
+    path = str(tmp_path / 'balances.tbp')
+    ledger.create_transfers([transfer(1, 1, 2, 10)])
+    with BalanceProjection(path) as projection:
+        projection.sync(ledger)
+        projection.header['dirty'] = 1
+    with pytest.raises(ProjectionCorrupt):
+        BalanceProjection(path)
+    with BalanceProjection(path, rebuild=True) as projection:
+        assert len(projection) == 0 and projection.balance(2) == 0
+        assert projection.sync(ledger) == 1
+        assert projection.balance(2) == 10
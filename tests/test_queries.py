@@ -0,0 +1,38 @@
+import pytest
+
+from tigerbeetle_client.client2 import TB_QUERY_FILTER_REVERSED, tb_account_t, tb_query_filter_t
+
+
+@pytest.fixture
+def accounts(client):
+    assert not client.create_accounts([tb_account_t(id=id, ledger=1, code=1) for id in range(1, 26)])
+    return client
+
+
+def ids(results):
+    return [int(result.id) for result in results]
+
+
+def test_paginate_yields_every_match_without_a_limit(accounts):
+    assert ids(accounts.iter_query_accounts(tb_query_filter_t(ledger=1), page_size=4)) == list(range(1, 26))
+
+
+def test_paginate_stops_at_the_filters_limit(accounts):
+    assert ids(accounts.iter_query_accounts(tb_query_filter_t(ledger=1, limit=10))) == list(range(1, 11))
+    assert ids(accounts.iter_query_accounts(tb_query_filter_t(ledger=1, limit=10), page_size=3)) == list(range(1, 11))
+
+
+def test_paginate_reversed_with_a_limit(accounts):
+    query_filter = tb_query_filter_t(ledger=1, limit=7, flags=TB_QUERY_FILTER_REVERSED)
+    assert ids(accounts.iter_query_accounts(query_filter, page_size=3, prefetch=False)) == list(range(25, 18, -1))
+
+
+def test_paginate_arrays_with_a_limit(accounts):
+    pages = list(accounts.iter_query_accounts(tb_query_filter_t(ledger=1, limit=5), page_size=2, as_array=True))
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert [int(id) for page in pages for id in page['id'][:, 0]] == [1, 2, 3, 4, 5]
+
+
+def test_paginate_rejects_an_oversized_page(accounts):
+    with pytest.raises(ValueError):
+        list(accounts.iter_query_accounts(tb_query_filter_t(ledger=1), page_size=10 ** 6))
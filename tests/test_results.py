@@ -0,0 +1,42 @@
+import array
+
+import pytest
+
+from tigerbeetle_client.client2 import tb_create_accounts_result_t
+from tigerbeetle_client.results import CreateError, CreateResults, CreateTransferResult as R, Failure
+
+
+def reply(*pairs):
+    return bytes((tb_create_accounts_result_t * len(pairs))(*[tb_create_accounts_result_t(index, code) for index, code in pairs]))
+
+
+def test_an_empty_reply_is_falsy():
+    results = CreateResults.from_buffer(R, b'', 0)
+    assert not results and len(results) == 0 and list(results) == []
+    assert results.raise_on_errors() is results
+
+
+def test_failures_decode_to_result_codes():
+    data = reply((1, R.exists), (4, R.exceeds_credits), (6, R.exists), (7, 1000))
+    results = CreateResults.from_buffer(R, data, len(data))
+    assert list(results) == [Failure(1, R.exists), Failure(4, R.exceeds_credits), Failure(6, R.exists), Failure(7, 1000)]
+    assert results[1] == (4, R.exceeds_credits)
+    assert results.failed_indices() == [1, 4, 6, 7]
+    assert results.group_by_result_code() == {R.exists: [1, 6], R.exceeds_credits: [4], 1000: [7]}
+    assert list(results.without(R.exists, 1000)) == [Failure(4, R.exceeds_credits)]
+
+
+def test_raise_on_errors_summarizes_the_codes():
+    results = CreateResults(R, array.array('I', [0, 2]), array.array('I', [R.exists, R.exists]))
+    with pytest.raises(CreateError, match='2 events failed \\(exists: 2\\)') as error:
+        results.raise_on_errors()
+    assert error.value.results is results
+
+
+def test_from_array_wraps_numpy_columns():
+    np = pytest.importorskip('numpy')
+    from tigerbeetle_client.arrays import CREATE_RESULT_DTYPE
+
+    failures = np.frombuffer(reply((3, R.exists)), dtype=CREATE_RESULT_DTYPE)
+    results = CreateResults.from_array(R, failures)
+    assert list(results) == [Failure(3, R.exists)] and results.failed_indices() == [3]
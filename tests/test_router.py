@@ -0,0 +1,120 @@
+import numpy as np
+import pytest
+
+from benchmarks.mock_replica import MockLib
+from tigerbeetle_client.arrays import ACCOUNT_DTYPE
+from tigerbeetle_client.builder import TransferBatch
+from tigerbeetle_client.client2 import TB_OPERATION_CREATE_ACCOUNTS, TB_OPERATION_CREATE_TRANSFERS, TigerBeetleClient
+from tigerbeetle_client.router import ByAccount, ByLedger, ShardedClient
+
+
+@pytest.fixture
+def clusters():
+    clients = [TigerBeetleClient(MockLib()), TigerBeetleClient(MockLib())]
+    yield clients
+    for client in clients:
+        client.deinit()
+
+
+def transfer_ids(client):
+    return set(client.lib.replica.transfers)
+
+
+def make_accounts(count):
+    accounts = np.zeros(count, dtype=ACCOUNT_DTYPE)
+    accounts['id'][:, 0] = np.arange(1, count + 1)
+    accounts['ledger'] = 1 + accounts['id'][:, 0] % 2
+    accounts['code'] = 1
+    return accounts
+
+
+@pytest.mark.parametrize('shard', [ByLedger({1: 0, 2: 1}), ByAccount(2)], ids=['by-ledger', 'by-account'])
+def test_post_and_void_go_to_the_pending_transfers_cluster(clusters, shard):
+    router = ShardedClient(clusters, shard)
+    accounts = make_accounts(16)
+    assert not len(router.create_accounts_array(accounts))
+    homes = shard.route(TB_OPERATION_CREATE_ACCOUNTS, accounts)
+
+    # Two pending transfers per cluster, each between two accounts of that cluster and one ledger
+    batch, pending = TransferBatch(), {}
+    for cluster in (0, 1):
+        for ledger in (1, 2):
+            ids = [int(id) for id, home, account_ledger in zip(accounts['id'][:, 0], homes, accounts['ledger']) if home == cluster and account_ledger == ledger]
+            if len(ids) >= 2 and list(pending.values()).count(cluster) < 2:
+                id = 100 + len(pending)
+                batch.pending(id=id, debit_account_id=ids[0], credit_account_id=ids[1], amount=5, ledger=ledger, code=1)
+                pending[id] = cluster
+    assert set(pending.values()) == {0, 1}
+    assert not router.submit(TB_OPERATION_CREATE_TRANSFERS, batch.events()).result()
+
+    # Posts and voids carry only the pending id; the mock replica rejects one it doesn't hold
+    resolve = TransferBatch()
+    for k, id in enumerate(pending):
+        if k % 2:
+            resolve.post(id=200 + k, pending_id=id)
+        else:
+            resolve.void(id=200 + k, pending_id=id)
+    assert not router.submit(TB_OPERATION_CREATE_TRANSFERS, resolve.events()).result()
+    for k, cluster in enumerate(pending.values()):
+        assert 200 + k in transfer_ids(clusters[cluster])
+    assert not router.pending
+
+
+def test_post_of_a_pending_transfer_from_elsewhere_needs_its_ledger_and_accounts(clusters):
+    router = ShardedClient(clusters, ByLedger({1: 0, 2: 1}))
+    clusters[1].create_accounts_array(make_accounts(4)[1::2])
+    created = TransferBatch()
+    created.pending(id=1, debit_account_id=2, credit_account_id=4, amount=1, ledger=2, code=1)
+    assert not clusters[1].submit(TB_OPERATION_CREATE_TRANSFERS, created.events()).result()
+
+    bare = TransferBatch()
+    bare.post(id=2, pending_id=1)
+    with pytest.raises(ValueError, match="did not create"):
+        router.submit(TB_OPERATION_CREATE_TRANSFERS, bare.events())
+
+    routable = TransferBatch()
+    routable.post(id=2, pending_id=1, debit_account_id=2, credit_account_id=4, ledger=2)
+    assert not router.submit(TB_OPERATION_CREATE_TRANSFERS, routable.events()).result()
+    assert 2 in transfer_ids(clusters[1])
+
+
+@pytest.fixture
+def tied(clusters):
+    # Each mock replica numbers its own timestamps from 1, so the clusters tie on every timestamp
+    router = ShardedClient(clusters, ByAccount(2))
+    accounts = make_accounts(40)
+    assert not len(router.create_accounts_array(accounts))
+    return router
+
+
+def test_query_paging_through_every_cluster_is_exact(tied):
+    from tigerbeetle_client.client2 import tb_query_filter_t
+    rows = list(tied.iter_query_accounts(tb_query_filter_t(code=1), page_size=3))
+    assert sorted(int(row.id) for row in rows) == list(range(1, 41))
+    timestamps = [int(row.timestamp) for row in rows]
+    assert timestamps == sorted(timestamps)
+
+
+def test_query_paging_through_every_cluster_honors_limit_and_reversed(tied):
+    from tigerbeetle_client.client2 import TB_QUERY_FILTER_REVERSED, tb_query_filter_t
+    rows = list(tied.iter_query_accounts(tb_query_filter_t(code=1, limit=7, flags=TB_QUERY_FILTER_REVERSED), page_size=2))
+    assert len(rows) == 7
+    timestamps = [int(row.timestamp) for row in rows]
+    assert timestamps == sorted(timestamps, reverse=True)
+    assert max(timestamps) == max(len(client.lib.replica.accounts) for client in tied.clients)
+
+
+def test_query_paging_as_arrays_regroups_pages(tied):
+    from tigerbeetle_client.client2 import tb_query_filter_t
+    pages = list(tied.iter_query_accounts(tb_query_filter_t(code=1, limit=25), page_size=10, as_array=True))
+    assert [len(page) for page in pages] == [10, 10, 5]
+    ids = np.concatenate([page['id'][:, 0] for page in pages])
+    assert len(set(ids.tolist())) == 25
+
+
+def test_query_with_a_ledger_pages_through_its_cluster(clusters):
+    from tigerbeetle_client.client2 import tb_query_filter_t
+    router = ShardedClient(clusters, ByLedger({1: 0, 2: 1}))
+    assert not len(router.create_accounts_array(make_accounts(20)))
+    rows = list(router.iter_query_accounts(tb_query_filter_t(ledger=2, code=1), page_size=4))
+    assert [int(row.id) for row in rows] == list(range(1, 21, 2))
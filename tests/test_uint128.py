@@ -0,0 +1,37 @@
+import pytest
+
+from tigerbeetle_client import uint128
+from tigerbeetle_client.client2 import tb_transfer_t
+
+VALUES = [0, 1, uint128.MASK64, uint128.MASK64 + 1, uint128.MAX]
+
+
+def test_split_and_join():
+    for value in VALUES:
+        assert uint128.join(*uint128.split(value)) == value
+    with pytest.raises(ValueError):
+        uint128.split(-1)
+    with pytest.raises(ValueError):
+        uint128.split(uint128.MAX + 1)
+
+
+def test_pack_and_unpack():
+    packed = uint128.pack(VALUES)
+    assert len(packed) == 16 * len(VALUES)
+    assert packed[16:32] == (1).to_bytes(16, 'little')
+    assert uint128.unpack(packed) == VALUES
+
+
+def test_pairs_round_trip():
+    pytest.importorskip('numpy')
+    assert uint128.from_pairs(uint128.to_pairs(VALUES)) == VALUES
+    assert uint128.from_pairs(uint128.to_pairs([3, 4])) == [3, 4]
+    assert uint128.to_pairs(range(3)).shape == (3, 2)
+
+
+def test_structures_take_and_compare_plain_ints():
+    transfer = tb_transfer_t(id=uint128.MAX, amount=5)
+    transfer.debit_account_id = uint128.MASK64 + 1
+    assert int(transfer.id) == uint128.MAX
+    assert transfer.amount == 5 and hash(transfer.amount) == hash(5)
+    assert transfer.to_dict()['debit_account_id'] == uint128.MASK64 + 1
@@ -1,3 +1,15 @@
 # tigerbeetle_client/__init__.py
 
-from .client import Client, UInt128, Account, Transfer
+# Submodules are imported on first use, so importing the package stays cheap
+_lazy = {
+    'TigerBeetleClient': 'client',
+    'Account': 'client',
+    'Transfer': 'client',
+}
+
+
+def __getattr__(name):
+    if name in _lazy:
+        import importlib
+        return getattr(importlib.import_module(f'.{_lazy[name]}', __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
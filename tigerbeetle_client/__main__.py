@@ -0,0 +1,77 @@
+"""Command line tools.
+
+    python -m tigerbeetle_client import transfers backfill.parquet --set ledger=1 --failures failed.csv
+"""
+import argparse
+import logging
+import sys
+
+
+def assignments(pairs, convert=str):
+    result = {}
+    for pair in pairs:
+        name, sep, value = pair.partition('=')
+        if not sep:
+            raise ValueError(f"expected FIELD=VALUE, got {pair!r}")
+        result[name] = convert(value)
+    return result
+
+
+def run_import(args):
+    from .client2 import TigerBeetleClient
+    from .importer import import_file
+
+    client = TigerBeetleClient(cluster_id=args.cluster_id, addresses=args.addresses.encode())
+    try:
+        result = import_file(
+            client, args.path, args.kind, format=args.format,
+            columns=args.column or None, defaults=args.set,
+            chunk_rows=args.chunk_rows, batch_size=args.batch_size,
+            max_in_flight=args.in_flight, failures=args.failures,
+            id_namespace=args.id_namespace, checkpoint=args.checkpoint,
+        )
+    finally:
+        client.deinit()
+    rate = result.rows / result.seconds if result.seconds else 0
+    print(f"Imported {result.rows} {args.kind} in {result.batches} batches, {result.seconds:.1f}s ({rate:,.0f}/s); "
+          f"{result.failed} failed, {result.skipped} already done")
+    return 1 if result.failed else 0
+
+
+def main(argv=None):
+    from .batcher import BATCH_MAX
+
+    parser = argparse.ArgumentParser(prog='python -m tigerbeetle_client', description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--verbose', action='store_true')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('import', help="create accounts or transfers from a CSV, Parquet or Arrow file")
+    command.add_argument('kind', choices=('accounts', 'transfers'))
+    command.add_argument('path')
+    command.add_argument('--format', choices=('csv', 'parquet', 'arrow'), help="default: from the file extension")
+    command.add_argument('--cluster-id', type=int, default=0)
+    command.add_argument('--addresses', default='127.0.0.1:3000')
+    command.add_argument('--column', action='append', default=[], metavar='FIELD=COLUMN',
+                         help="read FIELD from COLUMN; without any, fields are read from same-named columns")
+    command.add_argument('--set', action='append', default=[], metavar='FIELD=VALUE', help="set FIELD to VALUE on every row")
+    command.add_argument('--failures', metavar='PATH', help="write failed rows as CSV (row, code, result)")
+    command.add_argument('--id-namespace', metavar='NAME', help="derive ids from NAME and the row number instead of an id column")
+    command.add_argument('--checkpoint', metavar='PATH', help="journal acknowledged rows to PATH and skip them when run again")
+    command.add_argument('--chunk-rows', type=int, default=65536)
+    command.add_argument('--batch-size', type=int, default=BATCH_MAX)
+    command.add_argument('--in-flight', type=int, default=8, help="packets outstanding at once")
+    command.set_defaults(run=run_import)
+
+    args = parser.parse_args(argv)
+    if args.command == 'import':
+        try:
+            args.column = assignments(args.column)
+            args.set = assignments(args.set, int)
+        except ValueError as e:
+            parser.error(str(e))
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING)
+    return args.run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,567 @@
+// _native.c
+//
+// Submit and completion path of native.NativeClient, in C so that neither needs the GIL.
+//
+// Client.submit copies a packed batch into one of the client's packet buffers and hands it
+// to tb_client_submit with the GIL released, so producer threads copy and submit in parallel.
+// The native completion callback never touches Python: it copies the reply and queues the
+// packet. Client.poll waits for completions with the GIL released and returns every queued
+// one at once, so the GIL is taken once per batch of completions rather than once per packet.
+// The module declares itself safe to run without the GIL on free-threaded builds: all shared
+// state is guarded by the client's own mutex.
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+
+#include <stdlib.h>
+#include <string.h>
+
+#include "tb_client.h"
+
+// Largest request body the server accepts: a 1 MiB message minus its 256 byte header
+#define MESSAGE_BODY_SIZE_MAX (1024 * 1024 - 256)
+
+#ifdef _WIN32
+#include <windows.h>
+typedef SRWLOCK mutex_t;
+typedef CONDITION_VARIABLE cond_t;
+#define mutex_init(m) InitializeSRWLock(m)
+#define mutex_destroy(m) ((void)0)
+#define mutex_lock(m) AcquireSRWLockExclusive(m)
+#define mutex_unlock(m) ReleaseSRWLockExclusive(m)
+#define cond_init(c) InitializeConditionVariable(c)
+#define cond_destroy(c) ((void)0)
+#define cond_broadcast(c) WakeAllConditionVariable(c)
+#define cond_wait(c, m) SleepConditionVariableSRW(c, m, INFINITE, 0)
+// Wait for at most `seconds`; returns 0 on timeout
+static int cond_timedwait(cond_t* c, mutex_t* m, double seconds) {
+    return SleepConditionVariableSRW(c, m, (DWORD)(seconds * 1000), 0) || GetLastError() != ERROR_TIMEOUT;
+}
+#else
+#include <pthread.h>
+#include <time.h>
+typedef pthread_mutex_t mutex_t;
+typedef pthread_cond_t cond_t;
+#define mutex_init(m) pthread_mutex_init(m, NULL)
+#define mutex_destroy(m) pthread_mutex_destroy(m)
+#define mutex_lock(m) pthread_mutex_lock(m)
+#define mutex_unlock(m) pthread_mutex_unlock(m)
+#define cond_init(c) pthread_cond_init(c, NULL)
+#define cond_destroy(c) pthread_cond_destroy(c)
+#define cond_broadcast(c) pthread_cond_broadcast(c)
+#define cond_wait(c, m) pthread_cond_wait(c, m)
+static int cond_timedwait(cond_t* c, mutex_t* m, double seconds) {
+    struct timespec deadline;
+    clock_gettime(CLOCK_REALTIME, &deadline);
+    time_t whole = (time_t)seconds;
+    deadline.tv_sec += whole;
+    deadline.tv_nsec += (long)((seconds - (double)whole) * 1e9);
+    if (deadline.tv_nsec >= 1000000000L) {
+        deadline.tv_sec += 1;
+        deadline.tv_nsec -= 1000000000L;
+    }
+    return pthread_cond_timedwait(c, m, &deadline) == 0;
+}
+#endif
+
+// Monotonic nanoseconds, for measuring how long a submit waited for its packet
+static int64_t monotonic_ns(void) {
+#ifdef _WIN32
+    LARGE_INTEGER counter, frequency;
+    QueryPerformanceCounter(&counter);
+    QueryPerformanceFrequency(&frequency);
+    return (int64_t)((double)counter.QuadPart * 1e9 / (double)frequency.QuadPart);
+#else
+    struct timespec now;
+    clock_gettime(CLOCK_MONOTONIC, &now);
+    return (int64_t)now.tv_sec * 1000000000 + now.tv_nsec;
+#endif
+}
+
+typedef TB_STATUS (*init_fn_t)(tb_client_t*, tb_uint128_t, const char*, uint32_t, uint32_t, uintptr_t, tb_completion_t);
+typedef void (*submit_fn_t)(tb_client_t, tb_packet_t*);
+typedef void (*deinit_fn_t)(tb_client_t);
+
+typedef struct {
+    tb_packet_t packet;
+    // Owned reference to the caller's token while the packet is in flight
+    PyObject* token;
+    // Request buffer, allocated the first time the slot copies a batch and then reused
+    uint8_t* buffer;
+    // Copy of the reply, from the completion callback until poll hands it over
+    uint8_t* reply;
+    uint32_t reply_size;
+    int reply_lost;
+    // Set from tb_client_submit until the completion callback; close fails what is still set
+    int in_flight;
+    // Nanoseconds from the submit call to tb_client_submit: waiting for the slot and copying into it
+    int64_t waited_ns;
+} slot_t;
+
+typedef struct {
+    PyObject_HEAD
+    tb_client_t client;
+    submit_fn_t submit_fn;
+    deinit_fn_t deinit_fn;
+    uint32_t count;
+    slot_t* slots;
+    // Free slots, as a stack
+    uint32_t* free;
+    uint32_t free_count;
+    // Completed slots, as a ring of `count` entries
+    uint32_t* completed;
+    uint32_t completed_head;
+    uint32_t completed_count;
+    int initialized;
+    int closed;
+    // Set once tb_client_deinit has returned, so no more completions can arrive
+    int deinitialized;
+    // Submits between taking a slot and handing its packet to the library; close waits for them
+    uint32_t submitting;
+    mutex_t mutex;
+    cond_t free_cond;
+    cond_t completed_cond;
+} ClientObject;
+
+static void on_completion(uintptr_t context, tb_client_t client, tb_packet_t* packet, const uint8_t* data, uint32_t size) {
+    ClientObject* self = (ClientObject*)context;
+    uint32_t index = (uint32_t)(uintptr_t)packet->user_data;
+    slot_t* slot = &self->slots[index];
+    (void)client;
+
+    slot->reply = NULL;
+    slot->reply_size = size;
+    slot->reply_lost = 0;
+    if (size) {
+        slot->reply = malloc(size);
+        if (slot->reply == NULL) {
+            slot->reply_lost = 1;
+        } else {
+            memcpy(slot->reply, data, size);
+        }
+    }
+    mutex_lock(&self->mutex);
+    slot->in_flight = 0;
+    self->completed[(self->completed_head + self->completed_count) % self->count] = index;
+    self->completed_count += 1;
+    cond_broadcast(&self->completed_cond);
+    mutex_unlock(&self->mutex);
+}
+
+static int Client_init(ClientObject* self, PyObject* args, PyObject* kwargs) {
+    static char* keywords[] = {"init", "submit", "deinit", "cluster_low", "cluster_high", "addresses", "packets_count", NULL};
+    unsigned long long init_address, submit_address, deinit_address, cluster_low, cluster_high;
+    const char* addresses;
+    Py_ssize_t addresses_len;
+    unsigned int packets_count;
+
+    if (self->initialized) {
+        PyErr_SetString(PyExc_RuntimeError, "Client is already initialized");
+        return -1;
+    }
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "KKKKKy#I", keywords, &init_address, &submit_address, &deinit_address,
+                                     &cluster_low, &cluster_high, &addresses, &addresses_len, &packets_count)) {
+        return -1;
+    }
+    if (packets_count == 0) {
+        PyErr_SetString(PyExc_ValueError, "packets_count must be positive");
+        return -1;
+    }
+    self->submit_fn = (submit_fn_t)(uintptr_t)submit_address;
+    self->deinit_fn = (deinit_fn_t)(uintptr_t)deinit_address;
+    self->count = packets_count;
+    self->slots = calloc(packets_count, sizeof(slot_t));
+    self->free = malloc(packets_count * sizeof(uint32_t));
+    self->completed = malloc(packets_count * sizeof(uint32_t));
+    if (self->slots == NULL || self->free == NULL || self->completed == NULL) {
+        PyErr_NoMemory();
+        return -1;
+    }
+    for (uint32_t i = 0; i < packets_count; i++) {
+        self->free[i] = packets_count - 1 - i;
+        self->slots[i].packet.user_data = (void*)(uintptr_t)i;
+    }
+    self->free_count = packets_count;
+    mutex_init(&self->mutex);
+    cond_init(&self->free_cond);
+    cond_init(&self->completed_cond);
+    self->initialized = 1;
+
+#if defined(__SIZEOF_INT128__)
+    tb_uint128_t cluster_id = ((tb_uint128_t)cluster_high << 64) | cluster_low;
+#else
+    tb_uint128_t cluster_id = {cluster_low, cluster_high};
+#endif
+    init_fn_t init_fn = (init_fn_t)(uintptr_t)init_address;
+    TB_STATUS status;
+    Py_BEGIN_ALLOW_THREADS
+    status = init_fn(&self->client, cluster_id, addresses, (uint32_t)addresses_len, packets_count, (uintptr_t)self, on_completion);
+    Py_END_ALLOW_THREADS
+    if (status != TB_STATUS_SUCCESS) {
+        self->closed = 1;
+        self->deinitialized = 1;
+        PyErr_Format(PyExc_RuntimeError, "Failed to initialize client (status %d)", status);
+        return -1;
+    }
+    return 0;
+}
+
+// Take a free slot, waiting for one if needed; called without the GIL. Returns -1 once closed.
+static int64_t acquire_slot(ClientObject* self) {
+    int64_t index = -1;
+    mutex_lock(&self->mutex);
+    while (self->free_count == 0 && !self->closed) {
+        cond_wait(&self->free_cond, &self->mutex);
+    }
+    if (!self->closed) {
+        self->free_count -= 1;
+        index = self->free[self->free_count];
+        self->submitting += 1;
+    }
+    mutex_unlock(&self->mutex);
+    return index;
+}
+
+// Called without the GIL once a slot from acquire_slot has been submitted or released
+static void end_submit(ClientObject* self) {
+    mutex_lock(&self->mutex);
+    self->submitting -= 1;
+    if (self->submitting == 0 && self->closed) {
+        cond_broadcast(&self->free_cond);
+    }
+    mutex_unlock(&self->mutex);
+}
+
+static void release_slot(ClientObject* self, uint32_t index) {
+    mutex_lock(&self->mutex);
+    self->free[self->free_count] = index;
+    self->free_count += 1;
+    cond_broadcast(&self->free_cond);
+    mutex_unlock(&self->mutex);
+}
+
+static int check_open(ClientObject* self) {
+    if (!self->initialized || self->closed) {
+        PyErr_SetString(PyExc_RuntimeError, "Client is closed");
+        return -1;
+    }
+    return 0;
+}
+
+// Fill in and send a slot's packet; `data` is NULL to send the slot's own buffer
+static int send_slot(ClientObject* self, PyObject* token, uint8_t operation, const void* source, void* data, Py_ssize_t size) {
+    int64_t index;
+    int out_of_memory = 0;
+
+    Py_INCREF(token);
+    Py_BEGIN_ALLOW_THREADS
+    int64_t started = monotonic_ns();
+    index = acquire_slot(self);
+    if (index >= 0) {
+        slot_t* slot = &self->slots[index];
+        if (data == NULL) {
+            if (slot->buffer == NULL) {
+                slot->buffer = malloc(MESSAGE_BODY_SIZE_MAX);
+            }
+            if (slot->buffer == NULL) {
+                out_of_memory = 1;
+            } else {
+                memcpy(slot->buffer, source, (size_t)size);
+                data = slot->buffer;
+            }
+        }
+        if (out_of_memory) {
+            release_slot(self, (uint32_t)index);
+        } else {
+            slot->token = token;
+            slot->packet.operation = operation;
+            slot->packet.status = TB_PACKET_OK;
+            slot->packet.data_size = (uint32_t)size;
+            slot->packet.data = data;
+            slot->waited_ns = monotonic_ns() - started;
+            slot->in_flight = 1;
+            self->submit_fn(self->client, &slot->packet);
+        }
+        end_submit(self);
+    }
+    Py_END_ALLOW_THREADS
+
+    if (index < 0 || out_of_memory) {
+        Py_DECREF(token);
+        if (out_of_memory) {
+            PyErr_NoMemory();
+        } else {
+            PyErr_SetString(PyExc_RuntimeError, "Client is closed");
+        }
+        return -1;
+    }
+    return 0;
+}
+
+PyDoc_STRVAR(Client_submit_doc,
+"submit(token, operation, data)\n\n"
+"Copy the packed events in `data` (any contiguous buffer) into a packet and submit it.\n"
+"Waits for a free packet. `token` is returned by poll() with the packet's completion.");
+
+static PyObject* Client_submit(ClientObject* self, PyObject* args) {
+    PyObject* token;
+    unsigned char operation;
+    Py_buffer view;
+
+    if (!PyArg_ParseTuple(args, "Oby*", &token, &operation, &view)) {
+        return NULL;
+    }
+    if (check_open(self) < 0 || view.len > MESSAGE_BODY_SIZE_MAX) {
+        if (!PyErr_Occurred()) {
+            PyErr_Format(PyExc_ValueError, "%zd bytes of events do not fit in one packet", view.len);
+        }
+        PyBuffer_Release(&view);
+        return NULL;
+    }
+    int result = send_slot(self, token, operation, view.buf, NULL, view.len);
+    PyBuffer_Release(&view);
+    if (result < 0) {
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+PyDoc_STRVAR(Client_submit_address_doc,
+"submit_address(token, operation, address, size)\n\n"
+"Submit `size` bytes at `address` without copying them; the memory must stay valid until\n"
+"the completion is polled, which the token can ensure by referencing its owner.");
+
+static PyObject* Client_submit_address(ClientObject* self, PyObject* args) {
+    PyObject* token;
+    unsigned char operation;
+    unsigned long long address;
+    Py_ssize_t size;
+
+    if (!PyArg_ParseTuple(args, "ObKn", &token, &operation, &address, &size)) {
+        return NULL;
+    }
+    if (check_open(self) < 0) {
+        return NULL;
+    }
+    if (size < 0 || size > MESSAGE_BODY_SIZE_MAX) {
+        PyErr_Format(PyExc_ValueError, "%zd bytes of events do not fit in one packet", size);
+        return NULL;
+    }
+    if (send_slot(self, token, operation, NULL, (void*)(uintptr_t)address, size) < 0) {
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+PyDoc_STRVAR(Client_poll_doc,
+"poll(max_count, timeout=None)\n\n"
+"Wait up to `timeout` seconds (forever if None) for completed packets and return up to\n"
+"`max_count` of them as (token, status, reply bytes, waited ns) tuples, where waited is the\n"
+"time submit spent waiting for a packet and copying into it. Returns [] on timeout and\n"
+"once the client is closed, deinitialized and every completion has been returned.");
+
+static PyObject* Client_poll(ClientObject* self, PyObject* args) {
+    unsigned int max_count;
+    PyObject* timeout_object = Py_None;
+    double timeout = -1;
+    uint32_t* indexes;
+    uint32_t taken = 0;
+
+    if (!PyArg_ParseTuple(args, "I|O", &max_count, &timeout_object)) {
+        return NULL;
+    }
+    if (timeout_object != Py_None) {
+        timeout = PyFloat_AsDouble(timeout_object);
+        if (timeout == -1 && PyErr_Occurred()) {
+            return NULL;
+        }
+    }
+    if (!self->initialized) {
+        return PyList_New(0);
+    }
+    if (max_count > self->count) {
+        max_count = self->count;
+    }
+    indexes = PyMem_Malloc((max_count ? max_count : 1) * sizeof(uint32_t));
+    if (indexes == NULL) {
+        return PyErr_NoMemory();
+    }
+
+    Py_BEGIN_ALLOW_THREADS
+    mutex_lock(&self->mutex);
+    if (self->completed_count == 0 && !self->deinitialized && timeout != 0) {
+        if (timeout < 0) {
+            while (self->completed_count == 0 && !self->deinitialized) {
+                cond_wait(&self->completed_cond, &self->mutex);
+            }
+        } else {
+            cond_timedwait(&self->completed_cond, &self->mutex, timeout);
+        }
+    }
+    while (taken < max_count && self->completed_count) {
+        indexes[taken++] = self->completed[self->completed_head];
+        self->completed_head = (self->completed_head + 1) % self->count;
+        self->completed_count -= 1;
+    }
+    mutex_unlock(&self->mutex);
+    Py_END_ALLOW_THREADS
+
+    PyObject* result = PyList_New(taken);
+    for (uint32_t i = 0; i < taken; i++) {
+        slot_t* slot = &self->slots[indexes[i]];
+        PyObject* item = NULL;
+        if (result != NULL) {
+            PyObject* reply;
+            if (slot->reply_lost) {
+                reply = Py_None;
+                Py_INCREF(reply);
+            } else {
+                reply = PyBytes_FromStringAndSize((const char*)slot->reply, slot->reply_size);
+            }
+            if (reply != NULL) {
+                item = Py_BuildValue("(OiNL)", slot->token, (int)slot->packet.status, reply, (long long)slot->waited_ns);
+            }
+            if (item == NULL) {
+                Py_CLEAR(result);
+            } else {
+                PyList_SET_ITEM(result, i, item);
+            }
+        }
+        free(slot->reply);
+        slot->reply = NULL;
+        Py_CLEAR(slot->token);
+        release_slot(self, indexes[i]);
+    }
+    PyMem_Free(indexes);
+    return result;
+}
+
+PyDoc_STRVAR(Client_close_doc,
+"close()\n\n"
+"Deinitialize the native client and wake every thread waiting in submit or poll. Returns the\n"
+"tokens of the packets that will never complete.");
+
+static PyObject* Client_close(ClientObject* self, PyObject* Py_UNUSED(ignored)) {
+    if (!self->initialized || self->closed) {
+        return PyList_New(0);
+    }
+    mutex_lock(&self->mutex);
+    self->closed = 1;
+    cond_broadcast(&self->free_cond);
+    mutex_unlock(&self->mutex);
+
+    Py_BEGIN_ALLOW_THREADS
+    // A submit that took a slot before the client closed hands its packet over first
+    mutex_lock(&self->mutex);
+    while (self->submitting > 0) {
+        cond_wait(&self->free_cond, &self->mutex);
+    }
+    mutex_unlock(&self->mutex);
+    self->deinit_fn(self->client);
+    Py_END_ALLOW_THREADS
+
+    mutex_lock(&self->mutex);
+    self->deinitialized = 1;
+    cond_broadcast(&self->completed_cond);
+    mutex_unlock(&self->mutex);
+
+    // No completion can arrive any more; completed slots are poll's, even mid-poll
+    PyObject* lost = PyList_New(0);
+    for (uint32_t i = 0; i < self->count && lost != NULL; i++) {
+        slot_t* slot = &self->slots[i];
+        if (slot->in_flight && slot->token != NULL) {
+            slot->in_flight = 0;
+            if (PyList_Append(lost, slot->token) < 0) {
+                Py_CLEAR(lost);
+            }
+            Py_CLEAR(slot->token);
+        }
+    }
+    return lost;
+}
+
+static PyObject* Client_in_use(ClientObject* self, PyObject* Py_UNUSED(ignored)) {
+    uint32_t in_use = 0;
+    if (self->initialized) {
+        mutex_lock(&self->mutex);
+        in_use = self->count - self->free_count;
+        mutex_unlock(&self->mutex);
+    }
+    return PyLong_FromUnsignedLong(in_use);
+}
+
+static void Client_dealloc(ClientObject* self) {
+    if (self->initialized) {
+        if (!self->closed) {
+            PyObject* lost = Client_close(self, NULL);
+            Py_XDECREF(lost);
+            PyErr_Clear();
+        }
+        for (uint32_t i = 0; i < self->count; i++) {
+            Py_CLEAR(self->slots[i].token);
+            free(self->slots[i].buffer);
+            free(self->slots[i].reply);
+        }
+        mutex_destroy(&self->mutex);
+        cond_destroy(&self->free_cond);
+        cond_destroy(&self->completed_cond);
+    }
+    free(self->slots);
+    free(self->free);
+    free(self->completed);
+    Py_TYPE(self)->tp_free((PyObject*)self);
+}
+
+static PyMethodDef Client_methods[] = {
+    {"submit", (PyCFunction)Client_submit, METH_VARARGS, Client_submit_doc},
+    {"submit_address", (PyCFunction)Client_submit_address, METH_VARARGS, Client_submit_address_doc},
+    {"poll", (PyCFunction)Client_poll, METH_VARARGS, Client_poll_doc},
+    {"close", (PyCFunction)Client_close, METH_NOARGS, Client_close_doc},
+    {"in_use", (PyCFunction)Client_in_use, METH_NOARGS, "in_use()\n\nReturn the number of packets submitted or waiting to be polled."},
+    {NULL, NULL, 0, NULL},
+};
+
+static PyTypeObject ClientType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    .tp_name = "tigerbeetle_client._native.Client",
+    .tp_doc = PyDoc_STR("Client(init, submit, deinit, cluster_low, cluster_high, addresses, packets_count)\n\n"
+                        "A native client whose packets, buffers and completion queue live in C. init, submit and\n"
+                        "deinit are the addresses of the library's tb_client_* functions."),
+    .tp_basicsize = sizeof(ClientObject),
+    .tp_flags = Py_TPFLAGS_DEFAULT,
+    .tp_new = PyType_GenericNew,
+    .tp_init = (initproc)Client_init,
+    .tp_dealloc = (destructor)Client_dealloc,
+    .tp_methods = Client_methods,
+};
+
+static int native_exec(PyObject* module) {
+    if (PyType_Ready(&ClientType) < 0) {
+        return -1;
+    }
+    Py_INCREF(&ClientType);
+    if (PyModule_AddObject(module, "Client", (PyObject*)&ClientType) < 0) {
+        Py_DECREF(&ClientType);
+        return -1;
+    }
+    return PyModule_AddIntConstant(module, "MESSAGE_BODY_SIZE_MAX", MESSAGE_BODY_SIZE_MAX);
+}
+
+static PyModuleDef_Slot native_slots[] = {
+    {Py_mod_exec, native_exec},
+#ifdef Py_mod_gil
+    {Py_mod_gil, Py_MOD_GIL_NOT_USED},
+#endif
+    {0, NULL},
+};
+
+static struct PyModuleDef native_module = {
+    PyModuleDef_HEAD_INIT,
+    .m_name = "tigerbeetle_client._native",
+    .m_doc = "GIL-free submit and completion path for native.NativeClient.",
+    .m_size = 0,
+    .m_slots = native_slots,
+};
+
+PyMODINIT_FUNC PyInit__native(void) {
+    return PyModuleDef_Init(&native_module);
+}
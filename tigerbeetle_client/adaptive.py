@@ -0,0 +1,141 @@
+import collections
+import threading
+import time
+
+from .batcher import BATCH_MAX
+from .metrics import Histogram
+
+
+class BatchController:
+    """Tunes a Batcher's packet size and linger online to keep p99 latency under `target_p99` seconds.
+
+    The Batcher keeps at most `max_in_flight` packets unanswered (a session answers one
+    request at a time, so more would only queue in the client); a packet that is ready while
+    that many are out keeps filling until one is answered. It reports every packet it sends:
+    its size, the latency of its oldest event (from submit to the reply), how many events
+    were still queued behind it and how many packets were unanswered when it was ready. A
+    backlog is either a full packet's worth of queued events or saturated packet slots. Every
+    `interval` seconds the controller looks at that window and adjusts, AIMD style:
+
+    - p99 over the target with a backlog: grow the batch size, since the latency is queueing
+      and smaller packets would only lengthen the queue;
+    - p99 over the target otherwise: halve the linger, and once it's at `min_linger`, halve
+      the batch size;
+    - p99 under `headroom` times the target, with packets full or a backlog: grow the batch size;
+    - with under-filled packets: grow the linger if the arrival rate means lingering would
+      fill them, otherwise (an idle period) halve it, since waiting would only add latency.
+
+    Everything stays within [min_batch_size, max_batch_size] and [min_linger, max_linger].
+
+        controller = BatchController(target_p99=0.010, max_linger=0.005, metrics=client.metrics)
+        batcher = Batcher(client, TB_OPERATION_CREATE_TRANSFERS, controller=controller)
+
+    The current settings and the last window are reported as `batch_*` gauges on `metrics`,
+    and with the counts of each decision by stats().
+    """
+
+    def __init__(self, target_p99, min_batch_size=1, max_batch_size=BATCH_MAX, min_linger=0.0, max_linger=0.005,
+                 max_in_flight=1, interval=0.25, headroom=0.8, decrease=0.5, batch_step=None, linger_step=None, metrics=None):
+        if not 0 < min_batch_size <= max_batch_size <= BATCH_MAX:
+            raise ValueError(f"Batch sizes must satisfy 0 < min_batch_size <= max_batch_size <= {BATCH_MAX}")
+        if not 0 <= min_linger <= max_linger:
+            raise ValueError("Lingers must satisfy 0 <= min_linger <= max_linger")
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+        self.target_p99 = target_p99
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.min_linger = min_linger
+        self.max_linger = max_linger
+        self.max_in_flight = max_in_flight
+        self.interval = interval
+        self.headroom = headroom
+        self.decrease = decrease
+        # Additive steps: a sixteenth of each range by default
+        self.batch_step = batch_step or max(1, (max_batch_size - min_batch_size) // 16)
+        self.linger_step = linger_step or (max_linger - min_linger) / 16
+        # Start by sending whatever is queued, as large as allowed, without waiting
+        self.batch_size = max_batch_size
+        self.linger = min_linger
+        self.lock = threading.Lock()
+        self.decisions = collections.Counter()
+        self.last = {'p99_seconds': 0.0, 'fill_ratio': 0.0, 'events_per_second': 0.0, 'queue_depth': 0, 'in_flight': 0}
+        self.start_window(time.monotonic())
+        self.metrics = metrics
+        self.gauges = [
+            ('batch_max_size', lambda: self.batch_size),
+            ('batch_linger_seconds', lambda: self.linger),
+            ('batch_window_p99_seconds', lambda: self.last['p99_seconds']),
+            ('batch_fill_ratio', lambda: self.last['fill_ratio']),
+        ]
+        if metrics is not None:
+            for name, read in self.gauges:
+                metrics.add_gauge(name, read)
+
+    def start_window(self, now):
+        self.window_start = now
+        self.latency = Histogram()
+        self.packets = 0
+        self.events = 0
+        self.fill = 0.0
+        self.queue_depth = 0
+        self.in_flight = 0
+
+    def observe(self, batch_size, latency, queue_depth, in_flight=0):
+        """Record one packet: its event count, the latency of its oldest event in seconds, the events
+        queued behind it and the packets that were unanswered when it was ready."""
+        now = time.monotonic()
+        with self.lock:
+            self.latency.record(int(latency * 1e9))
+            self.packets += 1
+            self.events += batch_size
+            self.fill += min(1.0, batch_size / self.batch_size)
+            self.queue_depth = max(self.queue_depth, queue_depth)
+            self.in_flight = max(self.in_flight, in_flight)
+            if now - self.window_start >= self.interval:
+                self.decide(now)
+
+    def decide(self, now):
+        p99 = self.latency.quantile(0.99) / 1e9
+        fill = self.fill / self.packets
+        rate = self.events / (now - self.window_start)
+        self.last = {'p99_seconds': p99, 'fill_ratio': fill, 'events_per_second': rate, 'queue_depth': self.queue_depth,
+                     'in_flight': self.in_flight}
+        # Packets waiting for a slot queue downstream of the Batcher, where smaller packets only add more of them
+        backlog = self.queue_depth >= self.batch_size or self.in_flight >= self.max_in_flight
+        if p99 > self.target_p99 and backlog:
+            self.linger = self.min_linger
+            if self.batch_size < self.max_batch_size:
+                self.batch_size = min(self.max_batch_size, self.batch_size + self.batch_step)
+                self.decisions['batch_increase'] += 1
+        elif p99 > self.target_p99:
+            if self.linger > self.min_linger:
+                self.linger = max(self.min_linger, self.linger * self.decrease)
+                self.decisions['linger_decrease'] += 1
+            elif self.batch_size > self.min_batch_size:
+                self.batch_size = max(self.min_batch_size, int(self.batch_size * self.decrease))
+                self.decisions['batch_decrease'] += 1
+        elif p99 < self.target_p99 * self.headroom:
+            if fill >= 0.9 or backlog:
+                if self.batch_size < self.max_batch_size:
+                    self.batch_size = min(self.max_batch_size, self.batch_size + self.batch_step)
+                    self.decisions['batch_increase'] += 1
+            elif rate * max(self.linger, self.linger_step) >= 1:
+                # Lingering gathers more events at this arrival rate
+                if self.linger < self.max_linger:
+                    self.linger = min(self.max_linger, self.linger + self.linger_step)
+                    self.decisions['linger_increase'] += 1
+            elif self.linger > self.min_linger:
+                self.linger = max(self.min_linger, self.linger * self.decrease)
+                self.decisions['linger_decrease'] += 1
+        self.start_window(now)
+
+    def stats(self):
+        """Return the current settings, the last window's measurements and the decision counts."""
+        with self.lock:
+            return {'batch_size': self.batch_size, 'linger': self.linger, **self.last, 'decisions': dict(self.decisions)}
+
+    def close(self):
+        if self.metrics is not None:
+            for name, read in self.gauges:
+                self.metrics.remove_gauge(name, read)
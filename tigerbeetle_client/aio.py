@@ -0,0 +1,200 @@
+import asyncio
+import collections
+import logging
+import struct
+
+from .client import HEADER_FORMAT, HEADER_SIZE, OP_CREATE_ACCOUNTS, OP_CREATE_TRANSFERS, encode_accounts, encode_transfers
+
+header = struct.Struct(HEADER_FORMAT)
+
+
+class MessageProtocol(asyncio.BufferedProtocol):
+    """Frames replies out of one receive buffer that is reused for the life of the connection.
+
+    The event loop reads straight into the free end of the buffer; complete messages are
+    sliced out with memoryviews and only their payloads are copied.
+    """
+
+    def __init__(self, on_message, on_lost, buffer_size=64 * 1024):
+        self.on_message = on_message
+        self.on_lost = on_lost
+        self.buffer = bytearray(buffer_size)
+        self.view = memoryview(self.buffer)
+        # Unparsed bytes are buffer[start:end]
+        self.start = 0
+        self.end = 0
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def connection_lost(self, exc):
+        self.transport = None
+        self.on_lost(self, exc)
+
+    def get_buffer(self, sizehint):
+        if self.end == len(self.buffer):
+            self.make_room(max(sizehint, 1))
+        return self.view[self.end:]
+
+    def make_room(self, size):
+        """Move the unparsed bytes to the front, growing the buffer if that doesn't free `size` bytes."""
+        pending = self.end - self.start
+        if pending + size > len(self.buffer):
+            buffer = bytearray(max(len(self.buffer) * 2, pending + size))
+            buffer[:pending] = self.view[self.start:self.end]
+            self.buffer = buffer
+            self.view = memoryview(buffer)
+        elif self.start:
+            self.buffer[:pending] = self.buffer[self.start:self.end]
+        self.start = 0
+        self.end = pending
+
+    def buffer_updated(self, nbytes):
+        self.end += nbytes
+        while self.end - self.start >= HEADER_SIZE:
+            message_size, opcode, result, _flags = header.unpack_from(self.buffer, self.start)
+            if message_size < HEADER_SIZE:
+                logging.error("Closing connection after a message of impossible size %d", message_size)
+                self.transport.close()
+                return
+            if self.end - self.start < message_size:
+                # Make sure the rest of a large message will fit without another copy per read
+                if self.start + message_size > len(self.buffer):
+                    self.make_room(message_size - (self.end - self.start))
+                break
+            payload = bytes(self.view[self.start + HEADER_SIZE:self.start + message_size])
+            self.start += message_size
+            self.on_message(self, opcode, result, payload)
+        if self.start == self.end:
+            self.start = self.end = 0
+
+
+class AsyncTigerBeetleClient:
+    """asyncio counterpart of client.TigerBeetleClient that needs no native library.
+
+    Any number of requests can be in flight on the one connection. The protocol has no
+    request id, so replies are matched to requests in the order they were sent on that
+    connection. If the connection drops, it is re-established in the background and every
+    unanswered request is sent again, so requests must be safe to repeat (creates are,
+    since ids are unique).
+
+    The first request connects if connect() hasn't, and raises ConnectionError if that fails.
+    A request without a reply after `request_timeout` seconds (None: no limit) raises
+    TimeoutError; the server may still apply it.
+    """
+
+    def __init__(self, host='localhost', port=3000, timeout=5, reconnect_delay=0.1, max_reconnect_delay=5.0, request_timeout=30.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.request_timeout = request_timeout
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.protocol = None
+        self.reconnecting = None
+        # The on-demand first connection, shared by the requests waiting for it
+        self.connecting = None
+        self.closed = False
+        # (future, message) for every request sent on the connection and not yet answered, oldest
+        # first; a request that timed out stays until its reply arrives to keep the order
+        self.pending = collections.deque()
+
+    async def connect(self):
+        """Connect to the TigerBeetle server and send anything still waiting for a reply."""
+        loop = asyncio.get_running_loop()
+        _, protocol = await asyncio.wait_for(
+            loop.create_connection(lambda: MessageProtocol(self.on_message, self.on_connection_lost), self.host, self.port),
+            self.timeout,
+        )
+        self.protocol = protocol
+        logging.debug("Connected to TigerBeetle server at %s:%s", self.host, self.port)
+        # Replies on the new connection follow what is sent on it, so only live requests are resent
+        self.pending = collections.deque(entry for entry in self.pending if not entry[0].done())
+        if self.pending:
+            protocol.transport.writelines([message for _, message in self.pending])
+
+    async def request(self, opcode, payload_bytes):
+        """Send one message and wait for its reply; returns (opcode, payload) like receive_response."""
+        if self.closed:
+            raise ConnectionError("Client is closed")
+        if self.protocol is None and self.reconnecting is None:
+            await self.connect_once()
+        message = header.pack(HEADER_SIZE + len(payload_bytes), opcode, 0, 0) + payload_bytes
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((future, message))
+        if self.protocol is not None and self.protocol.transport is not None:
+            self.protocol.transport.write(message)
+        # Otherwise connect() sends it once the connection is back
+        return await asyncio.wait_for(future, self.request_timeout)
+
+    async def connect_once(self):
+        """Connect for a request made before connect() or after it failed, raising ConnectionError on failure."""
+        if self.connecting is None:
+            self.connecting = asyncio.get_running_loop().create_task(self.connect())
+            self.connecting.add_done_callback(lambda _: setattr(self, 'connecting', None))
+        try:
+            await asyncio.shield(self.connecting)
+        except (OSError, asyncio.TimeoutError) as e:
+            raise ConnectionError(f"Could not connect to {self.host}:{self.port}: {e}") from e
+
+    def on_message(self, protocol, opcode, result, payload):
+        if protocol is not self.protocol:
+            # Late replies on a dropped connection; their requests were resent
+            return
+        if not self.pending:
+            logging.error("Dropping a reply with no request waiting for it")
+            return
+        future, _ = self.pending.popleft()
+        if not future.done():
+            future.set_result((opcode, payload))
+
+    def on_connection_lost(self, protocol, exc):
+        if protocol is not self.protocol:
+            return
+        self.protocol = None
+        if not self.closed and self.reconnecting is None:
+            logging.warning("Connection to %s:%s lost (%s), reconnecting", self.host, self.port, exc)
+            self.reconnecting = asyncio.get_running_loop().create_task(self.reconnect())
+
+    async def reconnect(self):
+        delay = self.reconnect_delay
+        try:
+            while not self.closed:
+                try:
+                    await self.connect()
+                    return
+                except (OSError, asyncio.TimeoutError) as e:
+                    logging.warning("Reconnect to %s:%s failed (%s), retrying in %ss", self.host, self.port, e, delay)
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, self.max_reconnect_delay)
+        finally:
+            self.reconnecting = None
+
+    async def create_accounts(self, accounts):
+        """Create new accounts on the server."""
+        return await self.request(OP_CREATE_ACCOUNTS, encode_accounts(accounts))
+
+    async def create_transfers(self, transfers):
+        """Create new transfers on the server."""
+        return await self.request(OP_CREATE_TRANSFERS, encode_transfers(transfers))
+
+    async def close(self):
+        """Close the connection and fail every request still waiting for a reply."""
+        self.closed = True
+        if self.reconnecting is not None:
+            self.reconnecting.cancel()
+        if self.protocol is not None and self.protocol.transport is not None:
+            self.protocol.transport.close()
+        self.protocol = None
+        pending, self.pending = self.pending, collections.deque()
+        for future, _ in pending:
+            if not future.done():
+                future.set_exception(ConnectionError("Client closed before the request completed"))
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
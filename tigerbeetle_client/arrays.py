@@ -0,0 +1,173 @@
+import ctypes
+
+import numpy as np
+
+from . import uint128
+from .client2 import (
+    TB_OPERATION_CREATE_ACCOUNTS,
+    TB_OPERATION_CREATE_TRANSFERS,
+    TB_OPERATION_GET_ACCOUNT_BALANCES,
+    TB_OPERATION_GET_ACCOUNT_TRANSFERS,
+    TB_OPERATION_LOOKUP_ACCOUNTS,
+    TB_OPERATION_LOOKUP_TRANSFERS,
+    TB_OPERATION_QUERY_ACCOUNTS,
+    TB_OPERATION_QUERY_TRANSFERS,
+    tb_account_balance_t,
+    tb_account_filter_t,
+    tb_account_t,
+    tb_create_accounts_result_t,
+    tb_query_filter_t,
+    tb_transfer_t,
+)
+
+# A 128-bit field is a pair of little-endian uint64 words, [low, high]; fill one from ints
+# with `arr['id'] = uint128.to_pairs(ids)` and read it back with `uint128.from_pairs(arr['id'])`
+U128 = ('<u8', (2,))
+ID_DTYPE = np.dtype(U128)
+
+# Structured dtypes with exactly the same field names and byte layout as the ctypes structs,
+# so an array's buffer can be handed to the native client as-is
+ACCOUNT_DTYPE = np.dtype([
+    ('id', *U128),
+    ('debits_pending', *U128),
+    ('debits_posted', *U128),
+    ('credits_pending', *U128),
+    ('credits_posted', *U128),
+    ('user_data_128', *U128),
+    ('user_data_64', '<u8'),
+    ('user_data_32', '<u4'),
+    ('reserved', '<u4'),
+    ('ledger', '<u4'),
+    ('code', '<u2'),
+    ('flags', '<u2'),
+    ('timestamp', '<u8'),
+])
+TRANSFER_DTYPE = np.dtype([
+    ('id', *U128),
+    ('debit_account_id', *U128),
+    ('credit_account_id', *U128),
+    ('amount', *U128),
+    ('pending_id', *U128),
+    ('user_data_128', *U128),
+    ('user_data_64', '<u8'),
+    ('user_data_32', '<u4'),
+    ('timeout', '<u4'),
+    ('ledger', '<u4'),
+    ('code', '<u2'),
+    ('flags', '<u2'),
+    ('timestamp', '<u8'),
+])
+CREATE_RESULT_DTYPE = np.dtype([
+    ('index', '<u4'),
+    ('result', '<u4'),
+])
+ACCOUNT_BALANCE_DTYPE = np.dtype([
+    ('debits_pending', *U128),
+    ('debits_posted', *U128),
+    ('credits_pending', *U128),
+    ('credits_posted', *U128),
+    ('timestamp', '<u8'),
+    ('reserved', 'V56'),
+])
+ACCOUNT_FILTER_DTYPE = np.dtype([
+    ('account_id', *U128),
+    ('user_data_128', *U128),
+    ('user_data_64', '<u8'),
+    ('user_data_32', '<u4'),
+    ('code', '<u2'),
+    ('reserved', 'V58'),
+    ('timestamp_min', '<u8'),
+    ('timestamp_max', '<u8'),
+    ('limit', '<u4'),
+    ('flags', '<u4'),
+])
+QUERY_FILTER_DTYPE = np.dtype([
+    ('user_data_128', *U128),
+    ('user_data_64', '<u8'),
+    ('user_data_32', '<u4'),
+    ('ledger', '<u4'),
+    ('code', '<u2'),
+    ('reserved', 'V6'),
+    ('timestamp_min', '<u8'),
+    ('timestamp_max', '<u8'),
+    ('limit', '<u4'),
+    ('flags', '<u4'),
+])
+
+for _dtype, _struct in (
+    (ACCOUNT_DTYPE, tb_account_t),
+    (TRANSFER_DTYPE, tb_transfer_t),
+    (CREATE_RESULT_DTYPE, tb_create_accounts_result_t),
+    (ACCOUNT_BALANCE_DTYPE, tb_account_balance_t),
+    (ACCOUNT_FILTER_DTYPE, tb_account_filter_t),
+    (QUERY_FILTER_DTYPE, tb_query_filter_t),
+):
+    assert _dtype.itemsize == ctypes.sizeof(_struct)
+    assert all(_dtype.fields[name][1] == getattr(_struct, name).offset for name, _ in _struct._fields_)
+
+# Request and reply dtypes for each operation
+event_dtypes = {
+    TB_OPERATION_CREATE_ACCOUNTS: ACCOUNT_DTYPE,
+    TB_OPERATION_CREATE_TRANSFERS: TRANSFER_DTYPE,
+    TB_OPERATION_LOOKUP_ACCOUNTS: ID_DTYPE,
+    TB_OPERATION_LOOKUP_TRANSFERS: ID_DTYPE,
+    TB_OPERATION_GET_ACCOUNT_TRANSFERS: ACCOUNT_FILTER_DTYPE,
+    TB_OPERATION_GET_ACCOUNT_BALANCES: ACCOUNT_FILTER_DTYPE,
+    TB_OPERATION_QUERY_ACCOUNTS: QUERY_FILTER_DTYPE,
+    TB_OPERATION_QUERY_TRANSFERS: QUERY_FILTER_DTYPE,
+}
+reply_dtypes = {
+    TB_OPERATION_CREATE_ACCOUNTS: CREATE_RESULT_DTYPE,
+    TB_OPERATION_CREATE_TRANSFERS: CREATE_RESULT_DTYPE,
+    TB_OPERATION_LOOKUP_ACCOUNTS: ACCOUNT_DTYPE,
+    TB_OPERATION_LOOKUP_TRANSFERS: TRANSFER_DTYPE,
+    TB_OPERATION_GET_ACCOUNT_TRANSFERS: TRANSFER_DTYPE,
+    TB_OPERATION_GET_ACCOUNT_BALANCES: ACCOUNT_BALANCE_DTYPE,
+    TB_OPERATION_QUERY_ACCOUNTS: ACCOUNT_DTYPE,
+    TB_OPERATION_QUERY_TRANSFERS: TRANSFER_DTYPE,
+}
+
+
+def as_event_array(operation, events):
+    """Return `events` as a contiguous array of the operation's dtype, copying only if needed."""
+    dtype = event_dtypes[operation]
+    if dtype is ID_DTYPE:
+        # Ids may be ints or an (n, 2) array of [low, high] uint64 words
+        return uint128.to_pairs(events)
+    if hasattr(events, '__array_interface__') and np.asarray(events).dtype.names is None:
+        # NumPy would broadcast each plain number into every field
+        raise TypeError(f"Expected a structured array of the operation's events, got {np.asarray(events).dtype}")
+    return np.ascontiguousarray(events, dtype=dtype)
+
+
+def reply_rows(operation, events):
+    """Return the most rows a reply to `events` can have: one per event, or each filter's limit."""
+    if 'limit' not in (events.dtype.names or ()):
+        return len(events)
+    from .queries import page_size_max
+    page_max = page_size_max(operation)
+    return min(page_max, sum(min(limit, page_max) or page_max for limit in events['limit'].tolist()))
+
+
+def submit_array(client, operation, events, out=None):
+    """Submit an array's buffer directly as the packet data and decode the reply into an array.
+
+    For lookups `out` may be a preallocated reply array with room for one row per id; the
+    result is a view of its first rows. For filters the default `out` has room for `limit` rows.
+    """
+    events = as_event_array(operation, events)
+    reply_dtype = reply_dtypes[operation]
+    if out is None:
+        out = np.empty(reply_rows(operation, events), dtype=reply_dtype)
+    elif out.dtype != reply_dtype or len(out) < len(events) or not out.flags.c_contiguous:
+        raise ValueError(f"out must be a contiguous {reply_dtype} array with at least {len(events)} rows")
+
+    def decode(data, size):
+        count = size // reply_dtype.itemsize
+        if count > len(out):
+            raise ValueError(f"Reply of {count} rows does not fit the {len(out)} row output array")
+        if size:
+            ctypes.memmove(out.ctypes.data, data, size)
+        return out[:count]
+
+    return client.submit_buffer(operation, events.ctypes.data, events.nbytes, events, decode)
@@ -0,0 +1,255 @@
+import collections
+import concurrent.futures
+import ctypes
+import threading
+
+from .client2 import Operations, event_types
+
+
+class QueueFull(RuntimeError):
+    """Raised when a request can't be admitted: at once with policy='fail', or within the timeout."""
+
+
+class Waiter:
+    __slots__ = ('events', 'size', 'counted', 'admitted')
+
+    def __init__(self, events, size):
+        self.events = events
+        self.size = size
+        # Set under the queue's lock when the request is counted as pending; `admitted` is resolved right after
+        self.counted = False
+        self.admitted = concurrent.futures.Future()
+
+
+class PriorityClass:
+    def __init__(self, name, weight):
+        self.name = name
+        self.weight = weight
+        self.waiters = collections.deque()
+        self.current = 0
+        self.admitted = 0
+        self.rejected = 0
+
+
+class SubmitQueue(Operations):
+    """Bounds the requests a client has outstanding, and decides whose turn it is when full.
+
+    A request is pending from the moment it's admitted until its reply arrives, and is only
+    admitted while the pending events, bytes and packets stay within `max_events`,
+    `max_bytes` and `max_packets` (None for no limit). A request larger than a limit on its
+    own is admitted once nothing else is pending. Past the limits, callers wait their turn
+    (policy='block', up to `timeout` seconds) or get QueueFull at once (policy='fail');
+    async callers wait without blocking the event loop. Either way the queue itself holds
+    nothing but the waiters, so memory stays bounded by the limits.
+
+    Waiting requests are admitted FIFO within a priority class, and across classes by
+    smooth weighted round robin, so a busy class gets its share without starving the others:
+
+        queue = SubmitQueue(client, max_events=64 * 8190, classes={'online': 8, 'bulk': 1})
+        online, bulk = queue.lane('online'), queue.lane('bulk')
+        online.create_transfers(transfers)          # admitted ahead of most of bulk's backlog
+        importer.import_file(bulk, 'backfill.parquet', 'transfers')
+
+    Depths are reported as `queue_*` gauges on the client's Metrics and by stats().
+    """
+
+    def __init__(self, client, max_events=None, max_bytes=None, max_packets=None, policy='block', timeout=None,
+                 classes=None):
+        if policy not in ('block', 'fail'):
+            raise ValueError(f"Unknown policy {policy!r}, expected 'block' or 'fail'")
+        self.client = client
+        self.max_events = max_events
+        self.max_bytes = max_bytes
+        self.max_packets = max_packets
+        self.policy = policy
+        self.timeout = timeout
+        self.classes = {name: PriorityClass(name, weight) for name, weight in (classes or {'default': 1}).items()}
+        self.default_class = next(iter(self.classes))
+        self.lock = threading.Lock()
+        self.pending_events = 0
+        self.pending_bytes = 0
+        self.pending_packets = 0
+        self.gauges = [
+            ('queue_pending_events', lambda: self.pending_events),
+            ('queue_pending_bytes', lambda: self.pending_bytes),
+            ('queue_pending_packets', lambda: self.pending_packets),
+            *((f'queue_waiting_{name}', lambda waiters=priority.waiters: len(waiters)) for name, priority in self.classes.items()),
+        ]
+        self.metrics = getattr(client, 'metrics', None)
+        if self.metrics is not None:
+            for name, read in self.gauges:
+                self.metrics.add_gauge(name, read)
+
+    def lane(self, priority):
+        """Return an Operations view whose requests go through this queue in class `priority`."""
+        if priority not in self.classes:
+            raise ValueError(f"Unknown priority class {priority!r}")
+        return Lane(self, priority)
+
+    def submit(self, operation, events, priority=None):
+        size = ctypes.sizeof(event_types[operation]) * len(events)
+        self.admit(len(events), size, priority)
+        return self.forward(len(events), size, lambda: self.client.submit(operation, events))
+
+    def submit_buffer(self, operation, address, size, owner, decode, priority=None):
+        count = size // ctypes.sizeof(event_types[operation])
+        self.admit(count, size, priority)
+        return self.forward(count, size, lambda: self.client.submit_buffer(operation, address, size, owner, decode))
+
+    def submit_async(self, operation, events, priority=None):
+        """Like submit, but waits for admission, and then the reply, without blocking the event loop."""
+        import asyncio
+
+        async def submit():
+            size = ctypes.sizeof(event_types[operation]) * len(events)
+            waiter = self.enqueue(len(events), size, priority)
+            if waiter is not None:
+                try:
+                    # Shielded, so a cancelled caller doesn't cancel the future the queue will resolve
+                    await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(waiter.admitted)), self.timeout)
+                except asyncio.TimeoutError:
+                    self.abandon(waiter)
+                    raise QueueFull(f"Request of {len(events)} events was not admitted within {self.timeout} seconds") from None
+                except BaseException:
+                    self.abandon(waiter)
+                    raise
+            return await asyncio.wrap_future(self.forward(len(events), size, lambda: self.client.submit(operation, events)))
+
+        return submit()
+
+    def admit(self, events, size, priority):
+        """Wait until a request of `events` events and `size` bytes is counted as pending."""
+        waiter = self.enqueue(events, size, priority)
+        if waiter is None:
+            return
+        try:
+            waiter.admitted.result(self.timeout)
+        except concurrent.futures.TimeoutError:
+            self.abandon(waiter)
+            raise QueueFull(f"Request of {events} events was not admitted within {self.timeout} seconds") from None
+        except BaseException:
+            self.abandon(waiter)
+            raise
+
+    def enqueue(self, events, size, priority):
+        """Admit the request now if it may skip the line, else queue it; returns the Waiter or None."""
+        priority = self.classes[priority or self.default_class]
+        with self.lock:
+            if not any(other.waiters for other in self.classes.values()) and self.fits(events, size):
+                self.count(priority, events, size)
+                return None
+            if self.policy == 'fail':
+                priority.rejected += 1
+                raise QueueFull(f"{self.pending_events} events and {self.pending_bytes} bytes pending")
+            waiter = Waiter(events, size)
+            priority.waiters.append(waiter)
+            return waiter
+
+    def abandon(self, waiter):
+        """Take back a waiter whose caller gave up, releasing its share if it was admitted meanwhile."""
+        admitted = []
+        with self.lock:
+            if waiter.counted:
+                admitted = self.uncount(waiter.events, waiter.size)
+            else:
+                for priority in self.classes.values():
+                    if waiter in priority.waiters:
+                        priority.waiters.remove(waiter)
+                        priority.rejected += 1
+        for admitted_waiter in admitted:
+            admitted_waiter.admitted.set_result(None)
+
+    def forward(self, events, size, submit):
+        try:
+            future = submit()
+        except BaseException:
+            self.release(events, size)
+            raise
+        future.add_done_callback(lambda _: self.release(events, size))
+        return future
+
+    def fits(self, events, size):
+        if not self.pending_packets:
+            return True
+        return ((self.max_events is None or self.pending_events + events <= self.max_events)
+                and (self.max_bytes is None or self.pending_bytes + size <= self.max_bytes)
+                and (self.max_packets is None or self.pending_packets + 1 <= self.max_packets))
+
+    def count(self, priority, events, size):
+        self.pending_events += events
+        self.pending_bytes += size
+        self.pending_packets += 1
+        priority.admitted += 1
+
+    def uncount(self, events, size):
+        """Return a request's share, and admit whichever waiters now fit (called with the lock held)."""
+        self.pending_events -= events
+        self.pending_bytes -= size
+        self.pending_packets -= 1
+        admitted = []
+        while True:
+            waiting = [priority for priority in self.classes.values() if priority.waiters]
+            if not waiting:
+                return admitted
+            # Smooth weighted round robin: the class with the most accumulated credit goes next
+            priority = max(waiting, key=lambda priority: priority.current + priority.weight)
+            waiter = priority.waiters[0]
+            if not self.fits(waiter.events, waiter.size):
+                return admitted
+            for other in waiting:
+                other.current += other.weight
+            priority.current -= sum(other.weight for other in waiting)
+            priority.waiters.popleft()
+            if not priority.waiters:
+                priority.current = 0
+            self.count(priority, waiter.events, waiter.size)
+            waiter.counted = True
+            admitted.append(waiter)
+
+    def release(self, events, size):
+        with self.lock:
+            admitted = self.uncount(events, size)
+        # Wake the callers outside the lock: each then submits its request from its own thread
+        for waiter in admitted:
+            waiter.admitted.set_result(None)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'pending_events': self.pending_events,
+                'pending_bytes': self.pending_bytes,
+                'pending_packets': self.pending_packets,
+                'classes': {
+                    name: {'waiting': len(priority.waiters), 'admitted': priority.admitted, 'rejected': priority.rejected}
+                    for name, priority in self.classes.items()
+                },
+            }
+
+    def close(self):
+        """Fail every waiting caller and remove the queue's gauges; the client itself stays open."""
+        with self.lock:
+            waiters = [waiter for priority in self.classes.values() for waiter in priority.waiters]
+            for priority in self.classes.values():
+                priority.waiters.clear()
+        for waiter in waiters:
+            waiter.admitted.set_exception(QueueFull("Queue closed"))
+        if self.metrics is not None:
+            for name, read in self.gauges:
+                self.metrics.remove_gauge(name, read)
+
+
+class Lane(Operations):
+    """The Operations of a SubmitQueue with every request in one priority class."""
+
+    def __init__(self, queue, priority):
+        self.queue = queue
+        self.priority = priority
+
+    def submit(self, operation, events):
+        return self.queue.submit(operation, events, self.priority)
+
+    def submit_buffer(self, operation, address, size, owner, decode):
+        return self.queue.submit_buffer(operation, address, size, owner, decode, self.priority)
+
+    def submit_async(self, operation, events):
+        return self.queue.submit_async(operation, events, self.priority)
@@ -0,0 +1,148 @@
+import collections
+import concurrent.futures
+import threading
+import time
+
+from .client2 import TB_OPERATION_CREATE_ACCOUNTS, TB_OPERATION_CREATE_TRANSFERS, event_types
+
+# Largest batch the server accepts: (1 MiB message - 256 byte header) / 128 byte event
+BATCH_MAX = 8190
+
+# Result code reported for events the server accepted (successes are omitted from the reply)
+RESULT_OK = 0
+
+
+class Batcher:
+    """Coalesces create_accounts / create_transfers calls from many threads into full packets."""
+
+    def __init__(self, client, operation, max_batch_size=BATCH_MAX, linger=0.001, controller=None):
+        if operation not in (TB_OPERATION_CREATE_ACCOUNTS, TB_OPERATION_CREATE_TRANSFERS):
+            raise ValueError(f"Batching is only supported for create operations, got {operation}")
+        if not 0 < max_batch_size <= BATCH_MAX:
+            raise ValueError(f"max_batch_size must be between 1 and {BATCH_MAX}")
+        self.client = client
+        self.operation = operation
+        self.event_type = event_types[operation]
+        self.max_batch_size = max_batch_size
+        self.linger = linger
+        # An adaptive.BatchController, if given, sets the packet size and linger instead
+        self.controller = controller
+        # Each pending group is (events, futures, queued_at) and is always sent in one packet
+        self.pending = collections.deque()
+        self.pending_count = 0
+        # Packets sent and not yet answered
+        self.in_flight = 0
+        self.condition = threading.Condition()
+        self.closed = False
+        self.thread = threading.Thread(target=self.run, name="tb-batcher", daemon=True)
+        self.thread.start()
+
+    def submit(self, event):
+        """Queue one event and return a future for its result code."""
+        return self.submit_many([event])[0]
+
+    def submit_many(self, events):
+        """Queue events that must stay contiguous in one packet, e.g. a linked chain."""
+        if len(events) > self.max_batch_size:
+            raise ValueError(f"Cannot batch {len(events)} events, the limit is {self.max_batch_size}")
+        futures = [concurrent.futures.Future() for _ in events]
+        if not events:
+            return futures
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("Batcher is closed")
+            self.pending.append((events, futures, time.perf_counter()))
+            self.pending_count += len(events)
+            self.condition.notify()
+        return futures
+
+    def submit_async(self, event):
+        """Like submit, but returns an awaitable bound to the running asyncio event loop."""
+        import asyncio
+        return asyncio.wrap_future(self.submit(event))
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.closed:
+                    self.condition.wait()
+                if not self.pending:
+                    return
+                linger, batch_size = self.linger, self.max_batch_size
+                if self.controller is not None:
+                    linger, batch_size = self.controller.linger, min(self.controller.batch_size, batch_size)
+                # Give other callers up to `linger` seconds to fill the packet, and with a controller,
+                # keep filling it while the controller's limit of packets is unanswered
+                deadline = time.monotonic() + linger
+                in_flight = None
+                while self.pending_count < batch_size and not self.closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        if in_flight is None:
+                            in_flight = self.in_flight
+                        if self.controller is None or self.in_flight < self.controller.max_in_flight:
+                            break
+                    self.condition.wait(remaining if remaining > 0 else None)
+                groups = self.take_batch(batch_size)
+                queue_depth = self.pending_count
+                if in_flight is None:
+                    in_flight = self.in_flight
+                self.in_flight += 1
+            self.send(groups, queue_depth, in_flight)
+
+    def take_batch(self, batch_size):
+        groups = []
+        count = 0
+        # The first group is always taken, even if the controller has shrunk the packet below its size
+        while self.pending and (not groups or count + len(self.pending[0][0]) <= batch_size):
+            group = self.pending.popleft()
+            groups.append(group)
+            count += len(group[0])
+        self.pending_count -= count
+        return groups
+
+    def send(self, groups, queue_depth, in_flight):
+        events = [event for group_events, _, _ in groups for event in group_events]
+        futures = [future for _, group_futures, _ in groups for future in group_futures]
+        # Callers that cancelled while queued still occupy their slot so indexes line up
+        for future in futures:
+            future.set_running_or_notify_cancel()
+        try:
+            packet_future = self.client.submit(self.operation, (self.event_type * len(events))(*events))
+        except Exception as e:
+            self.packet_done()
+            for future in futures:
+                if not future.cancelled():
+                    future.set_exception(e)
+            return
+        packet_future.add_done_callback(lambda f: self.packet_done())
+        if self.controller is not None:
+            queued_at = groups[0][2]
+            packet_future.add_done_callback(lambda f: self.controller.observe(len(events), time.perf_counter() - queued_at, queue_depth, in_flight))
+        packet_future.add_done_callback(lambda f: self.fan_out(f, futures))
+
+    def packet_done(self):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify()
+
+    def fan_out(self, packet_future, futures):
+        error = packet_future.exception()
+        if error is not None:
+            for future in futures:
+                if not future.cancelled():
+                    future.set_exception(error)
+            return
+        codes = [RESULT_OK] * len(futures)
+        for result in packet_future.result():
+            codes[result.index] = result.result
+        for future, code in zip(futures, codes):
+            if not future.cancelled():
+                future.set_result(code)
+
+    def close(self):
+        """Flush everything still queued and stop the background thread."""
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        self.thread.join()
@@ -0,0 +1,460 @@
+import collections
+import concurrent.futures
+import ctypes
+import functools
+import multiprocessing
+import os
+import threading
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .arrays import event_dtypes, reply_dtypes
+from .batcher import BATCH_MAX
+from .client2 import (
+    TB_OPERATION_CREATE_ACCOUNTS,
+    TB_OPERATION_CREATE_TRANSFERS,
+    TB_OPERATION_LOOKUP_ACCOUNTS,
+    TB_OPERATION_LOOKUP_TRANSFERS,
+    TB_PACKET_OK,
+    TB_TRANSFER_LINKED,
+    Operations,
+    PacketError,
+    TigerBeetleClient,
+    event_types,
+    reply_types,
+    result_types,
+)
+
+# Events are copied into the ring in 128-byte slots, the size of an account or transfer
+SLOT_SIZE = 128
+OPERATIONS = (TB_OPERATION_CREATE_ACCOUNTS, TB_OPERATION_CREATE_TRANSFERS, TB_OPERATION_LOOKUP_ACCOUNTS, TB_OPERATION_LOOKUP_TRANSFERS)
+# Completion status of a request that failed in the broker without a packet status
+STATUS_ERROR = 0xFFFF
+
+# A request is `size` bytes of events starting at ring slot `slot`; its reply is written over them
+REQUEST_DTYPE = np.dtype([('seq', '<u8'), ('slot', '<u8'), ('size', '<u4'), ('operation', '<u4')])
+COMPLETION_DTYPE = np.dtype([('seq', '<u8'), ('status', '<u4'), ('size', '<u4')])
+
+# Word offsets of the channel counters, each on its own cache line. Every counter has one
+# writer and is only ever increased. A counter and the entries it publishes are written and
+# read under the channel's lock: plain stores to shared memory aren't ordered between
+# processes on weakly ordered CPUs, but releasing and acquiring a lock orders them
+REQUEST_TAIL, REQUEST_HEAD, COMPLETION_TAIL, COMPLETION_HEAD, OWNER = 0, 8, 16, 24, 32
+CHANNEL_HEADER = 320
+# The segment starts with one cache line of control words
+CONTROL = 64
+STOP, BROKER_PID = 0, 1
+# Seconds a worker waits for a completion before checking that the broker process is still running
+BROKER_CHECK_INTERVAL = 1.0
+
+
+class Layout:
+    """Sizes and offsets of the shared segment: control words, then one channel per worker."""
+
+    def __init__(self, workers, requests, slots):
+        self.workers = workers
+        self.requests = requests
+        self.slots = slots
+        self.requests_offset = CHANNEL_HEADER
+        self.completions_offset = self.requests_offset + requests * REQUEST_DTYPE.itemsize
+        self.slots_offset = -(-(self.completions_offset + requests * COMPLETION_DTYPE.itemsize) // 64) * 64
+        self.channel_size = self.slots_offset + slots * SLOT_SIZE
+        self.size = CONTROL + workers * self.channel_size
+
+
+class Channel:
+    """NumPy views of one worker's counters, request and completion rings, and event slots."""
+
+    def __init__(self, data, layout, index):
+        start = CONTROL + index * layout.channel_size
+        data = data[start:start + layout.channel_size]
+        self.counters = data[:CHANNEL_HEADER].view('<u8')
+        self.requests = data[layout.requests_offset:layout.completions_offset].view(REQUEST_DTYPE)
+        self.completions = data[layout.completions_offset:layout.completions_offset + layout.requests * COMPLETION_DTYPE.itemsize].view(COMPLETION_DTYPE)
+        self.slots = data[layout.slots_offset:]
+        self.address = self.slots.ctypes.data
+
+
+class Broker:
+    """One cluster session shared by many worker processes through shared memory.
+
+    Each worker gets a channel in a multiprocessing.shared_memory segment: it copies its
+    packed events into the channel's ring of 128-byte slots and publishes a request
+    descriptor. The broker process takes the requests of every worker, packs requests of
+    the same operation into packets of up to BATCH_MAX events, and writes each request's
+    reply back over its events before posting a completion. Nothing is pickled and there is
+    no socket hop; the wakeups and the channel locks are POSIX semaphores.
+
+        broker = Broker(workers=8, addresses='3000')
+        broker.start()
+        # ... fork the workers; in each one:
+        client = broker.connect()
+        client.create_transfers(transfers)
+
+    Supports create_accounts, create_transfers, lookup_accounts and lookup_transfers, with
+    at most BATCH_MAX events per request. A linked chain must be closed within its request,
+    since the next request in the packet may be another worker's. `client_factory` makes
+    the broker's client in the broker process; by default a TigerBeetleClient for
+    `cluster_id` and `addresses`.
+    """
+
+    def __init__(self, workers, client_factory=None, cluster_id=0, addresses='127.0.0.1:3000', requests=1024, slots=2 * BATCH_MAX):
+        self.layout = Layout(workers, requests, slots)
+        self.shm = shared_memory.SharedMemory(create=True, size=self.layout.size)
+        self.doorbell = multiprocessing.Semaphore(0)
+        self.signals = [multiprocessing.Semaphore(0) for _ in range(workers)]
+        self.locks = [multiprocessing.Lock() for _ in range(workers)]
+        self.claim = multiprocessing.Lock()
+        self.client_factory = client_factory or functools.partial(TigerBeetleClient, cluster_id=cluster_id, addresses=addresses)
+        self.process = None
+
+    def __getstate__(self):
+        # For workers started with spawn; the broker process stays with its parent
+        return {**self.__dict__, 'process': None}
+
+    def start(self):
+        self.process = multiprocessing.Process(
+            target=serve, args=(self.shm.name, self.layout, self.doorbell, self.signals, self.locks, self.client_factory),
+            name='tb-broker', daemon=True,
+        )
+        self.process.start()
+        control = np.frombuffer(self.shm.buf, np.uint8)[:CONTROL].view('<u8')
+        control[BROKER_PID] = self.process.pid
+        del control
+
+    def connect(self, index=None):
+        """Return a BrokerClient on channel `index`, or on the first free channel."""
+        with self.claim:
+            owners = np.frombuffer(self.shm.buf, np.uint8)
+            candidates = range(self.layout.workers) if index is None else [index]
+            for candidate in candidates:
+                counters = Channel(owners, self.layout, candidate).counters
+                if not counters[OWNER]:
+                    counters[OWNER] = os.getpid()
+                    break
+            else:
+                raise RuntimeError("No free broker channel")
+            del owners, counters
+        return BrokerClient(self.shm.name, self.layout, candidate, self.doorbell, self.signals[candidate], self.locks[candidate])
+
+    def close(self):
+        """Stop the broker process once every request published so far has completed, and free the segment.
+
+        Requests submitted after that fail with RuntimeError.
+        """
+        control = np.frombuffer(self.shm.buf, np.uint8)[:CONTROL].view('<u8')
+        control[STOP] = 1
+        del control
+        self.doorbell.release()
+        if self.process is not None:
+            self.process.join()
+        self.shm.close()
+        self.shm.unlink()
+
+
+def process_alive(pid):
+    """Return whether process `pid` is running; an exited child its parent hasn't reaped isn't."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    try:
+        with open(f'/proc/{pid}/stat') as stat:
+            return stat.read().rpartition(')')[2].split()[0] != 'Z'
+    except OSError:
+        return True
+
+
+def serve(name, layout, doorbell, signals, locks, client_factory):
+    """Entry point of the broker process."""
+    shm = shared_memory.SharedMemory(name=name)
+    submitter = Submitter(shm, layout, signals, locks, client_factory())
+    try:
+        submitter.run(doorbell)
+    finally:
+        submitter.close()
+        shm.close()
+
+
+class Submitter:
+    """The broker process's side: drains every channel into packets and posts completions."""
+
+    def __init__(self, shm, layout, signals, locks, client):
+        self.data = np.frombuffer(shm.buf, np.uint8)
+        self.control = self.data[:CONTROL].view('<u8')
+        self.layout = layout
+        self.channels = [Channel(self.data, layout, index) for index in range(layout.workers)]
+        self.signals = signals
+        self.client = client
+        self.locks = locks
+        self.inflight = 0
+        self.idle = threading.Condition()
+
+    def run(self, doorbell):
+        while not self.control[STOP]:
+            requests = self.take()
+            if requests:
+                self.send(requests)
+            else:
+                doorbell.acquire(timeout=0.1)
+        # Workers check STOP under their channel's lock, so nothing is published after this take
+        requests = self.take()
+        if requests:
+            self.send(requests)
+        with self.idle:
+            self.idle.wait_for(lambda: not self.inflight)
+
+    def take(self):
+        """Return every published request as (channel, seq, slot, size, operation), oldest first per channel."""
+        taken = []
+        capacity = self.layout.requests
+        for index, channel in enumerate(self.channels):
+            with self.locks[index]:
+                head = int(channel.counters[REQUEST_HEAD])
+                tail = int(channel.counters[REQUEST_TAIL])
+                for position in range(head, tail):
+                    taken.append((index, *channel.requests[position % capacity].tolist()))
+                channel.counters[REQUEST_HEAD] = tail
+        return taken
+
+    def send(self, requests):
+        groups = {}
+        for request in requests:
+            groups.setdefault(request[4], []).append(request)
+        for operation, group in groups.items():
+            event_size = event_dtypes[operation].itemsize
+            batch, events = [], 0
+            for request in group:
+                count = request[3] // event_size
+                if batch and events + count > BATCH_MAX:
+                    self.submit(operation, batch)
+                    batch, events = [], 0
+                batch.append(request)
+                events += count
+            self.submit(operation, batch)
+
+    def submit(self, operation, batch):
+        views = [self.channels[index].slots[slot * SLOT_SIZE:slot * SLOT_SIZE + size] for index, _, slot, size, _ in batch]
+        # One request is sent straight from the ring; several are packed together
+        events = views[0] if len(views) == 1 else np.concatenate(views)
+        copy = lambda data, size: ctypes.string_at(data, size) if size else b''
+        with self.idle:
+            self.inflight += 1
+        try:
+            future = self.client.submit_buffer(operation, events.ctypes.data, events.nbytes, events, copy)
+        except Exception:
+            self.finish(batch, STATUS_ERROR)
+            return
+        future.add_done_callback(lambda future: self.distribute(operation, batch, events, future))
+
+    def distribute(self, operation, batch, events, future):
+        """Write each request's share of the packet's reply over its events and complete it."""
+        error = future.exception()
+        if error is not None:
+            self.finish(batch, error.status if isinstance(error, PacketError) else STATUS_ERROR)
+            return
+        try:
+            reply = np.frombuffer(future.result(), dtype=reply_dtypes[operation])
+            event_size = event_dtypes[operation].itemsize
+            starts = np.cumsum([0] + [size // event_size for *_, size, _ in batch])
+            if operation in result_types:
+                reply = reply.copy()
+                positions = reply['index']
+            else:
+                positions = self.found(events.view('V16'), reply)
+            bounds = np.searchsorted(positions, starts)
+            if operation in result_types:
+                # Failure indexes become relative to each request
+                reply['index'] -= np.repeat(starts[:-1], np.diff(bounds)).astype(np.uint32)
+        except Exception:
+            self.finish(batch, STATUS_ERROR)
+            return
+        for k, (index, seq, slot, _, _) in enumerate(batch):
+            rows = reply[bounds[k]:bounds[k + 1]]
+            self.channels[index].slots[slot * SLOT_SIZE:slot * SLOT_SIZE + rows.nbytes] = rows.view(np.uint8)
+            self.complete(index, seq, TB_PACKET_OK, rows.nbytes)
+        self.finish([], None)
+
+    @staticmethod
+    def found(ids, reply):
+        """Return the position in `ids` of each looked-up object in `reply`, which is in request order."""
+        if len(reply) == len(ids):
+            return np.arange(len(ids))
+        requested = ids.tolist()
+        positions = np.empty(len(reply), dtype=np.int64)
+        position = 0
+        for k, id in enumerate(np.ascontiguousarray(reply['id']).view('V16').ravel().tolist()):
+            while requested[position] != id:
+                position += 1
+            positions[k] = position
+            position += 1
+        return positions
+
+    def complete(self, index, seq, status, size):
+        channel = self.channels[index]
+        with self.locks[index]:
+            tail = int(channel.counters[COMPLETION_TAIL])
+            channel.completions[tail % self.layout.requests] = (seq, status, size)
+            channel.counters[COMPLETION_TAIL] = tail + 1
+        self.signals[index].release()
+
+    def finish(self, batch, status):
+        for index, seq, *_ in batch:
+            self.complete(index, seq, status, 0)
+        with self.idle:
+            self.inflight -= 1
+            self.idle.notify_all()
+
+    def close(self):
+        self.client.deinit()
+        del self.channels, self.control, self.data
+
+
+class BrokerClient(Operations):
+    """A worker process's client: submits through its channel to the broker process.
+
+    Requests wait for room when the channel's ring is full, so the ring bounds the memory
+    each worker can have outstanding. If the broker process exits, the requests it hasn't
+    completed fail with RuntimeError and the client closes.
+    """
+
+    def __init__(self, name, layout, index, doorbell, signal, lock):
+        self.shm = shared_memory.SharedMemory(name=name)
+        self.layout = layout
+        self.index = index
+        data = np.frombuffer(self.shm.buf, np.uint8)
+        self.control = data[:CONTROL].view('<u8')
+        self.channel = Channel(data, layout, index)
+        self.doorbell = doorbell
+        self.signal = signal
+        # Shared with the broker process; see the note on the channel counters
+        self.lock = lock
+        self.condition = threading.Condition()
+        # seq -> (future, decode, slot, entry) of each request published and not yet completed
+        self.pending = {}
+        # [end, done] entries in publication order; ring slots are freed in this order
+        self.outstanding = collections.deque()
+        self.next_seq = 0
+        self.allocated = 0
+        self.freed = 0
+        self.closed = False
+        self.completions = threading.Thread(target=self.run_completions, name="tb-broker-completions", daemon=True)
+        self.completions.start()
+
+    def submit_buffer(self, operation, address, size, owner, decode):
+        """Copy `size` bytes of packed events at `address` into the ring and submit them.
+
+        `decode(data, size)` gets the reply in the ring and runs on this client's completion thread.
+        """
+        if operation not in OPERATIONS:
+            raise ValueError(f"Operation {operation} is not supported through the broker")
+        event_type = event_types[operation]
+        count = size // ctypes.sizeof(event_type)
+        if count > BATCH_MAX:
+            raise ValueError(f"{count} events do not fit in one packet")
+        if count == 0:
+            future = concurrent.futures.Future()
+            future.set_running_or_notify_cancel()
+            future.set_result(decode(None, 0))
+            return future
+        if operation in result_types:
+            flags = ctypes.c_uint16.from_address(address + size - ctypes.sizeof(event_type) + event_type.flags.offset).value
+            if flags & TB_TRANSFER_LINKED:
+                raise ValueError("The last event is linked; a linked chain must end within its request")
+        slots = self.layout.slots
+        need = -(-max(size, count * ctypes.sizeof(reply_types[operation])) // SLOT_SIZE)
+        if need > slots:
+            raise ValueError(f"Request of {size} bytes does not fit the broker's ring")
+
+        future = concurrent.futures.Future()
+        future.set_running_or_notify_cancel()
+        counters = self.channel.counters
+        with self.condition:
+            while True:
+                if self.closed:
+                    raise RuntimeError("Client is closed")
+                slot = self.allocated
+                if slot % slots + need > slots:
+                    # Requests never wrap around the end of the ring; skip to its start
+                    slot += slots - slot % slots
+                if len(self.outstanding) < self.layout.requests and slot + need - self.freed <= slots:
+                    break
+                self.condition.wait()
+            entry = [slot + need, False]
+            seq = self.next_seq
+            ctypes.memmove(self.channel.address + slot % slots * SLOT_SIZE, address, size)
+            with self.lock:
+                if self.control[STOP]:
+                    raise RuntimeError("The broker is closed")
+                tail = int(counters[REQUEST_TAIL])
+                self.channel.requests[tail % self.layout.requests] = (seq, slot % slots, size, operation)
+                counters[REQUEST_TAIL] = tail + 1
+            self.allocated = slot + need
+            self.outstanding.append(entry)
+            self.next_seq += 1
+            self.pending[seq] = (future, decode, slot % slots, entry)
+        self.doorbell.release()
+        return future
+
+    def run_completions(self):
+        counters = self.channel.counters
+        while True:
+            if not self.signal.acquire(timeout=BROKER_CHECK_INTERVAL):
+                pid = int(self.control[BROKER_PID])
+                if not pid or process_alive(pid):
+                    continue
+                self.fail_pending(RuntimeError("The broker process exited before the request completed"))
+                return
+            with self.lock:
+                head = int(counters[COMPLETION_HEAD])
+                tail = int(counters[COMPLETION_TAIL])
+                entries = [self.channel.completions[position % self.layout.requests].tolist() for position in range(head, tail)]
+            with self.condition:
+                completed = [(*self.pending.pop(seq), status, size) for seq, status, size in entries]
+            for future, decode, slot, entry, status, size in completed:
+                try:
+                    if status == STATUS_ERROR:
+                        result = RuntimeError("The broker could not submit the request")
+                    elif status != TB_PACKET_OK:
+                        result = PacketError(status)
+                    else:
+                        result = decode(self.channel.address + slot * SLOT_SIZE, size)
+                except Exception as e:
+                    result = e
+                entry[1] = True
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+            counters[COMPLETION_HEAD] = tail
+            with self.condition:
+                while self.outstanding and self.outstanding[0][1]:
+                    self.freed = self.outstanding.popleft()[0]
+                self.condition.notify_all()
+                if self.closed and not self.pending:
+                    return
+
+    def fail_pending(self, error):
+        with self.condition:
+            self.closed = True
+            failed, self.pending = list(self.pending.values()), {}
+            self.condition.notify_all()
+        for future, *_ in failed:
+            future.set_exception(error)
+
+    def close(self):
+        """Wait for the requests in flight, or for the broker process to exit, then give the channel back to the broker."""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.signal.release()
+        self.completions.join()
+        self.channel.counters[OWNER] = 0
+        del self.channel, self.control
+        self.shm.close()
+
+    def deinit(self):
+        self.close()
@@ -0,0 +1,199 @@
+import array
+import contextlib
+
+from . import uint128
+from .batcher import BATCH_MAX
+from .client2 import (
+    TB_OPERATION_CREATE_TRANSFERS,
+    TB_TRANSFER_LINKED,
+    TB_TRANSFER_PENDING,
+    TB_TRANSFER_POST_PENDING_TRANSFER,
+    TB_TRANSFER_VOID_PENDING_TRANSFER,
+    tb_transfer_t,
+)
+from .results import CreateResults, CreateTransferResult as R
+
+
+class TransferBatch:
+    """Builds one packet of transfers in place, with helpers for linked chains and two-phase transfers.
+
+    Rows are written straight into a packed tb_transfer_t buffer, so events() can be handed
+    to submit without another copy; after submit(), the batch refuses changes until the
+    request completes, as the packet points at that buffer. validate() checks the whole batch in one NumPy pass for
+    the mistakes the cluster would reject it for anyway, and reports them with the same result
+    codes, including linked_event_failed for the rest of a broken chain.
+
+        batch = TransferBatch()
+        with batch.chain():
+            batch.add(id=1, debit_account_id=10, credit_account_id=20, amount=100, ledger=1, code=1)
+            batch.add(id=2, debit_account_id=10, credit_account_id=30, amount=2, ledger=1, code=2)
+        batch.pending(id=3, debit_account_id=10, credit_account_id=20, amount=50, ledger=1, code=1, timeout=60)
+        failures = batch.submit(client).result()
+    """
+
+    def __init__(self, capacity=BATCH_MAX, max_amount=uint128.MAX):
+        self.rows = (tb_transfer_t * capacity)()
+        self.capacity = capacity
+        self.max_amount = max_amount
+        self.count = 0
+        self.chain_start = None
+        # The future of the last submit(); the rows must not change until it is done
+        self.in_flight = None
+
+    def __len__(self):
+        return self.count
+
+    def add(self, id, debit_account_id=0, credit_account_id=0, amount=0, ledger=0, code=0, flags=0,
+            pending_id=0, timeout=0, user_data_128=0, user_data_64=0, user_data_32=0):
+        """Append a transfer and return its index in the batch."""
+        self.check_idle()
+        if self.count == self.capacity:
+            raise ValueError(f"Batch is full at {self.capacity} transfers")
+        if not 0 <= amount <= self.max_amount:
+            raise ValueError(f"Amount {amount} is outside 0..{self.max_amount}")
+        index = self.count
+        row = self.rows[index]
+        row.id = id
+        row.debit_account_id = debit_account_id
+        row.credit_account_id = credit_account_id
+        row.amount = amount
+        row.pending_id = pending_id
+        row.user_data_128 = user_data_128
+        row.user_data_64 = user_data_64
+        row.user_data_32 = user_data_32
+        row.timeout = timeout
+        row.ledger = ledger
+        row.code = code
+        # Inside a chain every row is linked to the next; chain() unlinks the last one
+        row.flags = flags | (TB_TRANSFER_LINKED if self.chain_start is not None else 0)
+        row.timestamp = 0
+        self.count += 1
+        return index
+
+    def pending(self, id, debit_account_id, credit_account_id, amount, ledger, code, timeout=0, flags=0, **fields):
+        """Append the first phase of a two-phase transfer; it expires after `timeout` seconds (0 = never)."""
+        return self.add(id, debit_account_id, credit_account_id, amount, ledger, code, flags | TB_TRANSFER_PENDING, timeout=timeout, **fields)
+
+    def post(self, id, pending_id, amount=0, flags=0, **fields):
+        """Append a transfer posting pending transfer `pending_id`; the remaining fields are taken from it."""
+        return self.add(id, amount=amount, flags=flags | TB_TRANSFER_POST_PENDING_TRANSFER, pending_id=pending_id, **fields)
+
+    def void(self, id, pending_id, flags=0, **fields):
+        """Append a transfer voiding pending transfer `pending_id`."""
+        return self.add(id, flags=flags | TB_TRANSFER_VOID_PENDING_TRANSFER, pending_id=pending_id, **fields)
+
+    @contextlib.contextmanager
+    def chain(self):
+        """Link every transfer added inside the block, so they succeed or fail together.
+
+        If the block raises, its transfers are dropped from the batch.
+        """
+        if self.chain_start is not None:
+            raise RuntimeError("Linked chains cannot be nested")
+        self.chain_start = start = self.count
+        try:
+            yield self
+        except BaseException:
+            self.count = start
+            raise
+        finally:
+            self.chain_start = None
+        if self.count > start:
+            self.rows[self.count - 1].flags &= ~TB_TRANSFER_LINKED
+
+    def events(self):
+        """Return the packed transfers, a view of the batch's own buffer: don't change the batch while they are in flight."""
+        return (tb_transfer_t * self.count).from_buffer(self.rows)
+
+    def clear(self):
+        """Empty the batch so its buffer can be reused for the next one."""
+        self.check_idle()
+        self.count = 0
+
+    def submit(self, client):
+        """Validate and submit the batch; returns the client's future, or raises CreateError without sending.
+
+        Until the future is done, add() and clear() raise RuntimeError.
+        """
+        self.check_idle()
+        self.validate().raise_on_errors()
+        self.in_flight = client.submit(TB_OPERATION_CREATE_TRANSFERS, self.events())
+        return self.in_flight
+
+    def check_idle(self):
+        if self.in_flight is not None and not self.in_flight.done():
+            raise RuntimeError("Batch is still being sent; wait for its submit() future before changing it")
+
+    def validate(self, account_ledgers=None):
+        """Return the transfers the cluster would reject, as CreateResults with its result codes.
+
+        With `account_ledgers`, a mapping of account id to ledger (e.g. from a lookup or the
+        LookupCache), unknown accounts and ledger mismatches are reported as well. Only the first
+        problem of each transfer is reported, in the order the cluster checks them.
+        """
+        if not self.count:
+            return CreateResults(R, array.array('I'), array.array('I'))
+        import numpy as np
+        from .arrays import TRANSFER_DTYPE
+
+        view = np.frombuffer(self.rows, dtype=TRANSFER_DTYPE, count=self.count)
+        codes = np.zeros(self.count, dtype='<u4')
+
+        def check(failed, code):
+            codes[(codes == 0) & failed] = code
+
+        zero = lambda field: ~view[field].any(axis=1)
+        flags = view['flags']
+        linked = (flags & TB_TRANSFER_LINKED) != 0
+        pending = (flags & TB_TRANSFER_PENDING) != 0
+        post = (flags & TB_TRANSFER_POST_PENDING_TRANSFER) != 0
+        void = (flags & TB_TRANSFER_VOID_PENDING_TRANSFER) != 0
+        resolving = post | void
+        regular = ~resolving
+        ids = np.ascontiguousarray(view['id'])
+        debits = view['debit_account_id']
+        credits = view['credit_account_id']
+
+        check(zero('id'), R.id_must_not_be_zero)
+        check((ids == uint128.MASK64).all(axis=1), R.id_must_not_be_int_max)
+        check((post & void) | (pending & resolving), R.flags_are_mutually_exclusive)
+        check(regular & zero('debit_account_id'), R.debit_account_id_must_not_be_zero)
+        check(regular & zero('credit_account_id'), R.credit_account_id_must_not_be_zero)
+        check(regular & (debits == credits).all(axis=1), R.accounts_must_be_different)
+        check(regular & ~zero('pending_id'), R.pending_id_must_be_zero)
+        check(resolving & zero('pending_id'), R.pending_id_must_not_be_zero)
+        check(resolving & (view['pending_id'] == ids).all(axis=1), R.pending_id_must_be_different)
+        check(~pending & (view['timeout'] != 0), R.timeout_reserved_for_pending_transfer)
+        check(regular & (view['ledger'] == 0), R.ledger_must_not_be_zero)
+        check(regular & (view['code'] == 0), R.code_must_not_be_zero)
+
+        if account_ledgers is not None:
+            self.check_ledgers(np, view, regular, account_ledgers, check)
+
+        # Later occurrences of an id would find the first one already created
+        _, first, inverse = np.unique(ids.view('V16').ravel(), return_index=True, return_inverse=True)
+        check(np.arange(self.count) != first[inverse.ravel()], R.exists)
+
+        # A chain fails as a whole: an open chain at the end, or any failed member, fails the rest
+        if linked[-1]:
+            codes[-1] = R.linked_event_chain_open
+        starts = np.concatenate(([True], ~linked[:-1]))
+        chain = np.cumsum(starts) - 1
+        failed_chains = np.bincount(chain, weights=codes != 0) > 0
+        check(failed_chains[chain], R.linked_event_failed)
+
+        failed = np.flatnonzero(codes)
+        return CreateResults(R, array.array('I', failed.tolist()), array.array('I', codes[failed].tolist()))
+
+    def check_ledgers(self, np, view, regular, account_ledgers, check):
+        pairs = np.concatenate((view['debit_account_id'], view['credit_account_id']))
+        unique, inverse = np.unique(pairs.view('V16').ravel(), return_inverse=True)
+        ledgers = np.array(
+            [account_ledgers.get(id, -1) for id in uint128.from_pairs(np.frombuffer(unique.tobytes(), dtype='<u8').reshape(-1, 2))],
+            dtype=np.int64,
+        )[inverse.ravel()]
+        debit_ledgers, credit_ledgers = ledgers[:self.count], ledgers[self.count:]
+        check(regular & (debit_ledgers < 0), R.debit_account_not_found)
+        check(regular & (credit_ledgers < 0), R.credit_account_not_found)
+        check(regular & (debit_ledgers != credit_ledgers), R.accounts_must_have_the_same_ledger)
+        check(regular & (view['ledger'] != debit_ledgers), R.transfer_must_have_the_same_ledger_as_accounts)
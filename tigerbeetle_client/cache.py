@@ -0,0 +1,164 @@
+import collections
+import concurrent.futures
+import ctypes
+import math
+import threading
+import time
+
+from .client2 import (
+    TB_OPERATION_CREATE_TRANSFERS,
+    TB_OPERATION_LOOKUP_ACCOUNTS,
+    TB_OPERATION_LOOKUP_TRANSFERS,
+    Operations,
+    tb_transfer_t,
+)
+
+
+class LookupCache(Operations):
+    """Read-through LRU cache in front of lookup_accounts and lookup_transfers.
+
+    Transfers never change once created, so they are served from the cache for as long as
+    they stay in it. An account's id, ledger, code, flags and user_data never change either,
+    but its balances do: a cached account is only served while it is at most `max_staleness`
+    seconds old. Transfers created through this cache mark their debit and credit accounts
+    stale, both when they are sent and when they complete, and a lookup that was in flight
+    when an account was marked stale doesn't refresh it.
+
+    Pass `max_staleness=math.inf` to lookup_accounts when only the immutable fields are
+    needed. Cached structs are shared between callers and must not be modified. Requests
+    made through submit_buffer (the NumPy API) bypass the cache, though created transfers
+    still invalidate their accounts.
+    """
+
+    def __init__(self, client, max_entries=100_000, max_staleness=0.05):
+        self.client = client
+        self.max_entries = max_entries
+        self.max_staleness = max_staleness
+        self.lock = threading.Lock()
+        # id -> [struct or None, fetched_at, invalidated_at], least recently used first
+        self.entries = {
+            TB_OPERATION_LOOKUP_ACCOUNTS: collections.OrderedDict(),
+            TB_OPERATION_LOOKUP_TRANSFERS: collections.OrderedDict(),
+        }
+        # Account ids with a lookup in flight, so invalidating them is remembered even if uncached
+        self.loading = collections.Counter()
+        self.hits = 0
+        self.misses = 0
+
+    def submit(self, operation, events):
+        if operation == TB_OPERATION_LOOKUP_ACCOUNTS:
+            return self.lookup(operation, events, self.max_staleness)
+        if operation == TB_OPERATION_LOOKUP_TRANSFERS:
+            return self.lookup(operation, events, math.inf)
+        if operation == TB_OPERATION_CREATE_TRANSFERS:
+            return self.invalidate_on_completion(events, self.client.submit(operation, events))
+        return self.client.submit(operation, events)
+
+    def submit_buffer(self, operation, address, size, owner, decode):
+        if operation == TB_OPERATION_CREATE_TRANSFERS and size:
+            transfers = (tb_transfer_t * (size // ctypes.sizeof(tb_transfer_t))).from_address(address)
+            return self.invalidate_on_completion(transfers, self.client.submit_buffer(operation, address, size, owner, decode))
+        return self.client.submit_buffer(operation, address, size, owner, decode)
+
+    def lookup_accounts(self, account_ids, max_staleness=None):
+        """Look up accounts, serving cached ones no older than `max_staleness` seconds (the cache's default if None)."""
+        if max_staleness is None:
+            max_staleness = self.max_staleness
+        return self.lookup(TB_OPERATION_LOOKUP_ACCOUNTS, account_ids, max_staleness).result()
+
+    def lookup(self, operation, ids, max_staleness):
+        """Serve what the cache can and fetch all the misses in one packet; the future resolves to the found structs in id order."""
+        ids = [int(id) for id in ids]
+        entries = self.entries[operation]
+        now = time.monotonic()
+        found = {}
+        with self.lock:
+            for id in ids:
+                entry = entries.get(id)
+                if entry is not None and entry[0] is not None and now - entry[1] <= max_staleness:
+                    entries.move_to_end(id)
+                    found[id] = entry[0]
+            misses = list(dict.fromkeys(id for id in ids if id not in found))
+            self.hits += sum(id in found for id in ids)
+            self.misses += len(misses)
+            if operation == TB_OPERATION_LOOKUP_ACCOUNTS:
+                self.loading.update(misses)
+
+        future = concurrent.futures.Future()
+        future.set_running_or_notify_cancel()
+        if not misses:
+            future.set_result([found[id] for id in ids if id in found])
+            return future
+
+        def fill(lookup_future):
+            with self.lock:
+                if operation == TB_OPERATION_LOOKUP_ACCOUNTS:
+                    self.done_loading(misses)
+                error = lookup_future.exception()
+                if error is None:
+                    for value in lookup_future.result():
+                        id = int(value.id)
+                        found[id] = value
+                        entry = entries.get(id)
+                        # An account invalidated while this lookup was in flight may already have moved on
+                        fetched_at = now if entry is None or entry[2] < now else -math.inf
+                        entries[id] = [value, fetched_at, -math.inf if entry is None else entry[2]]
+                        entries.move_to_end(id)
+                    self.trim(entries)
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result([found[id] for id in ids if id in found])
+
+        try:
+            self.client.submit(operation, misses).add_done_callback(fill)
+        except BaseException:
+            if operation == TB_OPERATION_LOOKUP_ACCOUNTS:
+                with self.lock:
+                    self.done_loading(misses)
+            raise
+        return future
+
+    def done_loading(self, account_ids):
+        for id in account_ids:
+            self.loading[id] -= 1
+            if self.loading[id] <= 0:
+                del self.loading[id]
+
+    def invalidate_on_completion(self, transfers, future):
+        account_ids = {int(id) for transfer in transfers for id in (transfer.debit_account_id, transfer.credit_account_id)}
+        self.invalidate(account_ids)
+        future.add_done_callback(lambda _: self.invalidate(account_ids))
+        return future
+
+    def invalidate(self, account_ids):
+        """Mark accounts' cached balances stale; their immutable fields stay cached."""
+        entries = self.entries[TB_OPERATION_LOOKUP_ACCOUNTS]
+        now = time.monotonic()
+        with self.lock:
+            for id in account_ids:
+                entry = entries.get(id)
+                if entry is not None:
+                    entry[1] = -math.inf
+                    entry[2] = now
+                elif self.loading[id] > 0:
+                    entries[id] = [None, -math.inf, now]
+            self.trim(entries)
+
+    def trim(self, entries):
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'accounts': len(self.entries[TB_OPERATION_LOOKUP_ACCOUNTS]),
+                'transfers': len(self.entries[TB_OPERATION_LOOKUP_TRANSFERS]),
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+    def clear(self):
+        with self.lock:
+            for entries in self.entries.values():
+                entries.clear()
@@ -0,0 +1,107 @@
+import bisect
+import hashlib
+import os
+
+import numpy as np
+
+
+def row_ids(namespace, rows):
+    """Deterministic u128 ids for input rows: a 64-bit hash of `namespace` above row + 1.
+
+    Rerunning the same job assigns every row the same id, so a resent row is reported as
+    `exists` instead of being created twice. Ids of one job are sequential, which keeps
+    them cheap for the cluster to index.
+    """
+    high = int.from_bytes(hashlib.blake2b(namespace.encode(), digest_size=8).digest(), 'little')
+    pairs = np.empty((len(rows), 2), dtype='<u8')
+    pairs[:, 0] = np.asarray(rows, dtype='<u8') + 1
+    pairs[:, 1] = high
+    return pairs
+
+
+class Checkpoint:
+    """Append-only journal of the input rows a bulk job has had acknowledged.
+
+    Each line is a half-open `start end` range of row numbers. A crash can at worst leave a
+    torn last line, which is ignored, so the rows it covered are simply sent again. On open the
+    journal is compacted to its merged ranges.
+    """
+
+    def __init__(self, path, sync=False):
+        self.path = path
+        self.sync = sync
+        # Sorted, non-overlapping, non-adjacent [start, end) ranges
+        self.starts = []
+        self.ends = []
+        ranges = []
+        if os.path.exists(path):
+            with open(path) as file:
+                for line in file:
+                    # A torn write can leave a line without its newline, or a truncated end
+                    if not line.endswith('\n'):
+                        continue
+                    try:
+                        start, end = map(int, line.split())
+                    except ValueError:
+                        continue
+                    if start < end:
+                        ranges.append((start, end))
+        for start, end in sorted(ranges):
+            self.add(start, end)
+        self.compact()
+        self.file = open(path, 'a')
+
+    def __len__(self):
+        """Return the number of acknowledged rows."""
+        return sum(end - start for start, end in zip(self.starts, self.ends))
+
+    def add(self, start, end):
+        i = bisect.bisect_left(self.ends, start)
+        j = bisect.bisect_right(self.starts, end)
+        if i < j:
+            start = min(start, self.starts[i])
+            end = max(end, self.ends[j - 1])
+        self.starts[i:j] = [start]
+        self.ends[i:j] = [end]
+
+    def compact(self):
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w') as file:
+            file.writelines(f'{start} {end}\n' for start, end in zip(self.starts, self.ends))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, self.path)
+
+    def covered(self, rows):
+        """Return a boolean array: which of the (sorted or not) row numbers are acknowledged."""
+        rows = np.asarray(rows, dtype=np.int64)
+        if not self.starts:
+            return np.zeros(len(rows), dtype=bool)
+        starts = np.array(self.starts, dtype=np.int64)
+        ends = np.array(self.ends, dtype=np.int64)
+        index = np.searchsorted(starts, rows, side='right') - 1
+        return (index >= 0) & (rows < ends[np.maximum(index, 0)])
+
+    def record(self, rows):
+        """Journal row numbers as acknowledged, one line per contiguous run."""
+        rows = np.asarray(rows, dtype=np.int64)
+        if not len(rows):
+            return
+        breaks = np.flatnonzero(np.diff(rows) != 1) + 1
+        starts = rows[np.concatenate(([0], breaks))].tolist()
+        ends = (rows[np.concatenate((breaks - 1, [len(rows) - 1]))] + 1).tolist()
+        self.file.write(''.join(f'{start} {end}\n' for start, end in zip(starts, ends)))
+        self.file.flush()
+        if self.sync:
+            os.fsync(self.file.fileno())
+        for start, end in zip(starts, ends):
+            self.add(start, end)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
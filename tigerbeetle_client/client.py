@@ -22,6 +22,20 @@ class Transfer:
     to_account: int
     amount: int
 
+def encode_accounts(accounts):
+    """Serialize accounts to binary format."""
+    return b''.join(
+        struct.pack('>QI', account.id, len(account.user_data)) + account.user_data.encode('utf-8')
+        for account in accounts
+    )
+
+def encode_transfers(transfers):
+    """Serialize transfers to binary format."""
+    return b''.join(
+        struct.pack('>QII', transfer.from_account, transfer.to_account, transfer.amount)
+        for transfer in transfers
+    )
+
 class TigerBeetleClient:
     def __init__(self, host='localhost', port=3000, timeout=5):
         self.host = host
@@ -80,22 +94,12 @@ class TigerBeetleClient:
 
     def create_accounts(self, accounts):
         """Create new accounts on the server."""
-        # Serialize accounts to binary format
-        payload_bytes = b''.join(
-            struct.pack('>QI', account.id, len(account.user_data)) + account.user_data.encode('utf-8')
-            for account in accounts
-        )
-        self.send_message(OP_CREATE_ACCOUNTS, payload_bytes)
+        self.send_message(OP_CREATE_ACCOUNTS, encode_accounts(accounts))
         return self.receive_response()
 
     def create_transfers(self, transfers):
         """Create new transfers on the server."""
-        # Serialize transfers to binary format
-        payload_bytes = b''.join(
-            struct.pack('>QII', transfer.from_account, transfer.to_account, transfer.amount)
-            for transfer in transfers
-        )
-        self.send_message(OP_CREATE_TRANSFERS, payload_bytes)
+        self.send_message(OP_CREATE_TRANSFERS, encode_transfers(transfers))
         return self.receive_response()
 
     def close(self):
@@ -1,42 +1,86 @@
+import concurrent.futures
 import ctypes
+import os
 import platform
 import logging
-
-# Set up logging
-logging.basicConfig(level=logging.DEBUG)
-
-# Define the architecture and platform mapping
-arch_map = {
-    'x86_64': 'x86_64',
-    'arm64': 'aarch64',
+import threading
+import time
+
+from . import uint128
+from .coalesce import Coalescer
+from .metrics import Metrics
+from .packets import MESSAGE_BODY_SIZE_MAX, PacketPool
+from .results import CreateAccountResult, CreateResults, CreateTransferResult
+from .uint128 import U128Structure, tb_uint128_t
+
+# Library directory and file name for each (platform.system(), platform.machine())
+native_dirs = {
+    ('linux', 'x86_64'): 'linux-x64',
+    ('linux', 'amd64'): 'linux-x64',
+    ('darwin', 'x86_64'): 'osx-x64',
+    ('darwin', 'arm64'): 'osx-aarch64',
+    ('darwin', 'aarch64'): 'osx-aarch64',
+    ('windows', 'amd64'): 'win-x64',
+    ('windows', 'x86_64'): 'win-x64',
 }
-
-platform_map = {
-    'linux': 'linux',
-    'darwin': 'osx',
-    'win32': 'win',
-}
-filename_map = {
-    'linux': 'client.so',
+native_filenames = {
+    'linux': 'libtb_client.so',
     'darwin': 'libtb_client.dylib',
-    'win32': 'client.dll',
+    'windows': 'tb_client.dll',
 }
 
-# Get the current architecture and platform
-arch = platform.machine()
-os_platform = platform.system().lower()
-
-# Construct the path to the shared library
-binary_filename = f'./native/{platform_map[os_platform]}-{arch_map[arch]}/{filename_map[os_platform]}'
-
-# Load the shared library
-client_lib = ctypes.CDLL(binary_filename)
+# Set to the full path of the native library to override where it is looked for
+LIBRARY_PATH_ENV = 'TB_CLIENT_LIBRARY'
+
+client_lib_lock = threading.Lock()
+loaded_lib = None
+
+def library_path():
+    """Return the path of the native library for this platform.
+
+    $TB_CLIENT_LIBRARY wins; otherwise native/ is looked for inside the installed package and
+    then next to it, as in a source checkout. Only glibc builds ship for Linux.
+    """
+    override = os.environ.get(LIBRARY_PATH_ENV)
+    if override:
+        return override
+    system, machine = platform.system().lower(), platform.machine().lower()
+    if (system, machine) not in native_dirs:
+        raise OSError(f"No TigerBeetle native library for {system} {machine}; set {LIBRARY_PATH_ENV}")
+    if system == 'linux' and platform.libc_ver()[0] != 'glibc':
+        raise OSError(f"No TigerBeetle native library for this libc (only glibc); set {LIBRARY_PATH_ENV}")
+    relative = os.path.join('native', native_dirs[system, machine], native_filenames[system])
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    candidates = [os.path.join(package_dir, relative), os.path.join(os.path.dirname(package_dir), relative)]
+    for candidate in candidates:
+        if os.path.exists(candidate):
+            return candidate
+    raise OSError(f"TigerBeetle native library not found at {' or '.join(candidates)}; set {LIBRARY_PATH_ENV}")
+
+def load_library():
+    """Load the native library and declare its prototypes, once per process."""
+    global loaded_lib
+    if loaded_lib is None:
+        with client_lib_lock:
+            if loaded_lib is None:
+                lib = ctypes.CDLL(library_path())
+                lib.tb_client_init.argtypes = [ctypes.POINTER(ctypes.c_void_p), tb_uint128_t, ctypes.c_char_p, ctypes.c_uint32, ctypes.c_uint32, ctypes.c_void_p, on_completion_t]
+                lib.tb_client_init.restype = ctypes.c_int
+                lib.tb_client_submit.argtypes = [ctypes.c_void_p, ctypes.POINTER(tb_packet_t)]
+                lib.tb_client_submit.restype = None
+                lib.tb_client_deinit.argtypes = [ctypes.c_void_p]
+                lib.tb_client_deinit.restype = None
+                loaded_lib = lib
+    return loaded_lib
+
+def __getattr__(name):
+    # client_lib used to be loaded at import; keep it available, loaded on first access
+    if name == 'client_lib':
+        return load_library()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Define the necessary structures
-class tb_uint128_t(ctypes.Structure):
-    _fields_ = [('high', ctypes.c_uint64), ('low', ctypes.c_uint64)]
-
-class tb_account_t(ctypes.Structure):
+class tb_account_t(U128Structure):
     _fields_ = [
         ('id', tb_uint128_t),
         ('debits_pending', tb_uint128_t),
@@ -53,12 +97,73 @@ class tb_account_t(ctypes.Structure):
         ('timestamp', ctypes.c_uint64),
     ]
 
+class tb_transfer_t(U128Structure):
+    _fields_ = [
+        ('id', tb_uint128_t),
+        ('debit_account_id', tb_uint128_t),
+        ('credit_account_id', tb_uint128_t),
+        ('amount', tb_uint128_t),
+        ('pending_id', tb_uint128_t),
+        ('user_data_128', tb_uint128_t),
+        ('user_data_64', ctypes.c_uint64),
+        ('user_data_32', ctypes.c_uint32),
+        ('timeout', ctypes.c_uint32),
+        ('ledger', ctypes.c_uint32),
+        ('code', ctypes.c_uint16),
+        ('flags', ctypes.c_uint16),
+        ('timestamp', ctypes.c_uint64),
+    ]
+
+class tb_account_filter_t(U128Structure):
+    _fields_ = [
+        ('account_id', tb_uint128_t),
+        ('user_data_128', tb_uint128_t),
+        ('user_data_64', ctypes.c_uint64),
+        ('user_data_32', ctypes.c_uint32),
+        ('code', ctypes.c_uint16),
+        ('reserved', ctypes.c_uint8 * 58),
+        ('timestamp_min', ctypes.c_uint64),
+        ('timestamp_max', ctypes.c_uint64),
+        ('limit', ctypes.c_uint32),
+        ('flags', ctypes.c_uint32),
+    ]
+
+class tb_account_balance_t(U128Structure):
+    _fields_ = [
+        ('debits_pending', tb_uint128_t),
+        ('debits_posted', tb_uint128_t),
+        ('credits_pending', tb_uint128_t),
+        ('credits_posted', tb_uint128_t),
+        ('timestamp', ctypes.c_uint64),
+        ('reserved', ctypes.c_uint8 * 56),
+    ]
+
+class tb_query_filter_t(U128Structure):
+    _fields_ = [
+        ('user_data_128', tb_uint128_t),
+        ('user_data_64', ctypes.c_uint64),
+        ('user_data_32', ctypes.c_uint32),
+        ('ledger', ctypes.c_uint32),
+        ('code', ctypes.c_uint16),
+        ('reserved', ctypes.c_uint8 * 6),
+        ('timestamp_min', ctypes.c_uint64),
+        ('timestamp_max', ctypes.c_uint64),
+        ('limit', ctypes.c_uint32),
+        ('flags', ctypes.c_uint32),
+    ]
+
 class tb_create_accounts_result_t(ctypes.Structure):
     _fields_ = [
         ('index', ctypes.c_uint32),
         ('result', ctypes.c_uint32),
     ]
 
+class tb_create_transfers_result_t(ctypes.Structure):
+    _fields_ = [
+        ('index', ctypes.c_uint32),
+        ('result', ctypes.c_uint32),
+    ]
+
 class tb_packet_t(ctypes.Structure):
     pass
 
@@ -75,119 +180,360 @@ tb_packet_t._fields_ = [
     ('reserved', ctypes.c_uint8 * 8),
 ]
 
-# Define function prototypes
-client_lib.tb_client_init.argtypes = [ctypes.POINTER(ctypes.c_void_p), tb_uint128_t, ctypes.c_char_p, ctypes.c_uint32, ctypes.c_uint32, ctypes.c_void_p, ctypes.CFUNCTYPE(None, ctypes.c_void_p, ctypes.c_void_p, ctypes.POINTER(tb_packet_t), ctypes.POINTER(ctypes.c_uint8), ctypes.c_uint32)]
-client_lib.tb_client_init.restype = ctypes.c_int
+# Operation codes
+TB_OPERATION_CREATE_ACCOUNTS = 129
+TB_OPERATION_CREATE_TRANSFERS = 130
+TB_OPERATION_LOOKUP_ACCOUNTS = 131
+TB_OPERATION_LOOKUP_TRANSFERS = 132
+TB_OPERATION_GET_ACCOUNT_TRANSFERS = 133
+TB_OPERATION_GET_ACCOUNT_BALANCES = 134
+TB_OPERATION_QUERY_ACCOUNTS = 135
+TB_OPERATION_QUERY_TRANSFERS = 136
+
+# Account flags
+TB_ACCOUNT_LINKED = 1 << 0
+TB_ACCOUNT_DEBITS_MUST_NOT_EXCEED_CREDITS = 1 << 1
+TB_ACCOUNT_CREDITS_MUST_NOT_EXCEED_DEBITS = 1 << 2
+TB_ACCOUNT_HISTORY = 1 << 3
+
+# Transfer flags
+TB_TRANSFER_LINKED = 1 << 0
+TB_TRANSFER_PENDING = 1 << 1
+TB_TRANSFER_POST_PENDING_TRANSFER = 1 << 2
+TB_TRANSFER_VOID_PENDING_TRANSFER = 1 << 3
+TB_TRANSFER_BALANCING_DEBIT = 1 << 4
+TB_TRANSFER_BALANCING_CREDIT = 1 << 5
+
+# Filter flags
+TB_ACCOUNT_FILTER_DEBITS = 1 << 0
+TB_ACCOUNT_FILTER_CREDITS = 1 << 1
+TB_ACCOUNT_FILTER_REVERSED = 1 << 2
+TB_QUERY_FILTER_REVERSED = 1 << 0
+
+# Packet status codes reported on completion
+TB_PACKET_OK = 0
+TB_PACKET_TOO_MUCH_DATA = 1
+TB_PACKET_INVALID_OPERATION = 2
+TB_PACKET_INVALID_DATA_SIZE = 3
+
+# Element type of the request and reply for each operation
+event_types = {
+    TB_OPERATION_CREATE_ACCOUNTS: tb_account_t,
+    TB_OPERATION_CREATE_TRANSFERS: tb_transfer_t,
+    TB_OPERATION_LOOKUP_ACCOUNTS: tb_uint128_t,
+    TB_OPERATION_LOOKUP_TRANSFERS: tb_uint128_t,
+    TB_OPERATION_GET_ACCOUNT_TRANSFERS: tb_account_filter_t,
+    TB_OPERATION_GET_ACCOUNT_BALANCES: tb_account_filter_t,
+    TB_OPERATION_QUERY_ACCOUNTS: tb_query_filter_t,
+    TB_OPERATION_QUERY_TRANSFERS: tb_query_filter_t,
+}
+reply_types = {
+    TB_OPERATION_CREATE_ACCOUNTS: tb_create_accounts_result_t,
+    TB_OPERATION_CREATE_TRANSFERS: tb_create_transfers_result_t,
+    TB_OPERATION_LOOKUP_ACCOUNTS: tb_account_t,
+    TB_OPERATION_LOOKUP_TRANSFERS: tb_transfer_t,
+    TB_OPERATION_GET_ACCOUNT_TRANSFERS: tb_transfer_t,
+    TB_OPERATION_GET_ACCOUNT_BALANCES: tb_account_balance_t,
+    TB_OPERATION_QUERY_ACCOUNTS: tb_account_t,
+    TB_OPERATION_QUERY_TRANSFERS: tb_transfer_t,
+}
+# Creates reply with only the failed events, decoded into CreateResults with these codes
+result_types = {
+    TB_OPERATION_CREATE_ACCOUNTS: CreateAccountResult,
+    TB_OPERATION_CREATE_TRANSFERS: CreateTransferResult,
+}
+
+on_completion_t = ctypes.CFUNCTYPE(None, ctypes.c_void_p, ctypes.c_void_p, ctypes.POINTER(tb_packet_t), ctypes.POINTER(ctypes.c_uint8), ctypes.c_uint32)
+
+class PacketError(RuntimeError):
+    """Raised through a request's future when the packet completes with a non-ok status."""
+    def __init__(self, status):
+        super().__init__(f"Packet completed with status {status}")
+        self.status = status
+
+class Operations:
+    """Convenience operations shared by anything that implements submit_buffer (and may override submit)."""
+
+    def submit(self, operation, events):
+        """Submit a batch of events and return a concurrent.futures.Future for the decoded reply."""
+        data = self.pack_events(operation, events)
+        decode = lambda reply, size: self.decode_reply(operation, reply, size)
+        return self.submit_buffer(operation, ctypes.addressof(data), ctypes.sizeof(data), data, decode)
+
+    @staticmethod
+    def pack_events(operation, events):
+        """Return `events` as a ctypes object holding the packed events; ctypes arrays are passed through."""
+        event_type = event_types[operation]
+        if isinstance(events, ctypes.Array):
+            return events
+        if event_type is tb_uint128_t:
+            # Ids may be plain ints; pack them in one pass instead of one Structure each
+            return ctypes.create_string_buffer(uint128.pack(events), len(events) * 16)
+        return (event_type * len(events))(*events)
+
+    @staticmethod
+    def decode_reply(operation, data, size):
+        """Decode a reply of `size` bytes at `data` (an address, pointer or bytes) into CreateResults or a list of structures."""
+        if operation in result_types:
+            return CreateResults.from_buffer(result_types[operation], data, size)
+        reply_type = reply_types[operation]
+        results = (reply_type * (size // ctypes.sizeof(reply_type)))()
+        if size:
+            ctypes.memmove(results, data, size)
+        return list(results)
+
+    def submit_async(self, operation, events):
+        """Like submit, but returns an awaitable bound to the running asyncio event loop."""
+        import asyncio
+        return asyncio.wrap_future(self.submit(operation, events))
+
+    def create_accounts(self, accounts):
+        return self.submit(TB_OPERATION_CREATE_ACCOUNTS, accounts).result()
+
+    def create_transfers(self, transfers):
+        return self.submit(TB_OPERATION_CREATE_TRANSFERS, transfers).result()
+
+    def lookup_accounts(self, account_ids):
+        return self.submit(TB_OPERATION_LOOKUP_ACCOUNTS, account_ids).result()
+
+    def lookup_transfers(self, transfer_ids):
+        return self.submit(TB_OPERATION_LOOKUP_TRANSFERS, transfer_ids).result()
+
+    async def create_accounts_async(self, accounts):
+        return await self.submit_async(TB_OPERATION_CREATE_ACCOUNTS, accounts)
 
-client_lib.tb_client_acquire_packet.argtypes = [ctypes.c_void_p, ctypes.POINTER(ctypes.POINTER(tb_packet_t))]
-client_lib.tb_client_acquire_packet.restype = ctypes.c_int
+    async def create_transfers_async(self, transfers):
+        return await self.submit_async(TB_OPERATION_CREATE_TRANSFERS, transfers)
 
-client_lib.tb_client_release_packet.argtypes = [ctypes.c_void_p, ctypes.POINTER(tb_packet_t)]
-client_lib.tb_client_release_packet.restype = None
+    async def lookup_accounts_async(self, account_ids):
+        return await self.submit_async(TB_OPERATION_LOOKUP_ACCOUNTS, account_ids)
 
-client_lib.tb_client_submit.argtypes = [ctypes.c_void_p, ctypes.POINTER(tb_packet_t)]
-client_lib.tb_client_submit.restype = None
+    async def lookup_transfers_async(self, transfer_ids):
+        return await self.submit_async(TB_OPERATION_LOOKUP_TRANSFERS, transfer_ids)
 
-client_lib.tb_client_deinit.argtypes = [ctypes.c_void_p]
-client_lib.tb_client_deinit.restype = None
+    def create_accounts_array(self, accounts):
+        """Create accounts from an ACCOUNT_DTYPE array; returns a CREATE_RESULT_DTYPE array of failures."""
+        from . import arrays
+        return arrays.submit_array(self, TB_OPERATION_CREATE_ACCOUNTS, accounts).result()
+
+    def create_transfers_array(self, transfers):
+        """Create transfers from a TRANSFER_DTYPE array; returns a CREATE_RESULT_DTYPE array of failures."""
+        from . import arrays
+        return arrays.submit_array(self, TB_OPERATION_CREATE_TRANSFERS, transfers).result()
+
+    def lookup_accounts_array(self, account_ids, out=None):
+        """Look up accounts by ids (ints or [low, high] uint64 pairs); returns the found accounts as an ACCOUNT_DTYPE array."""
+        from . import arrays
+        return arrays.submit_array(self, TB_OPERATION_LOOKUP_ACCOUNTS, account_ids, out).result()
+
+    def lookup_transfers_array(self, transfer_ids, out=None):
+        """Look up transfers by ids (ints or [low, high] uint64 pairs); returns the found transfers as a TRANSFER_DTYPE array."""
+        from . import arrays
+        return arrays.submit_array(self, TB_OPERATION_LOOKUP_TRANSFERS, transfer_ids, out).result()
+
+    def get_account_transfers(self, account_filter):
+        return self.submit(TB_OPERATION_GET_ACCOUNT_TRANSFERS, [account_filter]).result()
+
+    def get_account_balances(self, account_filter):
+        return self.submit(TB_OPERATION_GET_ACCOUNT_BALANCES, [account_filter]).result()
+
+    def query_accounts(self, query_filter):
+        return self.submit(TB_OPERATION_QUERY_ACCOUNTS, [query_filter]).result()
+
+    def query_transfers(self, query_filter):
+        return self.submit(TB_OPERATION_QUERY_TRANSFERS, [query_filter]).result()
+
+    def iter_account_transfers(self, account_filter, page_size=None, prefetch=True, as_array=False):
+        """Yield every transfer matching the filter, paging by timestamp; see queries.paginate."""
+        from . import queries
+        return queries.paginate(self, TB_OPERATION_GET_ACCOUNT_TRANSFERS, account_filter, page_size, prefetch, as_array)
+
+    def iter_account_balances(self, account_filter, page_size=None, prefetch=True, as_array=False):
+        """Yield every balance snapshot matching the filter, paging by timestamp; see queries.paginate."""
+        from . import queries
+        return queries.paginate(self, TB_OPERATION_GET_ACCOUNT_BALANCES, account_filter, page_size, prefetch, as_array)
+
+    def iter_query_accounts(self, query_filter, page_size=None, prefetch=True, as_array=False):
+        """Yield every account matching the filter, paging by timestamp; see queries.paginate."""
+        from . import queries
+        return queries.paginate(self, TB_OPERATION_QUERY_ACCOUNTS, query_filter, page_size, prefetch, as_array)
+
+    def iter_query_transfers(self, query_filter, page_size=None, prefetch=True, as_array=False):
+        """Yield every transfer matching the filter, paging by timestamp; see queries.paginate."""
+        from . import queries
+        return queries.paginate(self, TB_OPERATION_QUERY_TRANSFERS, query_filter, page_size, prefetch, as_array)
+
+def forget_touched_accounts(coalescer, transfers):
+    # A lookup sent before these transfers could miss their effect, so later lookups must not join it
+    if coalescer.busy():
+        account_ids = {int(id) for transfer in transfers for id in (transfer.debit_account_id, transfer.credit_account_id)}
+        coalescer.forget(TB_OPERATION_LOOKUP_ACCOUNTS, account_ids)
+
+def forget_touched_buffer(coalescer, address, size):
+    # Same as forget_touched_accounts, for transfers packed at `address`
+    if coalescer.busy() and size:
+        forget_touched_accounts(coalescer, (tb_transfer_t * (size // ctypes.sizeof(tb_transfer_t))).from_address(address))
 
 # Example: Class to wrap around the client library
-class TigerBeetleClient:
-    def __init__(self, lib):
-        self.lib = lib
+class TigerBeetleClient(Operations):
+    def __init__(self, lib=None, cluster_id=0, addresses=b'127.0.0.1:3000', packets_count=1024, metrics=None):
+        # The native library is loaded by the first client, not at import
+        self.lib = load_library() if lib is None else lib
         self.context = ctypes.c_void_p()
-        self.init_client()
-
-    def init_client(self):
-        cluster_id = tb_uint128_t(0, 0)  # Cluster ID with both high and low parts set to 0
-        address = b'127.0.0.1:3000'  # Example address
-        packets_count = 1024
+        # Pass one Metrics to several clients to aggregate them
+        self.metrics = Metrics() if metrics is None else metrics
+        self.init_client(cluster_id, addresses, packets_count)
+
+    def init_client(self, cluster_id, addresses, packets_count):
+        cluster_id = tb_uint128_t.from_int(cluster_id)
+        # Addresses may be given as a list of 'host:port' strings or one comma-separated string
+        if not isinstance(addresses, (str, bytes)):
+            addresses = ",".join(addresses)
+        address = addresses.encode() if isinstance(addresses, str) else addresses
+        # Packets are caller-owned: one pool slot per packet the native client may have in flight
+        self.packets = PacketPool(tb_packet_t, packets_count)
+        # In-flight requests indexed by the pool slot stored in packet.user_data
+        self.inflight = [None] * packets_count
+        self.inflight_lock = threading.Lock()
+        self.coalescer = Coalescer(self.submit_events)
+        self.metrics.add_gauge('packets_in_flight', self.packets.in_use)
         on_completion_ctx = ctypes.c_void_p()
-        on_completion_fn = ctypes.CFUNCTYPE(None, ctypes.c_void_p, ctypes.c_void_p, ctypes.POINTER(tb_packet_t), ctypes.POINTER(ctypes.c_uint8), ctypes.c_uint32)(self.on_completion)
-        logging.debug(f"Initializing client with cluster_id: {cluster_id}, address: {address.decode()}, packets_count: {packets_count}")
-        result = self.lib.tb_client_init(ctypes.byref(self.context), cluster_id, address, len(address), packets_count, on_completion_ctx, on_completion_fn)
+        # Keep a reference to the callback so it outlives this call
+        self.on_completion_fn = on_completion_t(self.on_completion)
+        logging.debug("Initializing client with cluster_id: %s, address: %s, packets_count: %s", cluster_id, address, packets_count)
+        result = self.lib.tb_client_init(ctypes.byref(self.context), cluster_id, address, len(address), packets_count, on_completion_ctx, self.on_completion_fn)
         if result != 0:
             raise RuntimeError("Failed to initialize client")
-        logging.debug(f"Client initialized successfully with context: {self.context}")
+        logging.debug("Client initialized successfully with context: %s", self.context)
 
     def on_completion(self, context, client, packet, data, size):
-        # Handle completion (dummy implementation)
-        logging.debug(f"Completion handler called with context: {context}, client: {client}, packet: {packet}, data size: {size}")
-        # Print detailed packet information
-        logging.debug(f"Packet operation: {packet.contents.operation}, status: {packet.contents.status}, data size: {packet.contents.data_size}")
-
-    def create_accounts(self, accounts):
-        # Acquire a packet
-        packet = ctypes.POINTER(tb_packet_t)()
-        acquire_status = self.lib.tb_client_acquire_packet(self.context, ctypes.byref(packet))
-        if acquire_status != 0:
-            raise RuntimeError("Failed to acquire packet")
-        logging.debug(f"Packet acquired: {packet}")
-
-        # Fill packet with account data
-        packet.contents.operation = 129  # TB_OPERATION_CREATE_ACCOUNTS
-        packet.contents.data_size = ctypes.sizeof(tb_account_t) * len(accounts)
-        packet.contents.data = ctypes.cast((tb_account_t * len(accounts))(*accounts), ctypes.c_void_p)
-        logging.debug(f"Packet filled with data: {packet.contents.data}")
-
-        # Submit the packet
-        self.lib.tb_client_submit(self.context, packet)
-        logging.debug(f"Packet submitted: {packet}")
-
-        # Release the packet
-        self.lib.tb_client_release_packet(self.context, packet)
-        logging.debug(f"Packet released: {packet}")
-
-    def lookup_accounts(self, account_ids):
-        # Acquire a packet
-        packet = ctypes.POINTER(tb_packet_t)()
-        acquire_status = self.lib.tb_client_acquire_packet(self.context, ctypes.byref(packet))
-        if acquire_status != 0:
-            raise RuntimeError("Failed to acquire packet")
-        logging.debug(f"Packet acquired for lookup: {packet}")
-
-        # Fill packet with account lookup data
-        packet.contents.operation = 131  # TB_OPERATION_LOOKUP_ACCOUNTS
-        packet.contents.data_size = ctypes.sizeof(tb_uint128_t) * len(account_ids)
-        packet.contents.data = ctypes.cast((tb_uint128_t * len(account_ids))(*account_ids), ctypes.c_void_p)
-        logging.debug(f"Packet filled with lookup data: {packet.contents.data}")
-
-        # Submit the packet
-        self.lib.tb_client_submit(self.context, packet)
-        logging.debug(f"Lookup packet submitted: {packet}")
-
-        # For simplicity, assume synchronous completion and the result is immediately available
-        results = (tb_account_t * len(account_ids))()
-        ctypes.memmove(results, packet.contents.data, packet.contents.data_size)
-        logging.debug(f"Lookup results received: {results}")
-
-        # Release the packet
-        self.lib.tb_client_release_packet(self.context, packet)
-        logging.debug(f"Lookup packet released: {packet}")
-
-        return results
+        # Runs on the native completion thread: copy the reply out, return the packet to the pool and resolve the future
+        slot = packet.contents.user_data or 0  # c_void_p reads 0 as None
+        completed_at = time.perf_counter_ns()
+        with self.inflight_lock:
+            entry = self.inflight[slot]
+            self.inflight[slot] = None
+        if entry is None:
+            return
+        future, decode, _owner, queued_at, sent_at = entry
+        status = packet.contents.status
+        operation = packet.contents.operation
+        self.metrics.record(operation, packet.contents.data_size // ctypes.sizeof(event_types[operation]), queued_at, sent_at, completed_at, status)
+        try:
+            if status != TB_PACKET_OK:
+                result = PacketError(status)
+            else:
+                result = decode(data, size)
+                if isinstance(result, CreateResults) and result:
+                    self.metrics.record_results(operation, result.codes)
+        except Exception as e:
+            result = e
+        finally:
+            self.packets.release(slot)
+        if isinstance(result, Exception):
+            future.set_exception(result)
+        else:
+            future.set_result(result)
+
+    def submit(self, operation, events):
+        """Like Operations.submit, copying the events straight into a packet buffer.
+
+        Lookups of ids that are already in a lookup in flight share that packet's reply.
+        """
+        if operation in (TB_OPERATION_LOOKUP_ACCOUNTS, TB_OPERATION_LOOKUP_TRANSFERS):
+            return self.coalescer.submit(operation, events)
+        if operation == TB_OPERATION_CREATE_TRANSFERS:
+            forget_touched_accounts(self.coalescer, events)
+        return self.submit_events(operation, events)
+
+    def submit_events(self, operation, events):
+        event_type = event_types[operation]
+        size = ctypes.sizeof(event_type) * len(events)
+        if size > MESSAGE_BODY_SIZE_MAX:
+            raise ValueError(f"{len(events)} events do not fit in one packet")
+        decode = lambda data, size: self.decode_reply(operation, data, size)
+        if size == 0:
+            return self.submit_buffer(operation, 0, 0, None, decode)
+
+        # Copy the events into the slot's own buffer, which stays valid until completion
+        queued_at = time.perf_counter_ns()
+        slot = self.packets.acquire()
+        address = self.packets.buffer(slot)
+        if isinstance(events, ctypes.Array):
+            ctypes.memmove(address, events, size)
+        elif event_type is tb_uint128_t:
+            # Ids may be plain ints; pack them in one pass instead of one Structure each
+            ctypes.memmove(address, uint128.pack(events), size)
+        else:
+            (event_type * len(events)).from_address(address)[:] = events
+        return self.submit_packet(slot, operation, address, size, None, decode, queued_at)
+
+    def submit_buffer(self, operation, address, size, owner, decode):
+        """Submit `size` bytes of packed events at `address` without copying them.
+
+        `owner` is whatever keeps that memory alive; it is held until the packet completes.
+        `decode(data, size)` turns the reply buffer into the future's result and runs on
+        the completion thread, before the reply buffer is reused.
+        """
+        if size > MESSAGE_BODY_SIZE_MAX:
+            raise ValueError(f"{size} bytes of events do not fit in one packet")
+        if operation == TB_OPERATION_CREATE_TRANSFERS:
+            forget_touched_buffer(self.coalescer, address, size)
+        if size == 0:
+            future = concurrent.futures.Future()
+            future.set_running_or_notify_cancel()
+            future.set_result(decode(None, 0))
+            return future
+        queued_at = time.perf_counter_ns()
+        return self.submit_packet(self.packets.acquire(), operation, address, size, owner, decode, queued_at)
+
+    def submit_packet(self, slot, operation, address, size, owner, decode, queued_at):
+        future = concurrent.futures.Future()
+        # The packet can't be recalled once submitted, so the future can't be cancelled either
+        future.set_running_or_notify_cancel()
+
+        packet = self.packets.packet(slot)
+        packet.user_data = slot
+        packet.operation = operation
+        packet.status = TB_PACKET_OK
+        packet.data_size = size
+        packet.data = address
+
+        with self.inflight_lock:
+            self.inflight[slot] = (future, decode, owner, queued_at, time.perf_counter_ns())
+        self.lib.tb_client_submit(self.context, ctypes.byref(packet))
+        return future
 
     def deinit(self):
         self.lib.tb_client_deinit(self.context)
-        logging.debug(f"Client deinitialized")
+        # Fail anything the native client never completed
+        with self.inflight_lock:
+            pending, self.inflight = self.inflight, [None] * len(self.inflight)
+        for future, *_ in filter(None, pending):
+            future.set_exception(RuntimeError("Client deinitialized before the request completed"))
+        self.metrics.remove_gauge('packets_in_flight', self.packets.in_use)
+        logging.debug("Client deinitialized")
 
 # Example usage
 if __name__ == "__main__":
-    client = TigerBeetleClient(client_lib)
+    logging.basicConfig(level=logging.DEBUG)
+    client = TigerBeetleClient()
 
     # Create example accounts
     accounts = [
-        tb_account_t(id=tb_uint128_t(0, 1), debits_pending=tb_uint128_t(0, 0), debits_posted=tb_uint128_t(0, 0), credits_pending=tb_uint128_t(0, 0), credits_posted=tb_uint128_t(0, 0), user_data_128=tb_uint128_t(0, 0), user_data_64=0, user_data_32=0, reserved=0, ledger=1, code=1, flags=0, timestamp=0),
-        tb_account_t(id=tb_uint128_t(0, 2), debits_pending=tb_uint128_t(0, 0), debits_posted=tb_uint128_t(0, 0), credits_pending=tb_uint128_t(0, 0), credits_posted=tb_uint128_t(0, 0), user_data_128=tb_uint128_t(0, 0), user_data_64=0, user_data_32=0, reserved=0, ledger=1, code=1, flags=0, timestamp=0),
+        tb_account_t(id=1, ledger=1, code=1),
+        tb_account_t(id=2, ledger=1, code=1),
     ]
 
-    client.create_accounts(accounts)
-    logging.info("Accounts created successfully")
+    errors = client.create_accounts(accounts)
+    for error in errors:
+        logging.info(f"Account at index {error.index} failed with result {error.result}")
+    logging.info("Accounts created")
 
     # Verify created accounts
-    account_ids = [tb_uint128_t(0, 1), tb_uint128_t(0, 2)]
+    account_ids = [1, 2]
     result = client.lookup_accounts(account_ids)
     for account in result:
-        logging.info(f"Account ID: {account.id.low}, Balance: {account.debits_pending.low}")
+        logging.info(f"Account ID: {int(account.id)}, Balance: {int(account.credits_posted) - int(account.debits_posted)}")
 
     client.deinit()
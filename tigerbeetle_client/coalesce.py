@@ -0,0 +1,87 @@
+import concurrent.futures
+import threading
+
+
+class Coalescer:
+    """Merges concurrent lookups so that each id is in at most one packet in flight.
+
+    `send(operation, ids)` submits a lookup packet and returns a future for the found
+    structs. Ids that are already in a packet in flight attach to that packet's reply, and
+    ids repeated within one call are sent once and appear once per occurrence in the result.
+    Found structs are shared between the callers that asked for them and must not be modified.
+    """
+
+    def __init__(self, send):
+        self.send = send
+        self.lock = threading.Lock()
+        # (operation, id) -> future for the reply of the packet in flight that carries it, as {id: struct}
+        self.pending = {}
+
+    def submit(self, operation, events):
+        ids = [int(id) for id in events]
+        if not ids:
+            return self.send(operation, [])
+        new_ids = []
+        shared = concurrent.futures.Future()
+        with self.lock:
+            replies = {}
+            for id in ids:
+                reply = self.pending.get((operation, id))
+                if reply is None:
+                    new_ids.append(id)
+                    reply = self.pending[operation, id] = shared
+                replies[id] = reply
+        if new_ids:
+            self.send_ids(operation, new_ids, shared)
+        return self.join(ids, set(replies.values()))
+
+    def send_ids(self, operation, ids, shared):
+        def resolve(packet_future):
+            self.forget(operation, ids, shared)
+            error = packet_future.exception()
+            if error is not None:
+                shared.set_exception(error)
+            else:
+                shared.set_result({int(value.id): value for value in packet_future.result()})
+
+        try:
+            self.send(operation, ids).add_done_callback(resolve)
+        except Exception as e:
+            self.forget(operation, ids, shared)
+            shared.set_exception(e)
+
+    def join(self, ids, replies):
+        """Return a future for the structs found for `ids`, once every reply they depend on is in."""
+        future = concurrent.futures.Future()
+        future.set_running_or_notify_cancel()
+        remaining = [len(replies)]
+        lock = threading.Lock()
+
+        def done(_):
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            found = {}
+            for reply in replies:
+                error = reply.exception()
+                if error is not None:
+                    future.set_exception(error)
+                    return
+                found.update(reply.result())
+            future.set_result([found[id] for id in ids if id in found])
+
+        for reply in replies:
+            reply.add_done_callback(done)
+        return future
+
+    def forget(self, operation, ids, shared=None):
+        """Stop attaching new lookups of `ids` to the packets in flight (only `shared`'s, if given)."""
+        with self.lock:
+            for id in ids:
+                reply = self.pending.get((operation, id))
+                if reply is not None and (shared is None or reply is shared):
+                    del self.pending[operation, id]
+
+    def busy(self):
+        return bool(self.pending)
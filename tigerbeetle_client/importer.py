@@ -0,0 +1,299 @@
+"""Streaming import of accounts and transfers from CSV, Parquet or Arrow files.
+
+    result = import_file(client, 'backfill.parquet', 'transfers', defaults={'ledger': 1}, failures='failed.csv')
+
+Rows are read a chunk at a time, each column is converted in one vectorized step straight into
+a packed ACCOUNT_DTYPE / TRANSFER_DTYPE array, and that array is cut into full packets of up to
+BATCH_MAX events that are submitted without another copy. Parquet, Arrow and fast CSV reading
+need pyarrow; without it CSV falls back to the csv module.
+"""
+import collections
+import contextlib
+import csv
+import itertools
+import os
+import time
+
+import numpy as np
+
+from . import uint128
+from .arrays import ACCOUNT_DTYPE, TRANSFER_DTYPE, submit_array
+from .batcher import BATCH_MAX
+from .checkpoint import Checkpoint, row_ids
+from .client2 import TB_ACCOUNT_LINKED, TB_OPERATION_CREATE_ACCOUNTS, TB_OPERATION_CREATE_TRANSFERS, TB_TRANSFER_LINKED, result_types
+from .results import result_code
+
+kinds = {
+    'accounts': (TB_OPERATION_CREATE_ACCOUNTS, ACCOUNT_DTYPE, TB_ACCOUNT_LINKED),
+    'transfers': (TB_OPERATION_CREATE_TRANSFERS, TRANSFER_DTYPE, TB_TRANSFER_LINKED),
+}
+
+formats = {
+    '.csv': 'csv',
+    '.parquet': 'parquet',
+    '.pq': 'parquet',
+    '.arrow': 'arrow',
+    '.arrows': 'arrow',
+    '.feather': 'arrow',
+    '.ipc': 'arrow',
+}
+
+ImportResult = collections.namedtuple('ImportResult', ['rows', 'failed', 'batches', 'seconds', 'skipped'])
+
+
+def importable_fields(dtype):
+    return [name for name in dtype.names if name != 'reserved']
+
+
+def detect_format(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in formats:
+        raise ValueError(f"Cannot tell the format of {path!r}; pass one of {sorted(set(formats.values()))}")
+    return formats[extension]
+
+
+def read_chunks(path, format=None, chunk_rows=65536, columns=None):
+    """Yield the rows of a file as {column name: values} dicts of about `chunk_rows` rows.
+
+    The values are pyarrow arrays, or NumPy string arrays for CSV without pyarrow. CSV
+    `columns` are read as text, so ids beyond 2**63 don't get inferred as floats.
+    """
+    format = format or detect_format(path)
+    if format == 'csv':
+        try:
+            import pyarrow.csv
+        except ImportError:
+            yield from read_csv_fallback(path, chunk_rows)
+            return
+        import pyarrow as pa
+
+        # pyarrow chunks CSV by bytes; ~128 bytes is a typical transfer row
+        read_options = pyarrow.csv.ReadOptions(block_size=max(1 << 20, chunk_rows * 128))
+        convert_options = pyarrow.csv.ConvertOptions(column_types={column: pa.string() for column in columns or ()})
+        with pyarrow.csv.open_csv(path, read_options=read_options, convert_options=convert_options) as reader:
+            for batch in reader:
+                yield batch_columns(batch)
+    elif format == 'parquet':
+        import pyarrow.parquet
+
+        parquet = pyarrow.parquet.ParquetFile(path)
+        names = [name for name in parquet.schema_arrow.names if columns is None or name in columns]
+        for batch in parquet.iter_batches(batch_size=chunk_rows, columns=names):
+            yield batch_columns(batch)
+    elif format == 'arrow':
+        import pyarrow as pa
+
+        with pa.memory_map(path) as source:
+            try:
+                reader = pa.ipc.open_file(source)
+                batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+            except pa.ArrowInvalid:
+                source.seek(0)
+                batches = pa.ipc.open_stream(source)
+            for batch in batches:
+                yield batch_columns(batch)
+    else:
+        raise ValueError(f"Unknown format {format!r}")
+
+
+def batch_columns(batch):
+    return dict(zip(batch.schema.names, batch.columns))
+
+
+def read_csv_fallback(path, chunk_rows):
+    with open(path, newline='') as file:
+        reader = csv.reader(file)
+        names = next(reader, None)
+        if names is None:
+            return
+        while True:
+            rows = list(itertools.islice(reader, chunk_rows))
+            if not rows:
+                return
+            yield {name: np.array(values) for name, values in zip(names, zip(*rows))}
+
+
+def column_values(values, dtype):
+    """Convert one source column to the field's dtype in bulk: uint64 pairs for u128 fields."""
+    target = np.dtype('<u8') if dtype.shape else dtype.base
+    if hasattr(values, 'to_numpy'):
+        return arrow_values(values, dtype, target)
+    values = np.asarray(values)
+    if values.dtype.kind in 'US':
+        # Empty CSV cells are zero, like unset fields
+        values = np.where(values == '', '0', values)
+    if values.dtype.kind in 'iu' and len(values):
+        info = np.iinfo(target)
+        if values.min() < 0 or values.max() > info.max:
+            raise ValueError(f"values must be within 0..{info.max}")
+    elif values.dtype.kind == 'f' and (values != np.floor(values)).any():
+        raise ValueError("values must be integers")
+    try:
+        converted = values.astype(target)
+    except OverflowError:
+        if not dtype.shape:
+            raise
+        # Only ids and amounts beyond 64 bits take this per-row path
+        return uint128.to_pairs([int(value) for value in values.tolist()])
+    return uint128.to_pairs(converted) if dtype.shape else converted
+
+
+def arrow_values(values, dtype, target):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if pa.types.is_string(values.type) or pa.types.is_large_string(values.type):
+        # Empty CSV cells are zero, like unset fields
+        values = pc.if_else(pc.equal(values, ''), pa.scalar(None, values.type), values)
+    try:
+        converted = pc.cast(values, pa.from_numpy_dtype(target)).fill_null(0)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        if not dtype.shape:
+            raise
+        return uint128.to_pairs([0 if value is None else int(value) for value in values.to_pylist()])
+    converted = converted.to_numpy()
+    return uint128.to_pairs(converted) if dtype.shape else converted
+
+
+def pack_chunk(chunk, dtype, columns, defaults):
+    """Return one chunk as a packed event array; `columns` maps field -> column name."""
+    count = len(next(iter(chunk.values()))) if chunk else 0
+    events = np.zeros(count, dtype=dtype)
+    for field, value in defaults.items():
+        events[field] = uint128.split(value) if dtype.fields[field][0].shape else value
+    for field, column in columns.items():
+        if column not in chunk:
+            raise ValueError(f"Column {column!r} for field {field!r} is missing from the input")
+        try:
+            events[field] = column_values(chunk[column], dtype.fields[field][0])
+        except (ValueError, OverflowError, TypeError) as e:
+            raise ValueError(f"Column {column!r} cannot be imported as {field!r}: {e}") from None
+    return events
+
+
+def resolve_columns(dtype, columns, defaults, available=None, generated=()):
+    """Check a field -> column mapping; by default every field with a same-named column is mapped."""
+    fields = importable_fields(dtype)
+    unknown = [field for field in itertools.chain(columns or (), defaults or ()) if field not in fields]
+    if unknown:
+        raise ValueError(f"Unknown fields {unknown}; importable fields are {fields}")
+    if columns is not None:
+        return {field: column for field, column in columns.items() if field not in generated}
+    skip = set(defaults or ()) | set(generated)
+    return {field: field for field in fields if field not in skip and (available is None or field in available)}
+
+
+def import_chunks(client, kind, chunks, columns=None, defaults=None, batch_size=BATCH_MAX, max_in_flight=8,
+                  failures=None, id_namespace=None, checkpoint=None):
+    """Create the accounts or transfers (`kind`) in an iterable of column chunks.
+
+    Up to `max_in_flight` packets are outstanding at once. Events are carried over between
+    chunks so every packet but the last is full, and a packet never ends inside a linked
+    chain. Each failed event is written to the csv.writer-like `failures` as
+    (row, result code, result name), where row is its 0-based row in the input.
+
+    With `id_namespace`, ids are derived from it and the row number (see checkpoint.row_ids)
+    instead of read from the input. With a Checkpoint, rows it already has are skipped,
+    every acknowledged packet is journaled to it, and `exists` counts as success, so an
+    interrupted job can simply be run again with the same namespace and checkpoint.
+    """
+    operation, dtype, linked_flag = kinds[kind]
+    result_type = result_types[operation]
+    defaults = dict(defaults or {})
+    generated = ('id',) if id_namespace is not None else ()
+    resolve_columns(dtype, columns, defaults, generated=generated)
+    exists = int(result_type.exists)
+    in_flight = collections.deque()
+    started = time.perf_counter()
+    rows = failed = batches = skipped = 0
+    carry = np.zeros(0, dtype=dtype)
+    carry_rows = np.zeros(0, dtype=np.int64)
+
+    def finish():
+        nonlocal failed
+        numbers, future = in_flight.popleft()
+        results = future.result()
+        if checkpoint is not None:
+            results = results[results['result'] != exists]
+        failed += len(results)
+        if failures is not None:
+            for row, code in zip(numbers[results['index']].tolist(), results['result'].tolist()):
+                code = result_code(result_type, code)
+                failures.writerow((row, int(code), getattr(code, 'name', '')))
+        if checkpoint is not None:
+            checkpoint.record(numbers)
+
+    def send(events, numbers):
+        nonlocal batches
+        while len(in_flight) >= max_in_flight:
+            finish()
+        in_flight.append((numbers, submit_array(client, operation, events)))
+        batches += 1
+
+    try:
+        mapping = None
+        for chunk in chunks:
+            if mapping is None:
+                mapping = resolve_columns(dtype, columns, defaults, chunk, generated)
+            events = pack_chunk(chunk, dtype, mapping, defaults)
+            numbers = np.arange(rows, rows + len(events), dtype=np.int64)
+            rows += len(events)
+            if id_namespace is not None:
+                events['id'] = row_ids(id_namespace, numbers)
+            if checkpoint is not None:
+                done = checkpoint.covered(numbers)
+                if done.any():
+                    skipped += int(done.sum())
+                    events = events[~done]
+                    numbers = numbers[~done]
+            if len(carry):
+                events = np.concatenate((carry, events))
+                numbers = np.concatenate((carry_rows, numbers))
+            start = 0
+            while len(events) - start >= batch_size:
+                end = start + batch_size
+                linked = events['flags'][start:end] & linked_flag
+                if linked[-1]:
+                    # Leave the open chain for the next packet, unless it fills a whole packet itself
+                    ends = np.flatnonzero(linked == 0)
+                    if len(ends):
+                        end = start + ends[-1] + 1
+                send(events[start:end], numbers[start:end])
+                start = end
+            carry = events[start:].copy()
+            carry_rows = numbers[start:]
+        if len(carry):
+            send(carry, carry_rows)
+    except BaseException:
+        # Journal what the cluster already acknowledged, so a rerun doesn't send it again
+        while checkpoint is not None and in_flight:
+            try:
+                finish()
+            except Exception:
+                break
+        raise
+    while in_flight:
+        finish()
+    return ImportResult(rows, failed, batches, time.perf_counter() - started, skipped)
+
+
+def import_file(client, path, kind, format=None, columns=None, defaults=None, chunk_rows=65536,
+                batch_size=BATCH_MAX, max_in_flight=8, failures=None, id_namespace=None, checkpoint=None):
+    """Import a CSV, Parquet or Arrow file; `failures` is a path for the failed rows' CSV report.
+
+    `checkpoint` is the path of the job's Checkpoint journal. When resuming, the failures
+    report is appended to rather than replaced.
+    """
+    dtype = kinds[kind][1]
+    wanted = resolve_columns(dtype, columns, defaults, generated=('id',) if id_namespace is not None else ()).values()
+    chunks = read_chunks(path, format, chunk_rows, set(wanted))
+    with contextlib.ExitStack() as stack:
+        if checkpoint is not None:
+            checkpoint = stack.enter_context(Checkpoint(checkpoint))
+        writer = None
+        if failures is not None:
+            resuming = checkpoint is not None and len(checkpoint) > 0 and os.path.exists(failures)
+            writer = csv.writer(stack.enter_context(open(failures, 'a' if resuming else 'w', newline='')))
+            if not resuming:
+                writer.writerow(('row', 'code', 'result'))
+        return import_chunks(client, kind, chunks, columns, defaults, batch_size, max_in_flight, writer, id_namespace, checkpoint)
@@ -0,0 +1,244 @@
+"""Deterministic load generator and soak test.
+
+    python -m tigerbeetle_client.loadgen --stand-in --accounts 10000 --rate 200000 --duration 30
+    python -m tigerbeetle_client.loadgen --addresses 3000 --zipf 1.1 --linked-ratio 0.1 --json
+
+Pre-creates the accounts, then sends create_transfers batches on an open-loop schedule:
+batch k is due at start + k * batch_size / rate whether or not earlier ones have completed,
+and latency is measured from when a batch was due, so a stalled client or cluster shows up
+in the percentiles instead of silently lowering the load (coordinated omission). With
+--rate 0 batches are sent as fast as --in-flight allows. The same --seed sends the same
+transfers; use a new seed for each run against a cluster that keeps its data.
+
+--stand-in runs against the in-process mock replica from benchmarks/, so no cluster is
+needed; its CPU time is then included in the client CPU figure.
+"""
+import argparse
+import collections
+import json
+import sys
+import threading
+import time
+
+import numpy as np
+
+from .arrays import ACCOUNT_DTYPE, TRANSFER_DTYPE, submit_array
+from .batcher import BATCH_MAX
+from .client2 import TB_OPERATION_CREATE_ACCOUNTS, TB_OPERATION_CREATE_TRANSFERS, TB_TRANSFER_LINKED, TigerBeetleClient
+from .metrics import Histogram
+from .results import CreateAccountResult, CreateTransferResult, result_code
+
+# Templates generated up front and reused with fresh ids, so generation stays out of the measurement
+TEMPLATES = 64
+
+
+def zipf_cdf(count, exponent):
+    """Cumulative probabilities of ranks 1..count under a (finite) Zipf law; exponent 0 is uniform."""
+    weights = 1.0 / np.arange(1, count + 1, dtype=np.float64) ** exponent
+    cdf = np.cumsum(weights)
+    return cdf / cdf[-1]
+
+
+class Workload:
+    """Generates the accounts and transfer batches for a seed, without any I/O."""
+
+    def __init__(self, accounts=10_000, batch_size=BATCH_MAX, zipf=0.0, linked_ratio=0.0, chain_length=4, ledger=1, seed=1):
+        if accounts < 2:
+            raise ValueError("At least 2 accounts are needed")
+        self.accounts = accounts
+        self.batch_size = batch_size
+        self.linked_ratio = linked_ratio
+        self.chain_length = chain_length
+        self.ledger = ledger
+        self.rng = np.random.default_rng(seed)
+        # Ids are namespaced by the seed: accounts from 1, transfers from 2**40 in the low word
+        self.id_high = seed
+        self.next_transfer = 1 << 40
+        self.cdf = zipf_cdf(accounts, zipf)
+        # Hot ranks are spread over the id space rather than being the lowest ids
+        self.ranked = self.rng.permutation(accounts) + 1
+
+    def account_batches(self):
+        for start in range(0, self.accounts, BATCH_MAX):
+            count = min(BATCH_MAX, self.accounts - start)
+            batch = np.zeros(count, dtype=ACCOUNT_DTYPE)
+            batch['id'][:, 0] = np.arange(start + 1, start + count + 1)
+            batch['id'][:, 1] = self.id_high
+            batch['ledger'] = self.ledger
+            batch['code'] = 1
+            yield batch
+
+    def pick_accounts(self, count):
+        return self.ranked[np.searchsorted(self.cdf, self.rng.random(count), side='right').clip(max=self.accounts - 1)]
+
+    def template(self):
+        """Return one batch of transfers without ids."""
+        size = self.batch_size
+        batch = np.zeros(size, dtype=TRANSFER_DTYPE)
+        debits = self.pick_accounts(size)
+        credits = self.pick_accounts(size)
+        # A transfer needs two different accounts; move the credit to a neighbour when they collide
+        same = debits == credits
+        credits[same] = debits[same] % self.accounts + 1
+        batch['debit_account_id'][:, 0] = debits
+        batch['credit_account_id'][:, 0] = credits
+        batch['debit_account_id'][:, 1] = batch['credit_account_id'][:, 1] = self.id_high
+        batch['amount'][:, 0] = self.rng.integers(1, 1000, size, endpoint=True)
+        batch['ledger'] = self.ledger
+        batch['code'] = 1
+        if self.linked_ratio and self.chain_length > 1:
+            # Whole groups of chain_length become chains, about linked_ratio of the transfers in all
+            groups = size // self.chain_length
+            chains = np.flatnonzero(self.rng.random(groups) < self.linked_ratio)
+            for offset in range(self.chain_length - 1):
+                batch['flags'][chains * self.chain_length + offset] = TB_TRANSFER_LINKED
+        return batch
+
+    def batch(self, template):
+        """Return a copy of a template with the next transfer ids."""
+        batch = template.copy()
+        batch['id'][:, 0] = np.arange(self.next_transfer, self.next_transfer + len(batch))
+        batch['id'][:, 1] = self.id_high
+        self.next_transfer += len(batch)
+        return batch
+
+
+class Recorder:
+    """Collects per-batch outcomes from the completion thread."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency = Histogram()
+        self.service_time = Histogram()
+        self.acknowledged = 0
+        self.batches = 0
+        self.errors = 0
+        self.results = collections.Counter()
+
+    def record(self, future, events, due_at, sent_at):
+        completed_at = time.perf_counter_ns()
+        error = future.exception()
+        with self.lock:
+            self.batches += 1
+            self.latency.record(completed_at - due_at)
+            self.service_time.record(completed_at - sent_at)
+            if error is not None:
+                self.errors += 1
+                return
+            self.acknowledged += events
+            self.results.update(future.result()['result'].tolist())
+
+
+def precreate_accounts(client, workload):
+    for batch in workload.account_batches():
+        results = submit_array(client, TB_OPERATION_CREATE_ACCOUNTS, batch).result()
+        # Accounts left by an earlier run with the same seed are fine
+        failed = results[results['result'] != CreateAccountResult.exists]
+        if len(failed):
+            raise RuntimeError(f"Creating accounts failed: {collections.Counter(failed['result'].tolist())}")
+
+
+def run(client, workload, rate=0.0, duration=10.0, in_flight=64):
+    """Drive `workload` against `client` for `duration` seconds and return the report as a dict."""
+    precreate_accounts(client, workload)
+    templates = [workload.template() for _ in range(TEMPLATES)]
+    recorder = Recorder()
+    slots = threading.BoundedSemaphore(in_flight)
+    interval_ns = int(workload.batch_size / rate * 1e9) if rate else 0
+    sent = 0
+
+    def done(future, events, due_at, sent_at):
+        recorder.record(future, events, due_at, sent_at)
+        slots.release()
+
+    cpu_start = time.process_time()
+    start = time.perf_counter_ns()
+    end = start + int(duration * 1e9)
+    due_at = start
+    while due_at < end:
+        now = time.perf_counter_ns()
+        if interval_ns and due_at > now:
+            time.sleep((due_at - now) / 1e9)
+        slots.acquire()
+        batch = workload.batch(templates[sent % TEMPLATES])
+        sent_at = time.perf_counter_ns()
+        if not interval_ns:
+            due_at = sent_at
+        future = submit_array(client, TB_OPERATION_CREATE_TRANSFERS, batch)
+        future.add_done_callback(lambda future, due_at=due_at, sent_at=sent_at, events=len(batch): done(future, events, due_at, sent_at))
+        sent += 1
+        due_at += interval_ns
+    for _ in range(in_flight):
+        slots.acquire()
+    elapsed = (time.perf_counter_ns() - start) / 1e9
+    cpu = time.process_time() - cpu_start
+
+    events = sent * workload.batch_size
+    return {
+        'target_events_per_s': rate,
+        'events_sent': events,
+        'events_acknowledged': recorder.acknowledged,
+        'events_per_s': recorder.acknowledged / elapsed if elapsed else 0.0,
+        'seconds': elapsed,
+        'batches': sent,
+        'packet_errors': recorder.errors,
+        'failed_results': {getattr(result_code(CreateTransferResult, code), 'name', str(code)): count
+                           for code, count in sorted(recorder.results.items())},
+        'latency_ms': recorder.latency.summary(1e-6),
+        'service_time_ms': recorder.service_time.summary(1e-6),
+        'cpu_ms_per_1k_events': cpu * 1e3 / events * 1e3 if events else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m tigerbeetle_client.loadgen', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--addresses', default='127.0.0.1:3000')
+    parser.add_argument('--cluster-id', type=int, default=0)
+    parser.add_argument('--stand-in', action='store_true', help="use the in-process mock replica instead of a cluster")
+    parser.add_argument('--stand-in-latency', type=float, default=0.0, help="seconds the mock replica takes per batch")
+    parser.add_argument('--accounts', type=int, default=10_000)
+    parser.add_argument('--batch-size', type=int, default=BATCH_MAX)
+    parser.add_argument('--rate', type=float, default=0.0, help="target transfers per second (0: as fast as possible)")
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds")
+    parser.add_argument('--zipf', type=float, default=0.0, help="skew of account choice (0: uniform, ~1: a few hot accounts)")
+    parser.add_argument('--linked-ratio', type=float, default=0.0, help="fraction of transfers in linked chains")
+    parser.add_argument('--chain-length', type=int, default=4)
+    parser.add_argument('--in-flight', type=int, default=64, help="most batches outstanding at once")
+    parser.add_argument('--ledger', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--max-p99-ms', type=float, help="exit with status 1 if the p99 latency is above this")
+    parser.add_argument('--json', action='store_true', help="print one JSON document instead of a report")
+    args = parser.parse_args(argv)
+
+    if args.stand_in:
+        try:
+            from benchmarks.mock_replica import MockLib
+        except ImportError:
+            parser.error("--stand-in needs the benchmarks package from a source checkout")
+        client = TigerBeetleClient(MockLib(latency=args.stand_in_latency), packets_count=args.in_flight)
+    else:
+        client = TigerBeetleClient(cluster_id=args.cluster_id, addresses=args.addresses, packets_count=args.in_flight)
+    workload = Workload(args.accounts, args.batch_size, args.zipf, args.linked_ratio, args.chain_length, args.ledger, args.seed)
+    try:
+        report = run(client, workload, args.rate, args.duration, args.in_flight)
+    finally:
+        client.deinit()
+
+    if args.json:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        for key, value in report.items():
+            if isinstance(value, dict):
+                value = ', '.join(f"{name}={number:,.3f}" if isinstance(number, float) else f"{name}={number:,}" for name, number in value.items()) or '-'
+            elif isinstance(value, float):
+                value = f"{value:,.2f}"
+            print(f"{key}: {value}")
+    if args.max_p99_ms is not None and report['latency_ms']['p99'] > args.max_p99_ms:
+        return 1
+    return 1 if report['packet_errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
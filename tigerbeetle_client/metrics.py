@@ -0,0 +1,162 @@
+import collections
+import threading
+
+# Each power of two is split into this many buckets, so a recorded value is off by at most 1/32
+SUB_BUCKETS = 32
+SUB_BUCKET_BITS = 5
+
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+def bucket_index(value):
+    if value < SUB_BUCKETS:
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS - 1
+    return (shift + 1) * SUB_BUCKETS + (value >> shift) - SUB_BUCKETS
+
+
+def bucket_upper_bound(index):
+    if index < SUB_BUCKETS:
+        return index
+    shift = index // SUB_BUCKETS - 1
+    return ((index % SUB_BUCKETS + SUB_BUCKETS + 1) << shift) - 1
+
+
+class Histogram:
+    """HDR-style histogram of non-negative ints with log-linear buckets and constant-time record()."""
+
+    def __init__(self):
+        self.counts = [0] * (SUB_BUCKETS * 8)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value):
+        index = bucket_index(value)
+        if index >= len(self.counts):
+            self.counts.extend([0] * (index + 1 - len(self.counts)))
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """Return an upper bound for the q-quantile of the recorded values (0 if there are none)."""
+        if not self.count:
+            return 0
+        rank = max(1, int(q * self.count + 0.5))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bucket_upper_bound(index), self.max)
+        return self.max
+
+    def summary(self, scale=1):
+        return {
+            'count': self.count,
+            'sum': self.total * scale,
+            'max': self.max * scale,
+            **{f'p{q * 100:g}': self.quantile(q) * scale for q in QUANTILES},
+        }
+
+
+class Metrics:
+    """Per-operation counters and histograms for a client, read with snapshot().
+
+    Latencies are split into queue time (waiting for a free packet and filling it) and server
+    time (from tb_client_submit to the completion callback), both in seconds. A Metrics may be shared by
+    several clients, e.g. all handles of a ClientPool. Listeners registered with
+    add_listener are called on every completion with (operation, batch_size, queue_seconds,
+    server_seconds, status), which is the hook for feeding OpenTelemetry or StatsD.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency = collections.defaultdict(Histogram)
+        self.queue_time = collections.defaultdict(Histogram)
+        self.server_time = collections.defaultdict(Histogram)
+        self.batch_size = collections.defaultdict(Histogram)
+        # (operation, packet status) and (operation, create result code) -> count
+        self.packet_errors = collections.Counter()
+        self.result_codes = collections.Counter()
+        self.gauges = collections.defaultdict(list)
+        self.listeners = []
+
+    def add_gauge(self, name, read):
+        """Report the sum of `read()` over every registered reader as gauge `name`."""
+        with self.lock:
+            self.gauges[name].append(read)
+
+    def remove_gauge(self, name, read):
+        with self.lock:
+            self.gauges[name].remove(read)
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def record(self, operation, batch_size, queued_at, sent_at, completed_at, status):
+        """Record one completed packet; the times are time.perf_counter_ns() readings."""
+        with self.lock:
+            self.latency[operation].record(completed_at - queued_at)
+            self.queue_time[operation].record(sent_at - queued_at)
+            self.server_time[operation].record(completed_at - sent_at)
+            self.batch_size[operation].record(batch_size)
+            if status:
+                self.packet_errors[operation, status] += 1
+        for listener in self.listeners:
+            listener(operation, batch_size, (sent_at - queued_at) / 1e9, (completed_at - sent_at) / 1e9, status)
+
+    def record_results(self, operation, codes):
+        """Count the result codes of the failed events of a create batch."""
+        counts = collections.Counter(codes)
+        with self.lock:
+            for code, count in counts.items():
+                self.result_codes[operation, code] += count
+
+    def snapshot(self):
+        """Return every metric as plain dicts and numbers, keyed by operation code."""
+        with self.lock:
+            per_operation = lambda histograms, scale=1: {operation: histogram.summary(scale) for operation, histogram in histograms.items()}
+            gauges = dict((name, list(readers)) for name, readers in self.gauges.items())
+            snapshot = {
+                'latency_seconds': per_operation(self.latency, 1e-9),
+                'queue_seconds': per_operation(self.queue_time, 1e-9),
+                'server_seconds': per_operation(self.server_time, 1e-9),
+                'batch_size': per_operation(self.batch_size),
+                'packet_errors': dict(self.packet_errors),
+                'result_codes': dict(self.result_codes),
+            }
+        snapshot['gauges'] = {name: sum(read() for read in readers) for name, readers in gauges.items()}
+        return snapshot
+
+    def reset(self):
+        with self.lock:
+            for histograms in (self.latency, self.queue_time, self.server_time, self.batch_size):
+                histograms.clear()
+            self.packet_errors.clear()
+            self.result_codes.clear()
+
+
+def prometheus_text(snapshot, prefix='tigerbeetle_client'):
+    """Render a Metrics snapshot in the Prometheus text exposition format."""
+    lines = []
+    for name in ('latency_seconds', 'queue_seconds', 'server_seconds', 'batch_size'):
+        metric = f'{prefix}_{name}'
+        lines.append(f'# TYPE {metric} summary')
+        for operation, summary in sorted(snapshot[name].items()):
+            for q in QUANTILES:
+                lines.append(f'{metric}{{operation="{operation}",quantile="{q:g}"}} {summary[f"p{q * 100:g}"]:g}')
+            lines.append(f'{metric}_sum{{operation="{operation}"}} {summary["sum"]:g}')
+            lines.append(f'{metric}_count{{operation="{operation}"}} {summary["count"]}')
+    for name, label in (('packet_errors', 'status'), ('result_codes', 'result')):
+        metric = f'{prefix}_{name}_total'
+        lines.append(f'# TYPE {metric} counter')
+        for (operation, code), count in sorted(snapshot[name].items()):
+            lines.append(f'{metric}{{operation="{operation}",{label}="{int(code)}"}} {count}')
+    for name, value in sorted(snapshot['gauges'].items()):
+        lines.append(f'# TYPE {prefix}_{name} gauge')
+        lines.append(f'{prefix}_{name} {value}')
+    return '\n'.join(lines) + '\n'
+
@@ -0,0 +1,168 @@
+import concurrent.futures
+import ctypes
+import logging
+import threading
+import time
+
+from . import uint128
+from .client2 import (
+    TB_OPERATION_CREATE_TRANSFERS,
+    TB_OPERATION_LOOKUP_ACCOUNTS,
+    TB_OPERATION_LOOKUP_TRANSFERS,
+    TB_PACKET_OK,
+    Operations,
+    PacketError,
+    event_types,
+    forget_touched_accounts,
+    load_library,
+)
+from .coalesce import Coalescer
+from .metrics import Metrics
+from .results import CreateResults
+
+try:
+    from . import _native
+except ImportError:
+    _native = None
+
+# Completions handed to Python per GIL acquisition
+POLL_BATCH = 256
+
+
+def available():
+    """Return whether the _native extension was built for this interpreter."""
+    return _native is not None
+
+
+def function_address(function):
+    return ctypes.cast(function, ctypes.c_void_p).value
+
+
+class NativeClient(Operations):
+    """TigerBeetleClient whose submit and completion path runs in C, outside the GIL.
+
+    Copying a packed batch into a packet and submitting it happens with the GIL released,
+    so threads submitting ctypes arrays, NumPy arrays or bytes copy in parallel; only
+    packing Python lists of structs still needs the interpreter. Completions are queued in C
+    without the GIL and resolved by one Python thread in batches of up to POLL_BATCH, instead
+    of the GIL being taken in the native callback for every packet. On a free-threaded
+    CPython build the extension runs without the GIL at all.
+
+    Needs the _native extension, which setup.py builds when a C compiler is available.
+    """
+
+    def __init__(self, lib=None, cluster_id=0, addresses=b'127.0.0.1:3000', packets_count=1024, metrics=None):
+        if _native is None:
+            raise ImportError("tigerbeetle_client._native is not built; reinstall with a C compiler available")
+        self.lib = load_library() if lib is None else lib
+        self.metrics = Metrics() if metrics is None else metrics
+        if not isinstance(addresses, (str, bytes)):
+            addresses = ",".join(addresses)
+        address = addresses.encode() if isinstance(addresses, str) else addresses
+        low, high = uint128.split(cluster_id)
+        self.handle = _native.Client(
+            function_address(self.lib.tb_client_init),
+            function_address(self.lib.tb_client_submit),
+            function_address(self.lib.tb_client_deinit),
+            low, high, address, packets_count,
+        )
+        self.coalescer = Coalescer(self.submit_events)
+        self.metrics.add_gauge('packets_in_flight', self.handle.in_use)
+        self.completions = threading.Thread(target=self.run_completions, name="tb-completions", daemon=True)
+        self.completions.start()
+
+    def run_completions(self):
+        poll = self.handle.poll
+        while True:
+            completed = poll(POLL_BATCH)
+            if not completed:
+                return
+            completed_at = time.perf_counter_ns()
+            for token, status, reply, waited in completed:
+                self.complete(token, status, reply, waited, completed_at)
+
+    def complete(self, token, status, reply, waited, completed_at):
+        future, decode, _owner, operation, count, queued_at = token
+        # The C side reports how long the submit waited for a packet; the send follows that
+        sent_at = queued_at + waited
+        self.metrics.record(operation, count, queued_at, sent_at, completed_at, status)
+        try:
+            if status != TB_PACKET_OK:
+                result = PacketError(status)
+            elif reply is None:
+                result = MemoryError("Reply could not be copied")
+            else:
+                result = decode(reply, len(reply))
+                if isinstance(result, CreateResults) and result:
+                    self.metrics.record_results(operation, result.codes)
+        except Exception as e:
+            result = e
+        if isinstance(result, Exception):
+            future.set_exception(result)
+        else:
+            future.set_result(result)
+
+    def submit(self, operation, events):
+        if operation in (TB_OPERATION_LOOKUP_ACCOUNTS, TB_OPERATION_LOOKUP_TRANSFERS):
+            return self.coalescer.submit(operation, events)
+        if operation == TB_OPERATION_CREATE_TRANSFERS:
+            forget_touched_accounts(self.coalescer, events)
+        return self.submit_events(operation, events)
+
+    def submit_events(self, operation, events):
+        event_type = event_types[operation]
+        if hasattr(events, '__array_interface__'):
+            from . import arrays
+            # Converted to a contiguous array of the operation's dtype, which copies only if it isn't one
+            data = arrays.as_event_array(operation, events)
+        elif isinstance(events, (ctypes.Array, bytes, bytearray, memoryview)):
+            # Already packed: the copy into the packet happens in C without the GIL
+            data = events
+        else:
+            data = self.pack_events(operation, events)
+        size = memoryview(data).nbytes
+        if size % ctypes.sizeof(event_type):
+            raise ValueError(f"{size} bytes is not a whole number of {ctypes.sizeof(event_type)} byte events")
+        decode = lambda reply, size: self.decode_reply(operation, reply, size)
+        if size == 0:
+            return self.completed(decode(b'', 0))
+        future = concurrent.futures.Future()
+        future.set_running_or_notify_cancel()
+        queued_at = time.perf_counter_ns()
+        token = (future, decode, None, operation, size // ctypes.sizeof(event_type), queued_at)
+        self.handle.submit(token, operation, data)
+        return future
+
+    def submit_buffer(self, operation, address, size, owner, decode):
+        """Submit `size` bytes of packed events at `address` without copying them.
+
+        `decode(data, size)` gets the reply as bytes and runs on the completion thread.
+        """
+        if size == 0:
+            return self.completed(decode(b'', 0))
+        future = concurrent.futures.Future()
+        future.set_running_or_notify_cancel()
+        queued_at = time.perf_counter_ns()
+        token = (future, decode, owner, operation, size // ctypes.sizeof(event_types[operation]), queued_at)
+        self.handle.submit_address(token, operation, address, size)
+        return future
+
+    @staticmethod
+    def completed(result):
+        future = concurrent.futures.Future()
+        future.set_running_or_notify_cancel()
+        future.set_result(result)
+        return future
+
+    def deinit(self):
+        """Close the native client; requests it never completed fail, and later submits raise RuntimeError.
+
+        A submit that already has a packet hands it to the library before the client is
+        closed; one still waiting for a packet raises.
+        """
+        lost = self.handle.close()
+        self.completions.join()
+        for future, *_ in lost:
+            future.set_exception(RuntimeError("Client deinitialized before the request completed"))
+        self.metrics.remove_gauge('packets_in_flight', self.handle.in_use)
+        logging.debug("Native client deinitialized")
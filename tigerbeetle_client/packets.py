@@ -0,0 +1,51 @@
+import ctypes
+import mmap
+import threading
+
+# Largest request body the server accepts: a 1 MiB message minus its 256 byte header
+MESSAGE_BODY_SIZE_MAX = 1024 * 1024 - 256
+
+
+class PacketPool:
+    """Preallocated packets and data buffers, checked out per request and returned on completion.
+
+    The native client doesn't own any packets, so the packet and the data it points at must stay
+    alive until the completion callback runs. The pool owns both for the lifetime of the client,
+    so steady-state submission allocates nothing.
+    """
+
+    def __init__(self, packet_type, count, buffer_size=MESSAGE_BODY_SIZE_MAX):
+        self.packets = (packet_type * count)()
+        self.count = count
+        self.buffer_size = buffer_size
+        # Page-aligned anonymous mappings, created the first time a slot needs one and then reused
+        self.buffers = [None] * count
+        self.addresses = [0] * count
+        self.free = list(range(count - 1, -1, -1))
+        self.condition = threading.Condition()
+
+    def acquire(self, timeout=None):
+        """Check out a free slot, waiting up to `timeout` seconds (forever if None) for one."""
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.free, timeout):
+                raise TimeoutError(f"No packet became free within {timeout} seconds")
+            return self.free.pop()
+
+    def release(self, slot):
+        with self.condition:
+            self.free.append(slot)
+            self.condition.notify()
+
+    def packet(self, slot):
+        return self.packets[slot]
+
+    def buffer(self, slot):
+        """Return the address of the slot's data buffer."""
+        if self.buffers[slot] is None:
+            buffer = mmap.mmap(-1, self.buffer_size)
+            self.addresses[slot] = ctypes.addressof(ctypes.c_char.from_buffer(buffer))
+            self.buffers[slot] = buffer
+        return self.addresses[slot]
+
+    def in_use(self):
+        return self.count - len(self.free)
@@ -0,0 +1,104 @@
+import os
+import threading
+
+from .client2 import (
+    TB_OPERATION_CREATE_TRANSFERS,
+    TB_OPERATION_LOOKUP_ACCOUNTS,
+    TB_OPERATION_LOOKUP_TRANSFERS,
+    Operations,
+    TigerBeetleClient,
+    forget_touched_accounts,
+    forget_touched_buffer,
+)
+from .coalesce import Coalescer
+from .metrics import Metrics
+
+
+class ClientPool(Operations):
+    """Spreads requests over several native client handles, routing each to the least loaded one.
+
+    Handles are created lazily and recreated after a fork, since the native client's threads
+    don't survive into the child process (gunicorn / multiprocessing workers).
+    """
+
+    def __init__(self, lib=None, size=4, cluster_id=0, addresses=b'127.0.0.1:3000', packets_per_client=256, metrics=None):
+        if size < 1:
+            raise ValueError("A client pool needs at least one client")
+        self.lib = lib
+        self.size = size
+        self.cluster_id = cluster_id
+        self.addresses = addresses
+        self.packets_per_client = packets_per_client
+        self.lock = threading.Lock()
+        self.pid = None
+        self.clients = []
+        # Requests routed while every handle already had all of its packets in flight
+        self.saturated_picks = 0
+        self.coalescer = None
+        # Shared by every handle, so it reports the pool as a whole
+        self.metrics = Metrics() if metrics is None else metrics
+
+    def connect(self):
+        with self.lock:
+            if self.pid == os.getpid():
+                return self.clients
+            # Handles inherited from the parent belong to threads that no longer exist; drop them without deinit
+            if self.clients:
+                for client in self.clients:
+                    self.metrics.remove_gauge('packets_in_flight', client.packets.in_use)
+                # The parent's numbers would be counted again by every child
+                self.metrics.reset()
+            self.clients = [
+                TigerBeetleClient(self.lib, self.cluster_id, self.addresses, self.packets_per_client, self.metrics)
+                for _ in range(self.size)
+            ]
+            # Lookups are merged across the whole pool, not per handle; the parent's in-flight ones never complete here
+            self.coalescer = Coalescer(lambda operation, ids: self.pick().submit_events(operation, ids))
+            self.pid = os.getpid()
+            return self.clients
+
+    def pick(self):
+        """Return the client with the fewest packets in flight."""
+        clients = self.clients if self.pid == os.getpid() else self.connect()
+        client = min(clients, key=lambda client: client.packets.in_use())
+        if client.packets.in_use() >= self.packets_per_client:
+            with self.lock:
+                self.saturated_picks += 1
+        return client
+
+    def submit(self, operation, events):
+        if self.pid != os.getpid():
+            self.connect()
+        if operation in (TB_OPERATION_LOOKUP_ACCOUNTS, TB_OPERATION_LOOKUP_TRANSFERS):
+            return self.coalescer.submit(operation, events)
+        if operation == TB_OPERATION_CREATE_TRANSFERS:
+            forget_touched_accounts(self.coalescer, events)
+        return self.pick().submit_events(operation, events)
+
+    def submit_buffer(self, operation, address, size, owner, decode):
+        if self.pid != os.getpid():
+            self.connect()
+        if operation == TB_OPERATION_CREATE_TRANSFERS:
+            forget_touched_buffer(self.coalescer, address, size)
+        return self.pick().submit_buffer(operation, address, size, owner, decode)
+
+    def stats(self):
+        """Return in-flight counts and saturation for the pool and each handle."""
+        in_flight = [client.packets.in_use() for client in self.clients] if self.pid == os.getpid() else []
+        capacity = self.packets_per_client * len(in_flight)
+        return {
+            'clients': len(in_flight),
+            'capacity': capacity,
+            'in_flight': sum(in_flight),
+            'in_flight_per_client': in_flight,
+            'saturation': sum(in_flight) / capacity if capacity else 0.0,
+            'saturated_picks': self.saturated_picks,
+        }
+
+    def close(self):
+        with self.lock:
+            owned = self.pid == os.getpid()
+            clients, self.clients, self.pid = self.clients, [], None
+        if owned:
+            for client in clients:
+                client.deinit()
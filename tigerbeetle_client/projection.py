@@ -0,0 +1,268 @@
+import os
+
+import numpy as np
+
+from . import uint128
+from .arrays import U128
+from .client2 import TB_TRANSFER_PENDING, TB_TRANSFER_VOID_PENDING_TRANSFER, tb_query_filter_t
+
+MAGIC = b'TBPROJ01'
+MASK32 = np.uint64(0xFFFFFFFF)
+
+HEADER_DTYPE = np.dtype([
+    ('magic', 'S8'),
+    ('capacity', '<u8'),
+    ('count', '<u8'),
+    # Timestamp of the last transfer applied; syncing resumes after it
+    ('timestamp', '<u8'),
+    # Set while a page is being applied, so a crash in the middle is detected on open
+    ('dirty', '<u8'),
+    ('reserved', 'V24'),
+])
+ROW_DTYPE = np.dtype([
+    ('id', *U128),
+    ('debits_posted', *U128),
+    ('credits_posted', *U128),
+    ('ledger', '<u4'),
+    ('reserved', '<u4'),
+])
+
+
+class ProjectionCorrupt(RuntimeError):
+    """Raised on opening a projection whose last update was interrupted."""
+
+
+def add_grouped(column, rows, amounts):
+    """Add u128 `amounts` ([low, high] pairs) into `column` at `rows`, exactly, repeated rows included."""
+    rows, inverse = np.unique(rows, return_inverse=True)
+    # Sum 32-bit limbs in 64-bit accumulators, so nothing overflows before the carries are propagated
+    limbs = np.zeros((len(rows), 4), dtype=np.uint64)
+    current = column[rows]
+    for k, (words, shift) in enumerate(((0, 0), (0, 32), (1, 0), (1, 32))):
+        np.add.at(limbs[:, k], inverse.ravel(), (amounts[:, words] >> np.uint64(shift)) & MASK32)
+        limbs[:, k] += (current[:, words] >> np.uint64(shift)) & MASK32
+    for k in range(3):
+        limbs[:, k + 1] += limbs[:, k] >> np.uint64(32)
+        limbs[:, k] &= MASK32
+    column[rows, 0] = limbs[:, 0] | (limbs[:, 1] << np.uint64(32))
+    column[rows, 1] = limbs[:, 2] | ((limbs[:, 3] & MASK32) << np.uint64(32))
+
+
+def as_float(pairs):
+    return pairs[..., 0].astype(np.float64) + pairs[..., 1].astype(np.float64) * 2.0 ** 64
+
+
+class BalanceProjection:
+    """Posted balances of every account, kept up to date from query_transfers and stored in a memory-mapped file.
+
+    sync() pages through the transfers created since the last one applied and adds their
+    amounts to the accounts they touch, so dashboards can read balances locally instead of
+    calling lookup_accounts. Only posted amounts are projected: single-phase transfers and
+    posted pending transfers count, pending and voided ones don't. Balances are exact u128s;
+    top() and between() preselect by float64 net balance and then compare exactly.
+
+        projection = BalanceProjection('balances.tbp')
+        projection.sync(client)
+        projection.balance(account_id)              # credits_posted - debits_posted
+        projection.top(10, ledger=1)                # [(account id, net balance), ...]
+
+    Reopening the file resumes from the last applied transfer. A crash while a page is being
+    applied leaves the file marked dirty; opening it then raises ProjectionCorrupt, unless
+    `rebuild` is set, which starts the projection over.
+    """
+
+    def __init__(self, path, capacity=1 << 16, rebuild=False):
+        self.path = path
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            self.create(capacity)
+        self.open()
+        if bytes(self.header['magic']) != MAGIC:
+            raise ValueError(f"{path} is not a balance projection")
+        if self.header['dirty']:
+            if not rebuild:
+                raise ProjectionCorrupt(f"{path} was being updated when its process stopped; open it with rebuild=True")
+            self.index = {}
+            self.reset()
+        count = int(self.header['count'])
+        self.index = dict(zip(uint128.from_pairs(self.table['id'][:count]), range(count)))
+
+    def create(self, capacity):
+        with open(self.path, 'wb') as file:
+            file.truncate(HEADER_DTYPE.itemsize + capacity * ROW_DTYPE.itemsize)
+        header = np.memmap(self.path, dtype=HEADER_DTYPE, mode='r+', shape=())
+        header['magic'] = MAGIC
+        header['capacity'] = capacity
+        header.flush()
+        del header
+
+    def open(self):
+        self.map = np.memmap(self.path, dtype=np.uint8, mode='r+')
+        # Plain ndarray views: indexing the memmap subclass costs microseconds per point read
+        data = self.map.view(np.ndarray)
+        self.header = data[:HEADER_DTYPE.itemsize].view(HEADER_DTYPE)[0]
+        self.table = data[HEADER_DTYPE.itemsize:].view(ROW_DTYPE)
+        self.debits = self.table['debits_posted']
+        self.credits = self.table['credits_posted']
+        # Each row as 7 u64 words (id, debits_posted and credits_posted are 2 each), for fast point reads
+        self.words = self.table.view('<u8').reshape(-1, ROW_DTYPE.itemsize // 8)
+
+    def grow(self, needed):
+        capacity = int(self.header['capacity'])
+        while capacity < needed:
+            capacity *= 2
+        self.map.flush()
+        del self.header, self.table, self.debits, self.credits, self.words, self.map
+        with open(self.path, 'r+b') as file:
+            file.truncate(HEADER_DTYPE.itemsize + capacity * ROW_DTYPE.itemsize)
+        self.open()
+        self.header['capacity'] = capacity
+
+    def __len__(self):
+        return int(self.header['count'])
+
+    @property
+    def timestamp(self):
+        """Timestamp of the last transfer applied."""
+        return int(self.header['timestamp'])
+
+    def sync(self, client, ledger=0, page_size=None, max_pages=None):
+        """Apply every transfer after the last one applied; returns how many were applied.
+
+        With `ledger`, only that ledger's transfers are queried, and it must be the same on
+        every call for the same file.
+        """
+        query_filter = tb_query_filter_t(ledger=ledger, timestamp_min=self.timestamp + 1)
+        applied = 0
+        for pages, page in enumerate(client.iter_query_transfers(query_filter, page_size, as_array=True), 1):
+            self.apply(page)
+            applied += len(page)
+            if max_pages is not None and pages >= max_pages:
+                break
+        return applied
+
+    def apply(self, transfers):
+        """Apply a TRANSFER_DTYPE array of transfers, which must be in timestamp order."""
+        if not len(transfers):
+            return
+        self.header['dirty'] = 1
+        self.map.flush()
+        posted = transfers[(transfers['flags'] & (TB_TRANSFER_PENDING | TB_TRANSFER_VOID_PENDING_TRANSFER)) == 0]
+        if len(posted):
+            ids = np.concatenate((posted['debit_account_id'], posted['credit_account_id']))
+            rows = self.rows(ids, np.concatenate((posted['ledger'], posted['ledger'])))
+            amounts = np.ascontiguousarray(posted['amount'])
+            add_grouped(self.debits, rows[:len(posted)], amounts)
+            add_grouped(self.credits, rows[len(posted):], amounts)
+        self.header['timestamp'] = transfers['timestamp'][-1]
+        self.map.flush()
+        self.header['dirty'] = 0
+        self.map.flush()
+
+    def rows(self, ids, ledgers):
+        """Return the table row of each account id, adding rows for accounts not seen before."""
+        _, first, inverse = np.unique(np.ascontiguousarray(ids).view('V16').ravel(), return_index=True, return_inverse=True)
+        count = int(self.header['count'])
+        unique_rows = np.empty(len(first), dtype=np.int64)
+        new = []
+        for i, key in enumerate(uint128.from_pairs(ids[first])):
+            row = self.index.get(key)
+            if row is None:
+                row = self.index[key] = count + len(new)
+                new.append(i)
+            unique_rows[i] = row
+        if new:
+            if count + len(new) > int(self.header['capacity']):
+                self.grow(count + len(new))
+            new_rows = unique_rows[new]
+            self.table['id'][new_rows] = ids[first[new]]
+            self.table['ledger'][new_rows] = ledgers[first[new]]
+            self.header['count'] = count + len(new)
+        return unique_rows[inverse.ravel()]
+
+    def balances(self, account_id):
+        """Return (debits_posted, credits_posted) of an account, or None if no transfer touched it."""
+        row = self.index.get(account_id)
+        if row is None:
+            return None
+        words = self.words[row].tolist()
+        return words[2] | words[3] << 64, words[4] | words[5] << 64
+
+    def balance(self, account_id):
+        """Return credits_posted - debits_posted of an account (0 if no transfer touched it)."""
+        row = self.index.get(account_id)
+        if row is None:
+            return 0
+        words = self.words[row].tolist()
+        return (words[4] | words[5] << 64) - (words[2] | words[3] << 64)
+
+    def accounts(self, ledger=None):
+        """Return the rows of the projected accounts, of one ledger if given."""
+        rows = np.arange(len(self))
+        if ledger is not None:
+            rows = rows[self.table['ledger'][:len(self)] == ledger]
+        return rows
+
+    def net(self, rows):
+        return as_float(self.credits[rows]) - as_float(self.debits[rows])
+
+    def exact(self, rows):
+        """Return [(account id, net balance)] for table rows, with exact ints."""
+        table = self.table[rows]
+        ids = uint128.from_pairs(table['id'])
+        debits = uint128.from_pairs(table['debits_posted'])
+        credits = uint128.from_pairs(table['credits_posted'])
+        return [(id, credit - debit) for id, debit, credit in zip(ids, debits, credits)]
+
+    def top(self, n, ledger=None, lowest=False):
+        """Return the `n` accounts with the highest (or, with `lowest`, lowest) net balance."""
+        rows = self.accounts(ledger)
+        net = self.net(rows)
+        if lowest:
+            net = -net
+        if 0 < n < len(rows):
+            # Keep everything that could tie with the n-th after rounding, then rank exactly
+            nth = np.partition(net, len(net) - n)[len(net) - n]
+            rows = rows[net >= nth - (abs(nth) * 2.0 ** -50 + 1)]
+        ranked = sorted(self.exact(rows), key=lambda item: item[1], reverse=not lowest)
+        return ranked[:n]
+
+    def between(self, low, high, ledger=None):
+        """Return the accounts whose net balance is within [low, high], in table order."""
+        rows = self.accounts(ledger)
+        net = self.net(rows)
+        # Float prefilter with a margin for rounding, then the exact check
+        margin = (abs(low) + abs(high)) * 2.0 ** -50 + 1
+        rows = rows[(net >= low - margin) & (net <= high + margin)]
+        return [(id, balance) for id, balance in self.exact(rows) if low <= balance <= high]
+
+    def ledgers(self):
+        """Return {ledger: (accounts, debits_posted, credits_posted)} totals over the projected accounts."""
+        count = len(self)
+        ledgers, inverse = np.unique(self.table['ledger'][:count], return_inverse=True)
+        totals = {}
+        for field in ('debits_posted', 'credits_posted'):
+            sums = np.zeros((len(ledgers), 2), dtype=np.uint64)
+            if count:
+                add_grouped(sums, inverse.ravel(), self.table[field][:count])
+            totals[field] = uint128.from_pairs(sums)
+        accounts = np.bincount(inverse.ravel(), minlength=len(ledgers)).tolist()
+        return {ledger: (accounts[i], totals['debits_posted'][i], totals['credits_posted'][i]) for i, ledger in enumerate(ledgers.tolist())}
+
+    def reset(self):
+        """Forget every balance, so the next sync rebuilds the projection from the first transfer."""
+        self.words[:len(self)] = 0
+        self.header['count'] = 0
+        self.header['timestamp'] = 0
+        self.header['dirty'] = 0
+        self.map.flush()
+        self.index.clear()
+
+    def close(self):
+        self.map.flush()
+        del self.header, self.table, self.debits, self.credits, self.words, self.map
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
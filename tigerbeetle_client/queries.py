@@ -0,0 +1,95 @@
+import ctypes
+
+from .client2 import (
+    TB_ACCOUNT_FILTER_REVERSED,
+    TB_OPERATION_GET_ACCOUNT_BALANCES,
+    TB_OPERATION_GET_ACCOUNT_TRANSFERS,
+    TB_OPERATION_QUERY_ACCOUNTS,
+    TB_OPERATION_QUERY_TRANSFERS,
+    TB_QUERY_FILTER_REVERSED,
+    event_types,
+    reply_types,
+)
+from .packets import MESSAGE_BODY_SIZE_MAX
+
+# Flag that makes each filtering operation return results newest first
+reversed_flags = {
+    TB_OPERATION_GET_ACCOUNT_TRANSFERS: TB_ACCOUNT_FILTER_REVERSED,
+    TB_OPERATION_GET_ACCOUNT_BALANCES: TB_ACCOUNT_FILTER_REVERSED,
+    TB_OPERATION_QUERY_ACCOUNTS: TB_QUERY_FILTER_REVERSED,
+    TB_OPERATION_QUERY_TRANSFERS: TB_QUERY_FILTER_REVERSED,
+}
+
+
+def page_size_max(operation):
+    """Return the most results of an operation that fit in one reply."""
+    return MESSAGE_BODY_SIZE_MAX // ctypes.sizeof(reply_types[operation])
+
+
+def paginate(client, operation, query_filter, page_size=None, prefetch=True, as_array=False):
+    """Yield every result of a filtering operation, one page per packet, or the first `limit` if the filter sets one.
+
+    Pages hold up to `page_size` results (by default the filter's limit, capped at what fits
+    in a reply) and are chained by timestamp: after each page the filter's timestamp_min (or
+    timestamp_max when the filter is reversed) moves past the last result. With `prefetch`,
+    the next page is requested before the current one is handed to the caller. With
+    `as_array`, whole pages are yielded as NumPy record arrays instead of one struct per
+    result. The caller's filter is not modified.
+    """
+    filter_type = event_types[operation]
+    query_filter = filter_type.from_buffer_copy(query_filter)
+    # The filter's limit caps the whole iteration; 0 means every match
+    remaining = query_filter.limit or None
+    if page_size is None:
+        page_size = min(remaining or page_size_max(operation), page_size_max(operation))
+    if not 0 < page_size <= page_size_max(operation):
+        raise ValueError(f"page_size must be between 1 and {page_size_max(operation)}")
+    query_filter.limit = min(page_size, remaining or page_size)
+    reverse = bool(query_filter.flags & reversed_flags[operation])
+
+    if as_array:
+        from . import arrays
+        import numpy as np
+
+        reply_dtype = arrays.reply_dtypes[operation]
+
+        def fetch():
+            events = np.frombuffer(bytearray(query_filter), dtype=arrays.event_dtypes[operation])
+            return arrays.submit_array(client, operation, events, np.empty(page_size, dtype=reply_dtype))
+
+        def last_timestamp(page):
+            return int(page['timestamp'][-1])
+    else:
+        def fetch():
+            # submit copies the filter into the packet, so it can be advanced right away
+            return client.submit(operation, [query_filter])
+
+        def last_timestamp(page):
+            return page[-1].timestamp
+
+    future, requested = fetch(), query_filter.limit
+    while True:
+        page = future.result()
+        if remaining is not None:
+            remaining -= len(page)
+        done = len(page) < requested or remaining == 0
+        if not done:
+            query_filter.limit = min(page_size, remaining or page_size)
+            timestamp = last_timestamp(page)
+            if reverse:
+                # timestamp_max = 0 means unbounded, so there's nothing older left to ask for
+                done = timestamp <= 1
+                query_filter.timestamp_max = timestamp - 1
+            else:
+                query_filter.timestamp_min = timestamp + 1
+        if not done and prefetch:
+            future, requested = fetch(), query_filter.limit
+        if as_array:
+            if len(page):
+                yield page
+        else:
+            yield from page
+        if done:
+            return
+        if not prefetch:
+            future, requested = fetch(), query_filter.limit
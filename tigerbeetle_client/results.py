@@ -0,0 +1,194 @@
+import array
+import collections
+import ctypes
+import enum
+
+
+class CreateAccountResult(enum.IntEnum):
+    ok = 0
+    linked_event_failed = 1
+    linked_event_chain_open = 2
+    timestamp_must_be_zero = 3
+    reserved_field = 4
+    reserved_flag = 5
+    id_must_not_be_zero = 6
+    id_must_not_be_int_max = 7
+    flags_are_mutually_exclusive = 8
+    debits_pending_must_be_zero = 9
+    debits_posted_must_be_zero = 10
+    credits_pending_must_be_zero = 11
+    credits_posted_must_be_zero = 12
+    ledger_must_not_be_zero = 13
+    code_must_not_be_zero = 14
+    exists_with_different_flags = 15
+    exists_with_different_user_data_128 = 16
+    exists_with_different_user_data_64 = 17
+    exists_with_different_user_data_32 = 18
+    exists_with_different_ledger = 19
+    exists_with_different_code = 20
+    exists = 21
+    imported_event_expected = 22
+    imported_event_not_expected = 23
+    imported_event_timestamp_out_of_range = 24
+    imported_event_timestamp_must_not_advance = 25
+    imported_event_timestamp_must_not_regress = 26
+
+
+class CreateTransferResult(enum.IntEnum):
+    ok = 0
+    linked_event_failed = 1
+    linked_event_chain_open = 2
+    timestamp_must_be_zero = 3
+    reserved_flag = 4
+    id_must_not_be_zero = 5
+    id_must_not_be_int_max = 6
+    flags_are_mutually_exclusive = 7
+    debit_account_id_must_not_be_zero = 8
+    debit_account_id_must_not_be_int_max = 9
+    credit_account_id_must_not_be_zero = 10
+    credit_account_id_must_not_be_int_max = 11
+    accounts_must_be_different = 12
+    pending_id_must_be_zero = 13
+    pending_id_must_not_be_zero = 14
+    pending_id_must_not_be_int_max = 15
+    pending_id_must_be_different = 16
+    timeout_reserved_for_pending_transfer = 17
+    amount_must_not_be_zero = 18
+    ledger_must_not_be_zero = 19
+    code_must_not_be_zero = 20
+    debit_account_not_found = 21
+    credit_account_not_found = 22
+    accounts_must_have_the_same_ledger = 23
+    transfer_must_have_the_same_ledger_as_accounts = 24
+    pending_transfer_not_found = 25
+    pending_transfer_not_pending = 26
+    pending_transfer_has_different_debit_account_id = 27
+    pending_transfer_has_different_credit_account_id = 28
+    pending_transfer_has_different_ledger = 29
+    pending_transfer_has_different_code = 30
+    exceeds_pending_transfer_amount = 31
+    pending_transfer_has_different_amount = 32
+    pending_transfer_already_posted = 33
+    pending_transfer_already_voided = 34
+    pending_transfer_expired = 35
+    exists_with_different_flags = 36
+    exists_with_different_debit_account_id = 37
+    exists_with_different_credit_account_id = 38
+    exists_with_different_amount = 39
+    exists_with_different_pending_id = 40
+    exists_with_different_user_data_128 = 41
+    exists_with_different_user_data_64 = 42
+    exists_with_different_user_data_32 = 43
+    exists_with_different_timeout = 44
+    exists_with_different_code = 45
+    exists = 46
+    overflows_debits_pending = 47
+    overflows_credits_pending = 48
+    overflows_debits_posted = 49
+    overflows_credits_posted = 50
+    overflows_debits = 51
+    overflows_credits = 52
+    overflows_timeout = 53
+    exceeds_credits = 54
+    exceeds_debits = 55
+    imported_event_expected = 56
+    imported_event_not_expected = 57
+    imported_event_timestamp_out_of_range = 58
+    imported_event_timestamp_must_not_advance = 59
+    imported_event_timestamp_must_not_regress = 60
+    imported_event_timestamp_must_postdate_debit_account = 61
+    imported_event_timestamp_must_postdate_credit_account = 62
+    imported_event_timeout_must_be_zero = 63
+    closing_transfer_must_be_pending = 64
+    debit_account_already_closed = 65
+    credit_account_already_closed = 66
+    exists_with_different_ledger = 67
+    id_already_failed = 68
+
+
+# One (index, result) pair of u32s per failed event
+assert array.array('I').itemsize == 4
+
+Failure = collections.namedtuple('Failure', ['index', 'result'])
+
+
+def result_code(result_type, code):
+    """Return `code` as a member of `result_type`, or the plain int if it's newer than this client."""
+    try:
+        return result_type(code)
+    except ValueError:
+        return code
+
+
+class CreateError(RuntimeError):
+    """Raised by CreateResults.raise_on_errors when any event of a create batch failed."""
+    def __init__(self, results):
+        counts = ", ".join(f"{getattr(code, 'name', code)}: {len(indexes)}" for code, indexes in results.group_by_result_code().items())
+        super().__init__(f"{len(results)} events failed ({counts})")
+        self.results = results
+
+
+class CreateResults:
+    """The failures of a create_accounts / create_transfers batch, kept as two compact u32 arrays.
+
+    The server only reports events that failed, so a fully successful batch decodes to an
+    empty (falsy) result without creating any Python objects. The arrays are array('I')
+    or, from from_array, NumPy columns. Iterating yields Failure
+    (index, result) tuples, with the result as a CreateAccountResult / CreateTransferResult.
+    """
+
+    def __init__(self, result_type, indexes, codes):
+        self.result_type = result_type
+        self.indexes = indexes
+        self.codes = codes
+
+    @classmethod
+    def from_buffer(cls, result_type, data, size):
+        """Decode `size` bytes of packed (index, result) pairs at `data` (a pointer, address or bytes) in one pass."""
+        pairs = array.array('I')
+        if size:
+            pairs.frombytes(ctypes.string_at(data, size))
+        return cls(result_type, pairs[0::2], pairs[1::2])
+
+    @classmethod
+    def from_array(cls, result_type, results):
+        """Wrap a CREATE_RESULT_DTYPE array, as returned by the *_array methods, without copying it."""
+        return cls(result_type, results['index'], results['result'])
+
+    def __len__(self):
+        return len(self.indexes)
+
+    def __bool__(self):
+        return len(self.indexes) > 0
+
+    def __iter__(self):
+        result_type = self.result_type
+        return (Failure(index, result_code(result_type, code)) for index, code in zip(self.indexes, self.codes))
+
+    def __getitem__(self, item):
+        return Failure(self.indexes[item], result_code(self.result_type, self.codes[item]))
+
+    def __repr__(self):
+        return f"CreateResults({list(self)!r})"
+
+    def failed_indices(self):
+        return self.indexes.tolist()
+
+    def group_by_result_code(self):
+        """Return {result code: [indexes of the events that failed with it]}."""
+        groups = {}
+        for index, code in zip(self.indexes, self.codes):
+            groups.setdefault(code, []).append(index)
+        return {result_code(self.result_type, code): indexes for code, indexes in groups.items()}
+
+    def without(self, *codes):
+        """Return the failures whose code isn't one of `codes`, e.g. without(CreateTransferResult.exists) on a retry."""
+        skip = set(map(int, codes))
+        kept = [(index, code) for index, code in zip(self.indexes, self.codes) if code not in skip]
+        return CreateResults(self.result_type, array.array('I', [index for index, _ in kept]), array.array('I', [code for _, code in kept]))
+
+    def raise_on_errors(self):
+        """Raise CreateError if any event failed; returns self otherwise, for chaining."""
+        if len(self.indexes):
+            raise CreateError(self)
+        return self
@@ -0,0 +1,334 @@
+import concurrent.futures
+import ctypes
+import heapq
+import itertools
+import threading
+
+import numpy as np
+
+from .arrays import CREATE_RESULT_DTYPE, event_dtypes, reply_dtypes
+from .client2 import (
+    TB_OPERATION_CREATE_ACCOUNTS,
+    TB_OPERATION_CREATE_TRANSFERS,
+    TB_OPERATION_GET_ACCOUNT_BALANCES,
+    TB_OPERATION_GET_ACCOUNT_TRANSFERS,
+    TB_OPERATION_LOOKUP_ACCOUNTS,
+    TB_OPERATION_LOOKUP_TRANSFERS,
+    TB_OPERATION_QUERY_ACCOUNTS,
+    TB_OPERATION_QUERY_TRANSFERS,
+    TB_TRANSFER_LINKED,
+    TB_TRANSFER_PENDING,
+    TB_TRANSFER_POST_PENDING_TRANSFER,
+    TB_TRANSFER_VOID_PENDING_TRANSFER,
+    Operations,
+    result_types,
+)
+from . import queries
+from .queries import page_size_max, reversed_flags
+from .results import CreateTransferResult
+
+LOOKUPS = (TB_OPERATION_LOOKUP_ACCOUNTS, TB_OPERATION_LOOKUP_TRANSFERS)
+# An account lives in one cluster, so asking every cluster and concatenating the replies is exact
+ACCOUNT_FILTERS = (TB_OPERATION_GET_ACCOUNT_TRANSFERS, TB_OPERATION_GET_ACCOUNT_BALANCES)
+# Each cluster returns its first `limit` matches in timestamp order, so the first `limit` of their merge
+# answer one request exactly. Paging from the last timestamp of such a merge would not be exact (rows
+# the cut dropped, or rows with the same timestamp in another cluster, would be skipped or repeated),
+# so ShardedClient.paginate keeps a cursor per cluster instead
+QUERIES = (TB_OPERATION_QUERY_ACCOUNTS, TB_OPERATION_QUERY_TRANSFERS)
+RESOLVING = TB_TRANSFER_POST_PENDING_TRANSFER | TB_TRANSFER_VOID_PENDING_TRANSFER
+
+
+def jump_hash(keys, buckets):
+    """Jump consistent hash (Lamping & Veach) of uint64 `keys` into `buckets`; adding a bucket moves only 1/n of the keys."""
+    keys = keys.astype(np.uint64)
+    bucket = np.full(len(keys), -1, dtype=np.int64)
+    jump = np.zeros(len(keys), dtype=np.int64)
+    active = np.arange(len(keys))
+    with np.errstate(over='ignore'):
+        while len(active):
+            bucket[active] = jump[active]
+            keys[active] = keys[active] * np.uint64(2862933555777941757) + np.uint64(1)
+            jump[active] = ((bucket[active] + 1) * (2.0 ** 31 / ((keys[active] >> np.uint64(33)).astype(np.float64) + 1))).astype(np.int64)
+            active = active[jump[active] < buckets]
+    return bucket
+
+
+def row_keys(ids):
+    """Return (n, 2) u128 [low, high] pairs as a list of 16-byte keys."""
+    return np.ascontiguousarray(ids).view('V16').ravel().tolist()
+
+
+def id_keys(ids):
+    """Fold (n, 2) u128 [low, high] pairs into uint64 hash keys."""
+    with np.errstate(over='ignore'):
+        return ids[:, 0] ^ (ids[:, 1] * np.uint64(0x9E3779B97F4A7C15))
+
+
+class ByLedger:
+    """Routes events by ledger; `ledgers` maps each ledger to the index of its cluster's client.
+
+    Lookups, account filters and queries without a ledger go to every cluster. Events of a
+    ledger that isn't mapped go to `default`, or fail with ValueError if it's None.
+    """
+
+    def __init__(self, ledgers, default=None):
+        self.ledgers = np.array(sorted(ledgers), dtype=np.uint32)
+        self.clusters = np.array([ledgers[ledger] for ledger in sorted(ledgers)], dtype=np.int64)
+        self.default = default
+
+    def route(self, operation, events):
+        if operation in (TB_OPERATION_CREATE_ACCOUNTS, TB_OPERATION_CREATE_TRANSFERS):
+            return self.lookup(events['ledger'])
+        if operation in (TB_OPERATION_QUERY_ACCOUNTS, TB_OPERATION_QUERY_TRANSFERS) and events['ledger'].all():
+            return self.lookup(events['ledger'])
+        return None
+
+    def lookup(self, ledgers):
+        positions = np.searchsorted(self.ledgers, ledgers).clip(max=max(len(self.ledgers) - 1, 0))
+        known = self.ledgers[positions] == ledgers if len(self.ledgers) else np.zeros(len(ledgers), dtype=bool)
+        if known.all():
+            return self.clusters[positions]
+        if self.default is None:
+            raise ValueError(f"No cluster for ledgers {sorted(set(ledgers[~known].tolist()))}")
+        return np.where(known, self.clusters[positions], self.default)
+
+
+class ByAccount:
+    """Routes events by a consistent hash of the account id over `clusters` clusters.
+
+    A transfer goes to its debit account's cluster, and both of its accounts must hash to
+    the same one. Transfer lookups and queries go to every cluster.
+    """
+
+    def __init__(self, clusters):
+        self.clusters = clusters
+
+    def route(self, operation, events):
+        if operation in (TB_OPERATION_CREATE_ACCOUNTS, TB_OPERATION_LOOKUP_ACCOUNTS):
+            return self.hash(events['id'] if events.dtype.names else events)
+        if operation == TB_OPERATION_CREATE_TRANSFERS:
+            clusters = self.hash(events['debit_account_id'])
+            crossing = np.flatnonzero(clusters != self.hash(events['credit_account_id']))
+            if len(crossing):
+                raise ValueError(f"Transfers {crossing[:10].tolist()} are between accounts of different clusters")
+            return clusters
+        if operation in ACCOUNT_FILTERS:
+            return self.hash(events['account_id'])
+        return None
+
+    def hash(self, ids):
+        return jump_hash(id_keys(np.ascontiguousarray(ids).reshape(-1, 2)), self.clusters)
+
+
+class ShardedClient(Operations):
+    """One client per cluster behind a single Operations interface, routing each event by `shard`.
+
+    A batch is split into one sub-batch per cluster, the sub-batches are submitted without
+    waiting for each other, and the replies are merged back into the caller's order: create
+    failures carry their index in the original batch, lookups return what was found in the
+    order the ids were given. A batch that routes to one cluster is passed through as-is.
+
+        router = ShardedClient([client_a, client_b], ByLedger({1: 0, 2: 0, 3: 1}))
+        router.create_transfers_array(transfers)        # ledgers 1 and 2 to client_a, 3 to client_b
+
+    `shard.route(operation, events)` gets the events as an array of the operation's dtype and
+    returns the index of each event's client, or None to ask every client (anything but
+    creates). Queries asked of every client are merged by timestamp, newest first if the
+    filter is reversed, and cut to the filter's limit; iter_query_* pages through each
+    cluster separately and merges the streams. Linked chains must stay within one
+    cluster. If one cluster's packet fails the request raises, but the other clusters may
+    have applied their part.
+
+    Posts and voids of pending transfers go to the cluster holding the pending transfer. The
+    router remembers where each pending transfer it created went, until it is posted or
+    voided; a post or void of any other pending transfer must carry the transfer's ledger
+    and accounts so the shard can route it, or the request fails with ValueError.
+    """
+
+    def __init__(self, clients, shard):
+        self.clients = list(clients)
+        self.shard = shard
+        # 16-byte id of each pending transfer created through the router -> its cluster
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def submit_buffer(self, operation, address, size, owner, decode):
+        """Submit `size` bytes of packed events at `address`, split across the clusters.
+
+        `decode(data, size)` gets the merged reply, in the caller's order, once every
+        cluster has answered.
+        """
+        dtype = event_dtypes[operation]
+        events = np.frombuffer((ctypes.c_char * size).from_address(address), dtype=dtype) if size else np.empty(0, dtype)
+        clusters = self.route(operation, events) if len(events) else np.zeros(0, dtype=np.int64)
+        if clusters is None:
+            if operation not in LOOKUPS + ACCOUNT_FILTERS + QUERIES:
+                raise ValueError(f"Operation {operation} could not be routed to a cluster")
+            parts = [(client, np.arange(len(events))) for client in self.clients]
+        else:
+            clusters = np.asarray(clusters)
+            if operation in result_types:
+                # A chain continues into the next event, so both must go to the same cluster
+                linked = np.flatnonzero(events['flags'][:-1] & TB_TRANSFER_LINKED)
+                broken = linked[clusters[linked] != clusters[linked + 1]]
+                if len(broken):
+                    raise ValueError(f"Linked chain at event {broken[0]} spans clusters")
+            if operation == TB_OPERATION_CREATE_TRANSFERS:
+                decode = self.remembering(events, clusters, decode)
+            used = np.unique(clusters)
+            if len(used) <= 1:
+                client = self.clients[used[0]] if len(used) else self.clients[0]
+                return client.submit_buffer(operation, address, size, owner, decode)
+            parts = [(self.clients[cluster], np.flatnonzero(clusters == cluster)) for cluster in used.tolist()]
+
+        future = concurrent.futures.Future()
+        future.set_running_or_notify_cancel()
+        replies = [None] * len(parts)
+        remaining = [len(parts)]
+        lock = threading.Lock()
+
+        def done(part, reply):
+            with lock:
+                replies[part] = reply
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            errors = [reply for reply in replies if isinstance(reply, BaseException)]
+            if errors:
+                future.set_exception(errors[0])
+                return
+            try:
+                merged = self.merge(operation, events, [indexes for _, indexes in parts], replies)
+                result = decode(merged.ctypes.data, merged.nbytes)
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+        reply_dtype = reply_dtypes[operation]
+        for part, (client, indexes) in enumerate(parts):
+            sub = events if len(indexes) == len(events) else events[indexes]
+            copy = lambda data, size: np.frombuffer(ctypes.string_at(data, size), dtype=reply_dtype) if size else np.empty(0, reply_dtype)
+            try:
+                sub_future = client.submit_buffer(operation, sub.ctypes.data, sub.nbytes, (owner, sub), copy)
+            except Exception as e:
+                done(part, e)
+                continue
+            sub_future.add_done_callback(lambda sub_future, part=part: done(part, sub_future.exception() or sub_future.result()))
+        return future
+
+    def iter_query_accounts(self, query_filter, page_size=None, prefetch=True, as_array=False):
+        """Yield every account matching the filter, paging by timestamp; see paginate."""
+        return self.paginate(TB_OPERATION_QUERY_ACCOUNTS, query_filter, page_size, prefetch, as_array)
+
+    def iter_query_transfers(self, query_filter, page_size=None, prefetch=True, as_array=False):
+        """Yield every transfer matching the filter, paging by timestamp; see paginate."""
+        return self.paginate(TB_OPERATION_QUERY_TRANSFERS, query_filter, page_size, prefetch, as_array)
+
+    def paginate(self, operation, query_filter, page_size=None, prefetch=True, as_array=False):
+        """Like queries.paginate, but a query that goes to every cluster is paged through each
+        cluster with its own cursor and the streams are merged by timestamp, up to the filter's limit.
+
+        As arrays, the merged results are regrouped into pages of `page_size`.
+        """
+        events = np.frombuffer(bytearray(query_filter), dtype=event_dtypes[operation])
+        if self.route(operation, events) is not None:
+            return queries.paginate(self, operation, query_filter, page_size, prefetch, as_array)
+        streams = [queries.paginate(client, operation, query_filter, page_size, prefetch, as_array) for client in self.clients]
+        return self.merge_streams(operation, query_filter, streams, page_size, as_array)
+
+    @staticmethod
+    def merge_streams(operation, query_filter, streams, page_size, as_array):
+        reverse = bool(query_filter.flags & reversed_flags[operation])
+        if as_array:
+            streams = [(row for page in stream for row in page) for stream in streams]
+            timestamp = lambda row: int(row['timestamp'])
+        else:
+            timestamp = lambda row: row.timestamp
+        merged = itertools.islice(heapq.merge(*streams, key=timestamp, reverse=reverse), query_filter.limit or None)
+        if not as_array:
+            yield from merged
+            return
+        page_size = page_size or min(query_filter.limit or page_size_max(operation), page_size_max(operation))
+        while True:
+            rows = list(itertools.islice(merged, page_size))
+            if not rows:
+                return
+            yield np.array(rows, dtype=reply_dtypes[operation])
+
+    def route(self, operation, events):
+        """Return each event's cluster, sending posts and voids to their pending transfer's cluster."""
+        if operation != TB_OPERATION_CREATE_TRANSFERS or not (events['flags'] & RESOLVING).any():
+            return self.shard.route(operation, events)
+        resolving = (events['flags'] & RESOLVING) != 0
+        with self.lock:
+            known = [self.pending.get(key, -1) for key in row_keys(events['pending_id'][resolving])]
+        clusters = np.full(len(events), -1, dtype=np.int64)
+        clusters[resolving] = known
+        unknown = clusters < 0
+        # Without its pending transfer's cluster, a post or void can only be routed by its own fields
+        bare = (events['ledger'] == 0) | ~events['debit_account_id'].any(axis=1) | ~events['credit_account_id'].any(axis=1)
+        bare &= resolving & unknown
+        if bare.any():
+            raise ValueError(f"Transfers {np.flatnonzero(bare)[:10].tolist()} post or void pending transfers this router "
+                             f"did not create; give them the pending transfer's ledger and accounts to route them")
+        if unknown.any():
+            routed = self.shard.route(operation, events[unknown])
+            if routed is None:
+                return None
+            clusters[unknown] = routed
+        return clusters
+
+    def remembering(self, events, clusters, decode):
+        """Wrap `decode` to record the clusters of the pending transfers the batch creates and forget those it resolves."""
+        flags = events['flags']
+        created = np.flatnonzero(flags & TB_TRANSFER_PENDING)
+        resolved = np.flatnonzero(flags & RESOLVING)
+        if not len(created) and not len(resolved):
+            return decode
+        created = list(zip(created.tolist(), row_keys(events['id'][created]), clusters[created].tolist()))
+        resolved = list(zip(resolved.tolist(), row_keys(events['pending_id'][resolved])))
+
+        def remember(data, size):
+            results = np.frombuffer(ctypes.string_at(data, size), dtype=CREATE_RESULT_DTYPE) if size else np.empty(0, CREATE_RESULT_DTYPE)
+            # A pending transfer that already exists is in the cluster it was sent to all the same
+            failed = set(results['index'][results['result'] != CreateTransferResult.exists].tolist())
+            with self.lock:
+                for index, key, cluster in created:
+                    if index not in failed:
+                        self.pending[key] = cluster
+                for index, key in resolved:
+                    if index not in failed:
+                        self.pending.pop(key, None)
+            return decode(data, size)
+        return remember
+
+    @staticmethod
+    def merge(operation, events, parts, replies):
+        """Combine the per-cluster replies into one reply array in the order of `events`."""
+        if operation in result_types:
+            # Failure indexes are relative to each sub-batch; map them back and restore the batch order
+            merged = np.concatenate(replies)
+            merged['index'] = np.concatenate([indexes[reply['index']] for indexes, reply in zip(parts, replies)])
+            return merged[np.argsort(merged['index'], kind='stable')]
+        merged = np.concatenate(replies)
+        if operation in LOOKUPS and len(merged):
+            # Order the found objects by where their id first appears in the request
+            requested = np.ascontiguousarray(events).view('V16').ravel()
+            order = np.argsort(requested, kind='stable')
+            found = np.ascontiguousarray(merged['id']).view('V16').ravel()
+            positions = order[np.searchsorted(requested[order], found)]
+            merged = merged[np.argsort(positions, kind='stable')]
+        elif operation in QUERIES and len(merged):
+            # A query request carries one filter
+            query_filter = events[0]
+            order = np.argsort(merged['timestamp'], kind='stable')
+            if query_filter['flags'] & reversed_flags[operation]:
+                order = order[::-1]
+            limit = min(int(query_filter['limit']), page_size_max(operation)) or page_size_max(operation)
+            merged = merged[order[:limit]]
+        return merged
+
+    def deinit(self):
+        for client in self.clients:
+            client.deinit()
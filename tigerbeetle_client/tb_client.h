@@ -1,50 +1,108 @@
 // tb_client.h
+//
+// The parts of the native client's C API this package uses, with the same layouts as the
+// ctypes declarations in client2.py.
 #ifndef TB_CLIENT_H
 #define TB_CLIENT_H
 
 #include <stdint.h>
 
-typedef struct {
-    uint64_t field1;
-    uint32_t field2;
-    uint16_t field3;
-    // Other fields...
-} context_t;
-
-typedef struct {
-    context_t context;
-    uint64_t some_other_field;
-    uint32_t another_field;
-    // Other fields...
-} tb_client_t;
-
-typedef struct {
-    uint64_t id;
-    uint64_t user_data;
-    uint64_t reserved;
-    uint64_t credits_posted;
-    uint64_t credits_pending;
-    uint64_t debits_posted;
-    uint64_t debits_pending;
-    uint64_t timestamp;
+#if defined(__SIZEOF_INT128__)
+typedef __uint128_t tb_uint128_t;
+#else
+// Compilers without a 128-bit integer: same size, alignment of the fields only
+typedef struct { uint64_t low; uint64_t high; } tb_uint128_t;
+#endif
+
+typedef struct tb_account_t {
+    tb_uint128_t id;
+    tb_uint128_t debits_pending;
+    tb_uint128_t debits_posted;
+    tb_uint128_t credits_pending;
+    tb_uint128_t credits_posted;
+    tb_uint128_t user_data_128;
+    uint64_t user_data_64;
+    uint32_t user_data_32;
+    uint32_t reserved;
     uint32_t ledger;
-    uint32_t code;
+    uint16_t code;
+    uint16_t flags;
+    uint64_t timestamp;
 } tb_account_t;
 
-typedef struct {
-    uint32_t size;
-    uint32_t version;
-    uint32_t max_credits;
-    uint32_t max_debits;
-    uint64_t max_balance;
-} tb_client_config_t;
-
-void* tb_client_init(const char* server_ip, uint16_t server_port, uint16_t cluster_id, tb_client_config_t* config);
-void tb_client_deinit(void* client_handle);
-int tb_client_submit(void* client_handle, tb_account_t* account, size_t account_count);
-int tb_client_acquire_packet(void* client_handle, tb_account_t* account, size_t account_count);
-void* tb_client_completion_context(void* client_handle);
-void tb_client_release_packet(void* client_handle);
-int tb_client_init_echo(void* client_handle, const char* message);
+typedef struct tb_transfer_t {
+    tb_uint128_t id;
+    tb_uint128_t debit_account_id;
+    tb_uint128_t credit_account_id;
+    tb_uint128_t amount;
+    tb_uint128_t pending_id;
+    tb_uint128_t user_data_128;
+    uint64_t user_data_64;
+    uint32_t user_data_32;
+    uint32_t timeout;
+    uint32_t ledger;
+    uint16_t code;
+    uint16_t flags;
+    uint64_t timestamp;
+} tb_transfer_t;
+
+typedef struct tb_create_result_t {
+    uint32_t index;
+    uint32_t result;
+} tb_create_result_t;
+
+typedef enum TB_OPERATION {
+    TB_OPERATION_CREATE_ACCOUNTS = 129,
+    TB_OPERATION_CREATE_TRANSFERS = 130,
+    TB_OPERATION_LOOKUP_ACCOUNTS = 131,
+    TB_OPERATION_LOOKUP_TRANSFERS = 132,
+    TB_OPERATION_GET_ACCOUNT_TRANSFERS = 133,
+    TB_OPERATION_GET_ACCOUNT_BALANCES = 134,
+    TB_OPERATION_QUERY_ACCOUNTS = 135,
+    TB_OPERATION_QUERY_TRANSFERS = 136,
+} TB_OPERATION;
+
+typedef enum TB_PACKET_STATUS {
+    TB_PACKET_OK = 0,
+    TB_PACKET_TOO_MUCH_DATA = 1,
+    TB_PACKET_INVALID_OPERATION = 2,
+    TB_PACKET_INVALID_DATA_SIZE = 3,
+} TB_PACKET_STATUS;
+
+// Caller-owned; must stay alive and unmodified from tb_client_submit until its completion
+typedef struct tb_packet_t {
+    struct tb_packet_t* next;
+    void* user_data;
+    uint8_t operation;
+    uint8_t status;
+    uint32_t data_size;
+    void* data;
+    struct tb_packet_t* batch_next;
+    struct tb_packet_t* batch_tail;
+    uint32_t batch_size;
+    uint8_t reserved[8];
+} tb_packet_t;
+
+typedef void* tb_client_t;
+
+typedef int TB_STATUS;
+#define TB_STATUS_SUCCESS 0
+
+// Called on the client's own thread once per packet; `data` is only valid during the call
+typedef void (*tb_completion_t)(uintptr_t context, tb_client_t client, tb_packet_t* packet, const uint8_t* data, uint32_t size);
+
+TB_STATUS tb_client_init(
+    tb_client_t* out_client,
+    tb_uint128_t cluster_id,
+    const char* address_ptr,
+    uint32_t address_len,
+    uint32_t packets_count,
+    uintptr_t on_completion_ctx,
+    tb_completion_t on_completion
+);
+
+void tb_client_submit(tb_client_t client, tb_packet_t* packet);
+
+void tb_client_deinit(tb_client_t client);
 
 #endif // TB_CLIENT_H
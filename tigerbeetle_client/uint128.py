@@ -0,0 +1,101 @@
+import ctypes
+import operator
+
+MASK64 = (1 << 64) - 1
+MAX = (1 << 128) - 1
+
+
+def split(value):
+    """Split an int into its (low, high) 64-bit words."""
+    if not 0 <= value <= MAX:
+        raise ValueError(f"{value} does not fit in an unsigned 128-bit integer")
+    return value & MASK64, value >> 64
+
+
+def join(low, high):
+    """Combine (low, high) 64-bit words into an int."""
+    return (high << 64) | low
+
+
+def pack(values):
+    """Pack a sequence of ints into consecutive 16-byte little-endian u128s."""
+    return b''.join(operator.index(value).to_bytes(16, 'little') for value in values)
+
+
+def unpack(buffer):
+    """Unpack consecutive 16-byte little-endian u128s into a list of ints."""
+    view = memoryview(buffer).cast('B')
+    return [int.from_bytes(view[i:i + 16], 'little') for i in range(0, len(view), 16)]
+
+
+def to_pairs(values):
+    """Convert ints (or an existing (n, 2) uint64 array) into an (n, 2) array of [low, high] words."""
+    import numpy as np
+
+    if isinstance(values, np.ndarray) and values.dtype != object:
+        if values.ndim == 2 and values.shape[1] == 2:
+            return np.ascontiguousarray(values, dtype='<u8')
+        if values.dtype.kind == 'i' and (values < 0).any():
+            raise ValueError("u128 values must not be negative")
+    try:
+        # Fast path: every value fits in the low word, so numpy converts them in C
+        low = np.asarray(values, dtype='<u8').reshape(-1)
+    except OverflowError:
+        return np.frombuffer(pack(values), dtype='<u8').reshape(-1, 2)
+    pairs = np.zeros((len(low), 2), dtype='<u8')
+    pairs[:, 0] = low
+    return pairs
+
+
+def from_pairs(pairs):
+    """Convert an (n, 2) array of [low, high] words back into a list of ints."""
+    import numpy as np
+
+    pairs = np.ascontiguousarray(pairs, dtype='<u8').reshape(-1, 2)
+    if not pairs[:, 1].any():
+        return pairs[:, 0].tolist()
+    return unpack(pairs.tobytes())
+
+
+class tb_uint128_t(ctypes.Structure):
+    # Little-endian, like the native __uint128_t: the low word comes first in memory
+    _fields_ = [('low', ctypes.c_uint64), ('high', ctypes.c_uint64)]
+
+    @classmethod
+    def from_int(cls, value):
+        low, high = split(value)
+        return cls(low, high)
+
+    def __index__(self):
+        return join(self.low, self.high)
+
+    __int__ = __index__
+
+    def __eq__(self, other):
+        if isinstance(other, (int, tb_uint128_t)):
+            return int(self) == int(other)
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(int(self))
+
+    def __repr__(self):
+        return f"tb_uint128_t({int(self)})"
+
+
+class U128Structure(ctypes.Structure):
+    """Structure whose tb_uint128_t fields can be set from plain ints."""
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._u128_fields = frozenset(name for name, field_type in cls.__dict__.get('_fields_', ()) if field_type is tb_uint128_t)
+
+    def __setattr__(self, name, value):
+        if type(value) is int and name in self._u128_fields:
+            value = tb_uint128_t.from_int(value)
+        super().__setattr__(name, value)
+
+    def to_dict(self):
+        """Return the fields as a dict, with 128-bit fields decoded to ints and byte arrays to bytes."""
+        return {name: bytes(value) if isinstance(value, ctypes.Array) else int(value)
+                for name, value in ((name, getattr(self, name)) for name, _ in self._fields_)}